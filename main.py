@@ -0,0 +1,10 @@
+"""
+Bulk classification entry point, see nlc.cli
+"""
+import sys
+import nlc_abbyy  # registers 'abbyy' classifier class
+from nlc.cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
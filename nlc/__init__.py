@@ -1,2 +1,31 @@
+import importlib
 from .base_classifier import BaseClassifier
 from .multi_classifier import MultiClassifier
+from .cached_classifier import CachedClassifier
+from .pool_classifier import PoolClassifier
+from . import metrics
+
+
+# NumPy-based modules are imported on first access
+_LAZY_ATTRIBUTES = {
+    'LocalTfidfClassifier': 'local_classifier',
+    'EvaluationReport': 'evaluation',
+    'evaluate': 'evaluation',
+    'LabelIndex': 'result',
+    'ClassificationResult': 'result',
+    'ScoreMatrix': 'result',
+}
+BaseClassifier.register_lazy('local_tfidf', 'nlc.local_classifier')
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    module = importlib.import_module('.' + _LAZY_ATTRIBUTES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRIBUTES.keys()))
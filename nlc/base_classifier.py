@@ -1,14 +1,18 @@
 from collections import OrderedDict
 import copy
-import numpy
+import importlib
 import math
 
 
+DEFAULT_THRESHOLD = 0.6
+
+
 class BaseClassifier:
     """
     Base classifier class
     """
     _classes = {}
+    _lazy_classes = {}
 
     def train(self, classes, verbose=False):
         """
@@ -20,6 +24,21 @@ class BaseClassifier:
         """
         raise NotImplementedError()
 
+    def publish(self):
+        """
+        Publish trained model. Does nothing for classifiers, that are usable right after training.
+        """
+        pass
+
+    @property
+    def model_version(self):
+        """
+        Get current model version. Changes when classifier is retrained.
+        :return: model version (None if classifier doesn't track versions)
+        :rtype: object
+        """
+        return None
+
     def classify(self, text):
         """
         Classify text
@@ -30,6 +49,30 @@ class BaseClassifier:
         """
         raise NotImplementedError()
 
+    def classify_many(self, texts):
+        """
+        Classify texts. Sequential by default, backends can override it with native batch.
+        :param texts: texts
+        :type texts: list[str]
+        :return: classification results in input order
+        :rtype: list[OrderedDict[str, float]]
+        """
+        return [self.classify(text) for text in texts]
+
+    def classify_matrix(self, texts, labels=None):
+        """
+        Classify texts into score matrix (for bulk consumers, that threshold or rank results).
+        Built from classify_many results by default, backends can override it to skip per-text dicts.
+        :param texts: texts
+        :type texts: list[str]
+        :param labels: matrix columns, None - labels of results in order of appearance
+        :type labels: nlc.result.LabelIndex|collections.abc.Iterable[str]|NoneType
+        :return: text-by-class scores
+        :rtype: nlc.result.ScoreMatrix
+        """
+        from .result import ScoreMatrix
+        return ScoreMatrix.from_results(self.classify_many(texts), labels)
+
     @staticmethod
     def register(name, cls):
         """
@@ -41,6 +84,18 @@ class BaseClassifier:
         """
         BaseClassifier._classes[name] = cls
 
+    @staticmethod
+    def register_lazy(name, module):
+        """
+        Register NLC class, that is defined in module, which will be imported only when config with
+        that class name is loaded (module must register class by `register` on import)
+        :param name: name (to use in config dicts)
+        :type name: str
+        :param module: module name
+        :type module: str
+        """
+        BaseClassifier._lazy_classes[name] = module
+
     @property
     def config(self):
         """
@@ -72,38 +127,54 @@ class BaseClassifier:
         :return: classifier
         :rtype: BaseClassifier
         """
-        cls = BaseClassifier._classes[config['class']]
+        name = config['class']
+        if name not in BaseClassifier._classes and name in BaseClassifier._lazy_classes:
+            importlib.import_module(BaseClassifier._lazy_classes[name])
+        cls = BaseClassifier._classes[name]
         cfg = copy.deepcopy(config)
         del cfg['class']
         return cls(**cfg)
 
-    def test(self, classes_examples, verbose=False):
+    def test(self, classes_examples, verbose=False, threshold=DEFAULT_THRESHOLD, workers=1):
         """
-        Get test result (mean-square error)
+        Get test result (mean-square error of thresholded decisions, see EvaluationReport.mse).
+        Use evaluate() to get full report.
         :param classes_examples: class examples
         :type classes_examples: dict[str, list[str]]
         :param verbose: verbose
         :type verbose: bool
+        :param threshold: confidence threshold
+        :type threshold: float
+        :param workers: concurrent workers (classify must be thread-safe if more than 1)
+        :type workers: int
         :return: error
         :rtype: float
         """
-        errors = []
-        for class_name, examples in classes_examples.items():
-            for example in examples:
-                classified_classes = self.classify(example)
-                if verbose:
-                    print(example, classified_classes)
-                right = []
-                real = []
-                for classified_class, confidence in classified_classes.items():
-                    if classified_class == class_name:
-                        right.append(1.0)
-                    else:
-                        right.append(0.0)
-                    if confidence > 0.6:
-                        real.append(1.0)
-                    else:
-                        real.append(0.0)
-                    errors += (numpy.array(right) - numpy.array(real)).tolist()
-        error = numpy.sum(numpy.array(errors) * numpy.array(errors) / len(errors))
-        return error
+        return self.evaluate(classes_examples, verbose, threshold, workers).mse()
+
+    def evaluate(self, classes_examples, verbose=False, threshold=DEFAULT_THRESHOLD, workers=8):
+        """
+        Classify test examples and build evaluation report
+        :param classes_examples: class examples
+        :type classes_examples: dict[str, list[str]]
+        :param verbose: print every example classification result and report?
+        :type verbose: bool
+        :param threshold: confidence threshold
+        :type threshold: float
+        :param workers: concurrent workers
+        :type workers: int
+        :return: report
+        :rtype: EvaluationReport
+        """
+        from .evaluation import evaluate
+        report = evaluate(self, classes_examples, threshold, workers, verbose=verbose)
+        if verbose:
+            print(report)
+        return report
+
+
+def _has_batch_path(classifier):
+    """
+    Does classifier override BaseClassifier.classify_many?
+    """
+    return type(classifier).classify_many is not BaseClassifier.classify_many
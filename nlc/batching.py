@@ -0,0 +1,116 @@
+from concurrent.futures import Future
+import threading
+from . import metrics
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.ready = threading.Event()
+
+
+class RequestAggregator:
+    """
+    Collects concurrent calls into batches. First caller of batch waits `window` seconds
+    (or until batch has `max_batch` items) and runs batch function for all collected items,
+    other callers wait for their results. Calls with same key, that are pending or in progress,
+    share single result (single-flight).
+    """
+
+    def __init__(self, function, window=0.005, max_batch=50, key=None, name='batching'):
+        """
+        Initialize aggregator
+        :param function: batch function, gets items list and returns results list in same order
+        :type function: callable
+        :param window: time to collect batch (seconds)
+        :type window: float
+        :param max_batch: max batch size
+        :type max_batch: int
+        :param key: function, that returns item key for coalescing, None - item itself
+        :type key: callable|NoneType
+        :param name: metrics name prefix
+        :type name: str
+        """
+        self.function = function
+        self.window = window
+        self.max_batch = max_batch
+        self._key = key
+        self._name = name
+        self._batch = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.coalesced = 0
+
+    def submit(self, item):
+        """
+        Process item within batch
+        :param item: item
+        :return: result
+        """
+        key = item if self._key is None else self._key(item)
+        leader = False
+        batch_member = False
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                batch_member = True
+                future = Future()
+                self._in_flight[key] = future
+                batch = self._batch
+                if batch is None:
+                    batch = _Batch()
+                    self._batch = batch
+                    leader = True
+                batch.items.append((key, item, future))
+                if len(batch.items) >= self.max_batch:
+                    self._batch = None
+                    batch.ready.set()
+        if leader:
+            batch.ready.wait(self.window)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            self._run(batch)
+        elif not batch_member:
+            metrics.registry.increment(self._name + '.coalesced')
+        return future.result()
+
+    def _run(self, batch):
+        """
+        Run batch function and notify waiters
+        :param batch: batch
+        :type batch: _Batch
+        """
+        items = [item for _, item, _ in batch.items]
+        registry = metrics.registry
+        registry.increment(self._name + '.batches')
+        registry.increment(self._name + '.items', len(items))
+        registry.observe(self._name + '.batch_size', len(items))
+        try:
+            results = self.function(items)
+        except BaseException as e:
+            for _, _, future in batch.items:
+                future.set_exception(e)
+        else:
+            for (_, _, future), result in zip(batch.items, results):
+                future.set_result(result)
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.items += len(items)
+                for key, _, future in batch.items:
+                    if self._in_flight.get(key) is future:
+                        del self._in_flight[key]
+
+    def stats(self):
+        """
+        Get aggregation counters
+        :return: batches, items (batched calls), coalesced (calls, that shared result of other call)
+        :rtype: dict[str, int]
+        """
+        with self._lock:
+            return {'batches': self.batches, 'items': self.items, 'coalesced': self.coalesced}
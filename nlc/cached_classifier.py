@@ -0,0 +1,157 @@
+from collections import OrderedDict
+import threading
+import time
+from .base_classifier import BaseClassifier
+
+
+def normalize_text(text):
+    """
+    Normalize text for cache key (case and whitespace insensitive)
+    :param text: text
+    :type text: str
+    :return: normalized text
+    :rtype: str
+    """
+    return ' '.join(text.split()).casefold()
+
+
+class _LRUCache:
+    """
+    Thread-safe bounded LRU cache with TTL
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._items[key] = (expires, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CachedClassifier(BaseClassifier):
+    """
+    Classifier, that memoize other classifier results.
+    Results are keyed by normalized text and model version, so retrained model never returns stale results.
+    """
+
+    def __init__(self, classifier, max_size=10000, ttl=3600):
+        """
+        Initialize cached classifier
+        :param classifier: wrapped NLC
+        :type classifier: dict|BaseClassifier
+        :param max_size: max cached results
+        :type max_size: int
+        :param ttl: result time-to-live (seconds), None - results never expire
+        :type ttl: float|NoneType
+        """
+        if isinstance(classifier, BaseClassifier):
+            self._classifier = classifier
+        else:
+            self._classifier = BaseClassifier.from_config(classifier)
+        self._cache = _LRUCache(max_size, ttl)
+        self.invalidations = 0
+
+    @property
+    def model_version(self):
+        return self._classifier.model_version
+
+    def invalidate(self):
+        """
+        Drop all cached results
+        """
+        self._cache.clear()
+        self.invalidations += 1
+
+    def train(self, classes, verbose=False):
+        try:
+            return self._classifier.train(classes, verbose)
+        finally:
+            self.invalidate()
+
+    def publish(self):
+        try:
+            self._classifier.publish()
+        finally:
+            self.invalidate()
+
+    def classify(self, text):
+        key = (normalize_text(text), self._classifier.model_version)
+        result = self._cache.get(key)
+        if result is None:
+            # Single miss goes to wrapped classify, that can batch concurrent calls (e.g. ABBYYClassifier)
+            result = self._classifier.classify(text)
+            self._cache.put(key, result)
+        return OrderedDict(result)
+
+    def classify_many(self, texts):
+        version = self._classifier.model_version
+        keys = [(normalize_text(text), version) for text in texts]
+        results = [self._cache.get(key) for key in keys]
+        missing = OrderedDict()
+        for key, text, result in zip(keys, texts, results):
+            if result is None:
+                missing.setdefault(key, text)
+        if missing:
+            classified = dict(zip(missing.keys(), self._classifier.classify_many(list(missing.values()))))
+            for key, result in classified.items():
+                self._cache.put(key, result)
+            results = [classified[key] if result is None else result for key, result in zip(keys, results)]
+        return [OrderedDict(result) for result in results]
+
+    def stats(self):
+        """
+        Get cache counters
+        :return: counters
+        :rtype: dict[str, int]
+        """
+        return {
+            'hits': self._cache.hits,
+            'misses': self._cache.misses,
+            'evictions': self._cache.evictions,
+            'expirations': self._cache.expirations,
+            'invalidations': self.invalidations,
+            'size': len(self._cache)
+        }
+
+    def _get_config(self):
+        return {
+            'classifier': self._classifier.config,
+            'max_size': self._cache.max_size,
+            'ttl': self._cache.ttl
+        }
+
+
+BaseClassifier.register('cached', CachedClassifier)
@@ -0,0 +1,33 @@
+from collections import OrderedDict
+import unittest
+from nlc import BaseClassifier, CachedClassifier
+
+
+class CountingClassifier(BaseClassifier):
+    def __init__(self):
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    def classify(self, text):
+        self.single_calls += 1
+        return OrderedDict([('short' if len(text) < 10 else 'long', 0.9)])
+
+    def classify_many(self, texts):
+        self.batch_calls += 1
+        return [OrderedDict([('short' if len(text) < 10 else 'long', 0.9)]) for text in texts]
+
+    def _get_config(self):
+        return {}
+
+
+class CachedClassifierTest(unittest.TestCase):
+    def test_single_miss_uses_wrapped_classify(self):
+        wrapped = CountingClassifier()
+        cached = CachedClassifier(wrapped)
+        self.assertEqual(list(cached.classify('help')), ['short'])
+        self.assertEqual(list(cached.classify('  HELP ')), ['short'])
+        self.assertEqual((wrapped.single_calls, wrapped.batch_calls), (1, 0))
+        self.assertEqual([list(result) for result in cached.classify_many(['help', 'where is the ATM'])],
+                         [['short'], ['long']])
+        self.assertEqual((wrapped.single_calls, wrapped.batch_calls), (1, 1))
+        self.assertEqual(cached.stats()['hits'], 2)
@@ -0,0 +1,357 @@
+"""
+Bulk classification of texts by classifier from config.
+Usage : python main.py CONFIG.json INPUT OUTPUT.jsonl [--format jsonl|csv|text] [--text-field FIELD]
+                       [--id-field FIELD] [--workers N] [--batch-size N] [--import MODULE] [--restart]
+
+Input is read as stream (INPUT "-" - stdin), results are written as JSON lines in input order.
+Progress is checkpointed to OUTPUT.checkpoint, restarted run continues from last checkpoint.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import csv
+import importlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from .base_classifier import BaseClassifier
+
+
+FORMATS = ('jsonl', 'csv', 'text')
+
+
+class _CountingReader:
+    """
+    Decoded lines of binary stream with count of consumed bytes (for progress estimation)
+    """
+
+    def __init__(self, stream, encoding='utf-8'):
+        self._stream = stream
+        self._encoding = encoding
+        self.position = 0
+
+    def __iter__(self):
+        for line in self._stream:
+            self.position += len(line)
+            yield line.decode(self._encoding)
+
+
+def read_records(lines, fmt, text_field='text', id_field=None):
+    """
+    Parse input records
+    :param lines: input lines
+    :type lines: collections.abc.Iterable[str]
+    :param fmt: input format : 'jsonl' (JSON objects or strings), 'csv' (with header) or 'text' (text per line)
+    :type fmt: str
+    :param text_field: JSON/CSV text field
+    :type text_field: str
+    :param id_field: JSON/CSV field to copy to output, None - don't copy
+    :type id_field: str|NoneType
+    :return: (record id, text) pairs, id is None if id_field is not set
+    :rtype: collections.abc.Iterator[tuple[object, str]]
+    """
+    if fmt == 'csv':
+        records = csv.DictReader(lines)
+    elif fmt == 'jsonl':
+        records = (json.loads(line) for line in lines if line.strip())
+    elif fmt == 'text':
+        records = (line.rstrip('\r\n') for line in lines)
+    else:
+        raise ValueError("Unknown input format : {0}".format(fmt))
+    for record in records:
+        if isinstance(record, str):
+            yield None, record
+        else:
+            yield (record.get(id_field) if id_field else None), record[text_field]
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Checkpoint:
+    """
+    Bulk run progress : processed records count and output size after them.
+    Saved atomically, so it always points to complete output lines.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize checkpoint
+        :param path: checkpoint file path
+        :type path: str
+        """
+        self.path = path
+
+    def load(self):
+        """
+        Get saved progress
+        :return: progress (done, output_size, input), None if there is no checkpoint
+        :rtype: dict|NoneType
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, done, output_size, source):
+        """
+        Store progress
+        :param done: processed records count
+        :type done: int
+        :param output_size: output file size after processed records
+        :type output_size: int
+        :param source: input name (to check resumed run reads same input)
+        :type source: str
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp('.checkpoint', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'done': done, 'output_size': output_size, 'input': source}, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Progress:
+    """
+    Throughput and ETA reporter
+    """
+
+    def __init__(self, total_bytes=None, interval=5.0, stream=None):
+        """
+        Initialize reporter
+        :param total_bytes: input size (for ETA), None - unknown
+        :type total_bytes: int|NoneType
+        :param interval: report interval (seconds)
+        :type interval: float
+        :param stream: report stream, None - stderr
+        :type stream: io.TextIOBase|NoneType
+        """
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.start = time.perf_counter()
+        self.start_position = None
+        self._reported = self.start
+
+    def line(self, done, processed, errors, position=None):
+        """
+        Get progress line
+        :param done: all processed records (including ones processed before resume)
+        :type done: int
+        :param processed: records processed by this run
+        :type processed: int
+        :param errors: failed records
+        :type errors: int
+        :param position: consumed input bytes
+        :type position: int|NoneType
+        :rtype: str
+        """
+        elapsed = time.perf_counter() - self.start
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        line = "{0} texts ({1} errors), {2:.1f} texts/s".format(done, errors, rate)
+        if self.total_bytes and position is not None and self.start_position is not None \
+                and position > self.start_position:
+            remaining = elapsed * (self.total_bytes - position) / (position - self.start_position)
+            line += ", {0:.1f}% , ETA {1}".format(100.0 * position / self.total_bytes, _duration(remaining))
+        return line
+
+    def report(self, done, processed, errors, position=None, force=False):
+        now = time.perf_counter()
+        if not force and now - self._reported < self.interval:
+            return
+        self._reported = now
+        print(self.line(done, processed, errors, position), file=self.stream, flush=True)
+
+
+def _duration(seconds):
+    seconds = int(max(seconds, 0))
+    return '{0}:{1:02d}:{2:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def _classify_batch(classifier, texts):
+    """
+    Classify batch, failed batch is classified text by text to isolate failed texts
+    :return: (result, error) pairs
+    :rtype: list[tuple[dict|NoneType, str|NoneType]]
+    """
+    try:
+        return [(result, None) for result in classifier.classify_many(texts)]
+    except Exception:
+        pairs = []
+        for text in texts:
+            try:
+                pairs.append((classifier.classify(text), None))
+            except Exception as e:
+                pairs.append((None, '{0}: {1}'.format(type(e).__name__, e)))
+        return pairs
+
+
+def classify_stream(classifier, records, output, workers=4, batch_size=20, start_index=0, on_written=None):
+    """
+    Classify records by concurrent batches and write results as JSON lines in input order.
+    At most 2 * workers batches are in memory at once.
+    :param classifier: classifier
+    :type classifier: BaseClassifier
+    :param records: (record id, text) pairs (see read_records)
+    :type records: collections.abc.Iterable[tuple[object, str]]
+    :param output: output text stream
+    :type output: io.TextIOBase
+    :param workers: concurrent classify_many calls
+    :type workers: int
+    :param batch_size: texts per classify_many call
+    :type batch_size: int
+    :param start_index: index of first record (for resumed runs)
+    :type start_index: int
+    :param on_written: function(written, errors), that is called after every written batch
+    :type on_written: callable|NoneType
+    :return: written records, failed records
+    :rtype: tuple[int, int]
+    """
+    written = 0
+    errors = 0
+    pending = deque()
+
+    def write_next():
+        nonlocal written, errors
+        batch, future = pending.popleft()
+        for (record_id, text), (result, error) in zip(batch, future.result()):
+            line = {'index': start_index + written, 'text': text}
+            if record_id is not None:
+                line['id'] = record_id
+            if error is None:
+                line['result'] = dict(result)
+            else:
+                line['error'] = error
+                errors += 1
+            output.write(json.dumps(line, ensure_ascii=False) + '\n')
+            written += 1
+        if on_written is not None:
+            on_written(written, errors)
+
+    with ThreadPoolExecutor(workers) as executor:
+        try:
+            for batch in _batches(records, batch_size):
+                pending.append((batch, executor.submit(_classify_batch, classifier, [text for _, text in batch])))
+                while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+                    write_next()
+            while pending:
+                write_next()
+        finally:
+            for _, future in pending:
+                future.cancel()
+    return written, errors
+
+
+def _input_format(args):
+    if args.format:
+        return args.format
+    extension = os.path.splitext(args.input)[1].lower()
+    if extension in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    return 'text'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify texts by classifier from config')
+    parser.add_argument('config', help='classifier config JSON (see BaseClassifier.from_config)')
+    parser.add_argument('input', help='input file, "-" - stdin')
+    parser.add_argument('output', help='output JSON lines file')
+    parser.add_argument('--format', choices=FORMATS, help='input format, default - by input extension')
+    parser.add_argument('--text-field', default='text', help='JSON/CSV text field')
+    parser.add_argument('--id-field', help='JSON/CSV field to copy to output')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent classify_many calls')
+    parser.add_argument('--batch-size', type=int, default=20, help='texts per classify_many call')
+    parser.add_argument('--checkpoint-interval', type=float, default=10.0, help='seconds between checkpoints')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='seconds between progress lines')
+    parser.add_argument('--import', dest='imports', action='append', default=[],
+                        help='module, that registers classifier class (e.g. nlc_abbyy)')
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoint and start from the beginning')
+    args = parser.parse_args(argv)
+
+    for module in args.imports:
+        importlib.import_module(module)
+    with open(args.config, 'r', encoding='utf-8') as f:
+        classifier = BaseClassifier.from_config(json.load(f))
+
+    checkpoint = Checkpoint(args.output + '.checkpoint')
+    state = None if args.restart else checkpoint.load()
+    if state is not None and state['input'] != args.input:
+        parser.error("checkpoint {0} belongs to input {1}, use --restart".format(checkpoint.path, state['input']))
+    done = state['done'] if state else 0
+
+    if args.input == '-':
+        source = sys.stdin.buffer
+        total_bytes = None
+    else:
+        source = open(args.input, 'rb')
+        total_bytes = os.fstat(source.fileno()).st_size
+    reader = _CountingReader(source)
+    records = read_records(reader, _input_format(args), args.text_field, args.id_field)
+    for _ in itertools.islice(records, done):
+        pass
+
+    output = open(args.output, 'r+' if state else 'w', encoding='utf-8')
+    if state:
+        # Drop lines written after last checkpoint
+        output.truncate(state['output_size'])
+        output.seek(state['output_size'])
+        print("Resuming after {0} texts".format(done), file=sys.stderr)
+    progress = Progress(total_bytes, args.progress_interval)
+    progress.start_position = reader.position
+    last_checkpoint = time.perf_counter()
+    counters = {'written': 0, 'errors': 0, 'output_size': output.tell()}
+
+    def save_checkpoint():
+        output.flush()
+        os.fsync(output.fileno())
+        checkpoint.save(done + counters['written'], counters['output_size'], args.input)
+
+    def on_written(written, errors):
+        nonlocal last_checkpoint
+        counters['written'], counters['errors'] = written, errors
+        counters['output_size'] = output.tell()
+        progress.report(done + written, written, errors, reader.position)
+        if time.perf_counter() - last_checkpoint >= args.checkpoint_interval:
+            save_checkpoint()
+            last_checkpoint = time.perf_counter()
+
+    try:
+        classify_stream(classifier, records, output, args.workers, args.batch_size, done, on_written)
+    except KeyboardInterrupt:
+        save_checkpoint()
+        print("Interrupted, progress is saved to {0}".format(checkpoint.path), file=sys.stderr)
+        return 130
+    except Exception:
+        save_checkpoint()
+        raise
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    output.close()
+    checkpoint.remove()
+    progress.report(done + counters['written'], counters['written'], counters['errors'], reader.position,
+                    force=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from nlc import BaseClassifier
+from nlc.cli import classify_stream, read_records, main
+
+
+class LengthClassifier(BaseClassifier):
+    """
+    Scores text by its length, fails (as interrupted run) on `interrupt_on` text
+    """
+
+    def __init__(self, interrupt_on=None):
+        self.interrupt_on = interrupt_on
+
+    def classify(self, text):
+        if text == self.interrupt_on:
+            raise KeyboardInterrupt()
+        if text == 'broken':
+            raise ValueError('broken text')
+        # Later batches finish earlier - output order must not depend on it
+        time.sleep(0.001 * (10 - len(text) % 10))
+        return OrderedDict([('long', len(text) / 100.0), ('short', 1 - len(text) / 100.0)])
+
+    def _get_config(self):
+        return {'interrupt_on': self.interrupt_on}
+
+
+BaseClassifier.register('cli_test_length', LengthClassifier)
+
+
+class CliTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.texts = ['text number {0}'.format('x' * i) for i in range(60)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_ordered_output(self):
+        output = io.StringIO()
+        records = read_records(io.StringIO('\n'.join(self.texts + ['broken']) + '\n'), 'text')
+        written, errors = classify_stream(LengthClassifier(), records, output, workers=4, batch_size=3)
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual((written, errors), (61, 1))
+        self.assertEqual([line['text'] for line in lines], self.texts + ['broken'])
+        self.assertEqual([line['index'] for line in lines], list(range(61)))
+        self.assertIn('error', lines[-1])
+
+    def test_resume(self):
+        with open(self.path('input.jsonl'), 'w') as f:
+            for i, text in enumerate(self.texts):
+                f.write(json.dumps({'id': i, 'text': text}) + '\n')
+        for name, interrupt_on in [('interrupted.json', self.texts[40]), ('config.json', None)]:
+            with open(self.path(name), 'w') as f:
+                json.dump(LengthClassifier(interrupt_on).config, f)
+        arguments = [self.path('input.jsonl'), self.path('output.jsonl'), '--id-field', 'id',
+                     '--workers', '2', '--batch-size', '4', '--checkpoint-interval', '0']
+        self.assertEqual(main([self.path('interrupted.json')] + arguments), 130)
+        with open(self.path('output.jsonl.checkpoint')) as f:
+            self.assertLess(json.load(f)['done'], 41)
+        self.assertEqual(main([self.path('config.json')] + arguments), 0)
+        self.assertFalse(os.path.exists(self.path('output.jsonl.checkpoint')))
+        with open(self.path('output.jsonl')) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['id'] for line in lines], list(range(len(self.texts))))
+        self.assertEqual([line['text'] for line in lines], self.texts)
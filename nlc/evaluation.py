@@ -0,0 +1,239 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy
+from .base_classifier import DEFAULT_THRESHOLD, _has_batch_path
+
+
+class EvaluationReport:
+    """
+    Classifier evaluation result. Keeps example-by-class score matrix, all metrics are computed from it.
+    """
+
+    def __init__(self, labels, examples, truth, scores, elapsed, threshold=DEFAULT_THRESHOLD):
+        """
+        Initialize report
+        :param labels: class names (score matrix columns)
+        :type labels: list[str]
+        :param examples: example texts (score matrix rows)
+        :type examples: list[str]
+        :param truth: right class index of every example
+        :type truth: numpy.ndarray
+        :param scores: example-by-class confidence matrix
+        :type scores: numpy.ndarray
+        :param elapsed: classification time (seconds)
+        :type elapsed: float
+        :param threshold: default confidence threshold
+        :type threshold: float
+        """
+        self.labels = labels
+        self.examples = examples
+        self.truth = truth
+        self.scores = scores
+        self.elapsed = elapsed
+        self.threshold = threshold
+
+    @property
+    def expected(self):
+        """
+        Get one-hot expected matrix
+        :rtype: numpy.ndarray
+        """
+        expected = numpy.zeros(self.scores.shape)
+        expected[numpy.arange(len(self.truth)), self.truth] = 1.0
+        return expected
+
+    @property
+    def throughput(self):
+        """
+        Get evaluation throughput
+        :return: classified examples per second
+        :rtype: float
+        """
+        if not self.elapsed:
+            return float('inf')
+        return len(self.examples) / self.elapsed
+
+    def _threshold(self, threshold):
+        return self.threshold if threshold is None else threshold
+
+    def mse(self, threshold=None):
+        """
+        Get mean-square error of thresholded decisions (confidence > threshold) over all example/class pairs
+        :param threshold: confidence threshold, None - report threshold
+        :type threshold: float|NoneType
+        :return: error
+        :rtype: float
+        """
+        if not self.scores.size:
+            return 0.0
+        decisions = (self.scores > self._threshold(threshold)).astype(float)
+        return float(numpy.mean((self.expected - decisions) ** 2))
+
+    def score_mse(self):
+        """
+        Get mean-square error of raw confidences (Brier score)
+        :return: error
+        :rtype: float
+        """
+        if not self.scores.size:
+            return 0.0
+        return float(numpy.mean((self.expected - self.scores) ** 2))
+
+    def predictions(self):
+        """
+        Get top-1 predicted class index of every example
+        :rtype: numpy.ndarray
+        """
+        return numpy.argmax(self.scores, axis=1)
+
+    def accuracy(self):
+        """
+        Get top-1 accuracy
+        :rtype: float
+        """
+        if not len(self.truth):
+            return 0.0
+        return float(numpy.mean(self.predictions() == self.truth))
+
+    def confusion_matrix(self):
+        """
+        Get top-1 confusion matrix
+        :return: matrix[right class index, predicted class index] = examples count
+        :rtype: numpy.ndarray
+        """
+        size = len(self.labels)
+        matrix = numpy.zeros((size, size), dtype=int)
+        numpy.add.at(matrix, (self.truth, self.predictions()), 1)
+        return matrix
+
+    def threshold_sweep(self, thresholds=None):
+        """
+        Get per-class precision/recall/F1 of thresholded decisions for every threshold
+        :param thresholds: thresholds, None - 0.05..0.95 by 0.05
+        :type thresholds: collections.abc.Iterable[float]|NoneType
+        :return: thresholds, precision, recall, f1 (threshold-by-class matrices), mse (per threshold)
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        if thresholds is None:
+            thresholds = numpy.linspace(0.05, 0.95, 19)
+        thresholds = numpy.asarray(list(thresholds), dtype=float)
+        expected = self.expected.astype(bool)
+        decisions = self.scores[None, :, :] > thresholds[:, None, None]
+        true_positive = numpy.sum(decisions & expected[None, :, :], axis=1)
+        predicted = numpy.sum(decisions, axis=1)
+        actual = numpy.sum(expected, axis=0)[None, :]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            precision = numpy.where(predicted > 0, true_positive / predicted, 0.0)
+            recall = numpy.where(actual > 0, true_positive / actual, 0.0)
+            f1 = numpy.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        if self.scores.size:
+            mse = numpy.mean((expected[None, :, :] ^ decisions).astype(float), axis=(1, 2))
+        else:
+            mse = numpy.zeros(len(thresholds))
+        return thresholds, precision, recall, f1, mse
+
+    def class_metrics(self, threshold=None):
+        """
+        Get per-class metrics of thresholded decisions
+        :param threshold: confidence threshold, None - report threshold
+        :type threshold: float|NoneType
+        :return: class name -> {'precision', 'recall', 'f1', 'support'}
+        :rtype: dict[str, dict[str, float]]
+        """
+        _, precision, recall, f1, _ = self.threshold_sweep([self._threshold(threshold)])
+        support = numpy.bincount(self.truth, minlength=len(self.labels))
+        return {
+            label: {
+                'precision': float(precision[0, i]),
+                'recall': float(recall[0, i]),
+                'f1': float(f1[0, i]),
+                'support': int(support[i])
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+    def best_threshold(self, thresholds=None):
+        """
+        Get threshold with max macro-averaged F1
+        :param thresholds: candidate thresholds (see threshold_sweep)
+        :type thresholds: collections.abc.Iterable[float]|NoneType
+        :return: threshold, macro F1
+        :rtype: tuple[float, float]
+        """
+        thresholds, _, _, f1, _ = self.threshold_sweep(thresholds)
+        macro_f1 = numpy.mean(f1, axis=1)
+        best = int(numpy.argmax(macro_f1))
+        return float(thresholds[best]), float(macro_f1[best])
+
+    def __str__(self):
+        lines = ["{0} examples, {1} classes, {2:.3f}s ({3:.1f} examples/s)".format(
+            len(self.examples), len(self.labels), self.elapsed, self.throughput)]
+        lines.append("MSE (threshold {0}) : {1:.5f}, top-1 accuracy : {2:.5f}".format(
+            self.threshold, self.mse(), self.accuracy()))
+        width = max([len(label) for label in self.labels] + [5])
+        lines.append("{0:<{width}} {1:>9} {2:>9} {3:>9} {4:>9}".format(
+            'class', 'precision', 'recall', 'f1', 'support', width=width))
+        for label, values in self.class_metrics().items():
+            lines.append("{0:<{width}} {1:>9.3f} {2:>9.3f} {3:>9.3f} {4:>9}".format(
+                label, values['precision'], values['recall'], values['f1'], values['support'], width=width))
+        return '\n'.join(lines)
+
+
+def evaluate(classifier, classes_examples, threshold=DEFAULT_THRESHOLD, workers=8, batch_size=100, verbose=False):
+    """
+    Classify test examples and build evaluation report.
+    Classifiers with native classify_many get examples by batches, others - one by one,
+    in both cases requests are sent by several concurrent workers.
+    :param classifier: classifier
+    :type classifier: BaseClassifier
+    :param classes_examples: class name -> examples
+    :type classes_examples: dict[str, list[str]]
+    :param threshold: default report confidence threshold
+    :type threshold: float
+    :param workers: concurrent workers
+    :type workers: int
+    :param batch_size: examples per classify_many call
+    :type batch_size: int
+    :param verbose: print every example classification result?
+    :type verbose: bool
+    :return: report
+    :rtype: EvaluationReport
+    """
+    labels = list(classes_examples.keys())
+    examples = []
+    truth = []
+    for label_index, label in enumerate(labels):
+        for example in classes_examples[label]:
+            examples.append(example)
+            truth.append(label_index)
+    if _has_batch_path(classifier):
+        chunks = [examples[i:i + batch_size] for i in range(0, len(examples), batch_size)]
+        classify_chunk = classifier.classify_many
+    else:
+        chunks = [[example] for example in examples]
+
+        def classify_chunk(chunk):
+            return [classifier.classify(chunk[0])]
+    start = time.perf_counter()
+    results = []
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(min(workers, len(chunks))) as executor:
+            for chunk_results in executor.map(classify_chunk, chunks):
+                results.extend(chunk_results)
+    else:
+        for chunk in chunks:
+            results.extend(classify_chunk(chunk))
+    elapsed = time.perf_counter() - start
+    label_indexes = {label: i for i, label in enumerate(labels)}
+    for result in results:
+        for label in result.keys():
+            if label not in label_indexes:
+                label_indexes[label] = len(labels)
+                labels.append(label)
+    scores = numpy.zeros((len(examples), len(labels)))
+    for row, result in enumerate(results):
+        if verbose:
+            print(examples[row], result)
+        for label, confidence in result.items():
+            scores[row, label_indexes[label]] = confidence
+    return EvaluationReport(labels, examples, numpy.array(truth, dtype=int), scores, elapsed, threshold)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+import threading
+import unittest
+import numpy
+from nlc import BaseClassifier, evaluate
+
+
+class KeywordClassifier(BaseClassifier):
+    def __init__(self, keywords):
+        self.keywords = keywords
+        self.batches = 0
+
+    def classify(self, text):
+        return OrderedDict(
+            (name, 0.9 if any(keyword in text for keyword in keywords) else 0.1)
+            for name, keywords in self.keywords.items()
+        )
+
+
+class BatchKeywordClassifier(KeywordClassifier):
+    def classify_many(self, texts):
+        self.batches += 1
+        return [self.classify(text) for text in texts]
+
+
+class EvaluationTest(unittest.TestCase):
+    def setUp(self):
+        self.keywords = {'capabilities': ['help', 'can you'], 'locate_amenity': ['find', 'eat']}
+        self.examples = {
+            'capabilities': ['help me', 'what can you do', 'what else'],
+            'locate_amenity': ['find a restaurant', 'i want to eat', 'where is ATM', 'can you find a cafe']
+        }
+
+    def test_report(self):
+        report = evaluate(KeywordClassifier(self.keywords), self.examples)
+        self.assertEqual(report.labels, ['capabilities', 'locate_amenity'])
+        self.assertEqual(report.scores.shape, (7, 2))
+        # 'what else', 'where is ATM' - 1 wrong decision each, 'can you find a cafe' - 1 wrong decision
+        self.assertAlmostEqual(report.mse(), 3 / 14.0)
+        # ties go to first class
+        numpy.testing.assert_array_equal(report.confusion_matrix(), [[3, 0], [2, 2]])
+        metrics = report.class_metrics()
+        self.assertAlmostEqual(metrics['capabilities']['precision'], 2 / 3.0)
+        self.assertAlmostEqual(metrics['capabilities']['recall'], 2 / 3.0)
+        self.assertAlmostEqual(metrics['locate_amenity']['recall'], 3 / 4.0)
+        self.assertEqual(metrics['locate_amenity']['support'], 4)
+        thresholds, precision, recall, f1, mse = report.threshold_sweep([0.05, 0.5, 0.95])
+        numpy.testing.assert_array_equal(recall[0], [1.0, 1.0])
+        numpy.testing.assert_array_equal(recall[2], [0.0, 0.0])
+        self.assertAlmostEqual(mse[1], report.mse(0.5))
+        self.assertGreater(report.throughput, 0)
+
+    def test_test_is_sequential(self):
+        threads = set()
+        classifier = KeywordClassifier(self.keywords)
+        classify = classifier.classify
+        classifier.classify = lambda text: threads.add(threading.get_ident()) or classify(text)
+        examples = {name: texts * 100 for name, texts in self.examples.items()}
+        self.assertAlmostEqual(classifier.test(examples), 3 / 14.0)
+        self.assertEqual(threads, {threading.get_ident()})
+
+    def test_batch_path(self):
+        classifier = BatchKeywordClassifier(self.keywords)
+        report = evaluate(classifier, self.examples, batch_size=3)
+        self.assertEqual(classifier.batches, 3)
+        self.assertEqual(report.examples[-1], 'can you find a cafe')
+        self.assertEqual(classifier.test(self.examples), report.mse())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+from collections import OrderedDict
+import base64
+import hashlib
+import re
+import threading
+import zlib
+import numpy
+from .base_classifier import BaseClassifier
+
+
+_TOKEN_RE = re.compile(r'\w+')
+_BIGRAM_MULTIPLIER = 0x9E3779B1
+
+
+def _encode_array(array):
+    return base64.b64encode(numpy.ascontiguousarray(array).tobytes()).decode('ascii')
+
+
+def _decode_array(data, dtype):
+    return numpy.frombuffer(base64.b64decode(data), dtype=dtype).copy()
+
+
+class LocalTfidfClassifier(BaseClassifier):
+    """
+    In-process classifier: hashed word/word bigram/char n-gram TF-IDF features,
+    cosine similarity to class centroids, softmax confidences.
+    Model is kept in compact arrays (only features seen in training) and saved in config.
+    Useful as fallback for network NLC (see MultiClassifier) or cheap first-tier filter.
+    """
+    _TOKEN_CACHE_SIZE = 100000
+
+    def __init__(self, n_features=2 ** 18, char_ngrams=(3, 4), scale=10.0, model=None):
+        """
+        Initialize classifier
+        :param n_features: feature hashing space size (power of 2)
+        :type n_features: int
+        :param char_ngrams: min, max char n-gram length (inside words), None - don't use char n-grams
+        :type char_ngrams: tuple[int, int]|list[int]|NoneType
+        :param scale: softmax scale of cosine similarities (bigger - more confident)
+        :type scale: float
+        :param model: trained model (see config)
+        :type model: dict|NoneType
+        """
+        assert n_features & (n_features - 1) == 0, "n_features must be power of 2"
+        self.n_features = n_features
+        self.char_ngrams = tuple(char_ngrams) if char_ngrams is not None else None
+        self.scale = scale
+        self._mask = n_features - 1
+        self._token_cache = {}
+        self._lock = threading.Lock()
+        self._labels = []
+        self._features = numpy.zeros(0, dtype=numpy.int32)
+        self._idf = numpy.zeros(0, dtype=numpy.float32)
+        self._weights = numpy.zeros((0, 0), dtype=numpy.float32)
+        self._lookup = None
+        self._index = {}
+        self._version = None
+        if model is not None:
+            self._set_model(model['labels'],
+                            _decode_array(model['features'], numpy.int32),
+                            _decode_array(model['idf'], numpy.float32),
+                            _decode_array(model['weights'], numpy.float32).reshape(-1, len(model['labels'])))
+
+    def _token_features(self, token):
+        """
+        Get token hash and hashed feature ids of token (word and its char n-grams)
+        :param token: normalized token
+        :type token: str
+        :return: 32-bit token hash, feature ids
+        :rtype: tuple[int, list[int]]
+        """
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+        mask = self._mask
+        token_hash = zlib.crc32(token.encode('utf-8'))
+        features = [token_hash & mask]
+        if self.char_ngrams is not None:
+            padded = ' ' + token + ' '
+            min_n, max_n = self.char_ngrams
+            for n in range(min_n, max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    features.append(zlib.crc32(padded[i:i + n].encode('utf-8'), 0x5bd1e995) & mask)
+        cached = (token_hash, features)
+        if len(self._token_cache) >= LocalTfidfClassifier._TOKEN_CACHE_SIZE:
+            self._token_cache = {}
+        self._token_cache[token] = cached
+        return cached
+
+    def _text_features(self, text):
+        """
+        Get hashed feature ids of text (with repeats)
+        :param text: text
+        :type text: str
+        :return: feature ids
+        :rtype: list[int]
+        """
+        mask = self._mask
+        result = []
+        previous_hash = None
+        for token in _TOKEN_RE.findall(text.casefold()):
+            token_hash, features = self._token_features(token)
+            result.extend(features)
+            if previous_hash is not None:
+                result.append(((previous_hash * _BIGRAM_MULTIPLIER) ^ token_hash) & mask)
+            previous_hash = token_hash
+        return result
+
+    def _hashed_matrix(self, texts):
+        """
+        Get hashed feature occurrences of texts
+        :param texts: texts
+        :type texts: list[str]
+        :return: row (text index) and hashed feature id of every occurrence
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        rows = []
+        columns = []
+        for row, text in enumerate(texts):
+            features = self._text_features(text)
+            rows.append(numpy.full(len(features), row, dtype=numpy.int64))
+            columns.append(features)
+        if not texts:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate(rows), numpy.fromiter(
+            (column for row_columns in columns for column in row_columns), dtype=numpy.int64)
+
+    @staticmethod
+    def _term_counts(rows, columns, width):
+        """
+        Sum repeated (row, column) occurrences
+        :return: rows, columns, counts of unique pairs (sorted by row)
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        keys, counts = numpy.unique(rows * width + columns, return_counts=True)
+        return keys // width, keys % width, counts.astype(numpy.float32)
+
+    def train(self, classes, verbose=False):
+        """
+        Train NLC
+        :param classes: class examples (any iterables)
+        :type classes: dict[str, collections.abc.Iterable[str]]
+        :param verbose: verbose
+        :type verbose: bool
+        """
+        labels = list(classes.keys())
+        texts = []
+        truth = []
+        for label_index, label in enumerate(labels):
+            for example in classes[label]:
+                texts.append(example)
+                truth.append(label_index)
+        truth = numpy.array(truth, dtype=numpy.int64)
+        rows, columns = self._hashed_matrix(texts)
+        features, columns = numpy.unique(columns, return_inverse=True)
+        rows, columns, counts = self._term_counts(rows, columns.reshape(-1), len(features))
+        document_frequency = numpy.bincount(columns, minlength=len(features))
+        idf = (numpy.log((1.0 + len(texts)) / (1.0 + document_frequency)) + 1.0).astype(numpy.float32)
+        values = (1.0 + numpy.log(counts)) * idf[columns]
+        norms = numpy.sqrt(numpy.bincount(rows, weights=values * values, minlength=len(texts)))
+        values = values / numpy.maximum(norms[rows], 1e-12)
+        weights = numpy.zeros((len(features), len(labels)), dtype=numpy.float32)
+        numpy.add.at(weights, (columns, truth[rows]), values)
+        weights /= numpy.maximum(numpy.linalg.norm(weights, axis=0, keepdims=True), 1e-12)
+        self._set_model(labels, features.astype(numpy.int32), idf, weights)
+        if verbose:
+            print("Trained {0} classes on {1} examples, {2} features".format(
+                len(labels), len(texts), len(features)))
+
+    def _set_model(self, labels, features, idf, weights):
+        lookup = numpy.full(self.n_features, -1, dtype=numpy.int32)
+        lookup[features] = numpy.arange(len(features), dtype=numpy.int32)
+        digest = hashlib.sha1()
+        for part in ('\n'.join(labels).encode('utf-8'), features.tobytes(), idf.tobytes(), weights.tobytes()):
+            digest.update(part)
+        with self._lock:
+            self._labels = labels
+            self._features = features
+            self._idf = idf
+            self._weights = numpy.ascontiguousarray(weights, dtype=numpy.float32)
+            self._lookup = lookup
+            self._index = {int(feature): column for column, feature in enumerate(features.tolist())}
+            self._version = digest.hexdigest()[:16]
+
+    @property
+    def model_version(self):
+        return self._version
+
+    def _snapshot(self):
+        """
+        Get consistent model state (concurrent train replaces model as whole)
+        :return: labels, idf, weights, feature lookup array, feature -> column dict
+        :rtype: tuple
+        """
+        with self._lock:
+            return self._labels, self._idf, self._weights, self._lookup, self._index
+
+    def similarities(self, texts):
+        """
+        Get cosine similarities of texts to class centroids
+        :param texts: texts
+        :type texts: list[str]
+        :return: text-by-class similarity matrix (columns are ordered as trained classes)
+        :rtype: numpy.ndarray
+        """
+        return self._similarities(texts, self._snapshot())
+
+    def _similarities(self, texts, model):
+        labels, idf, weights, lookup, _ = model
+        if lookup is None:
+            raise ValueError("Classifier is not trained")
+        rows, columns = self._hashed_matrix(texts)
+        columns = lookup[columns]
+        known = columns >= 0
+        rows, columns, counts = self._term_counts(rows[known], columns[known], len(idf))
+        values = (1.0 + numpy.log(counts)) * idf[columns]
+        norms = numpy.sqrt(numpy.bincount(rows, weights=values * values, minlength=len(texts)))
+        scores = numpy.zeros((len(texts), len(labels)), dtype=numpy.float32)
+        if len(rows):
+            contributions = weights[columns] * values[:, None]
+            starts = numpy.flatnonzero(numpy.r_[True, rows[1:] != rows[:-1]])
+            scores[rows[starts]] = numpy.add.reduceat(contributions, starts, axis=0)
+        return scores / numpy.maximum(norms, 1e-12)[:, None]
+
+    def _text_similarities(self, text, model):
+        """
+        Get cosine similarities of single text to class centroids. Same as similarities([text])[0],
+        but counts features by dict, that is faster for single text than numpy sort.
+        :param text: text
+        :type text: str
+        :param model: model state (see _snapshot)
+        :type model: tuple
+        :return: similarities
+        :rtype: numpy.ndarray
+        """
+        labels, idf, weights, lookup, index = model
+        if lookup is None:
+            raise ValueError("Classifier is not trained")
+        counts = {}
+        for feature in self._text_features(text):
+            column = index.get(feature)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        if not counts:
+            return numpy.zeros(len(labels), dtype=numpy.float32)
+        columns = numpy.fromiter(counts.keys(), dtype=numpy.int64, count=len(counts))
+        values = (1.0 + numpy.log(numpy.fromiter(counts.values(), dtype=numpy.float32, count=len(counts)))) \
+            * idf[columns]
+        return values.dot(weights[columns]) / max(float(numpy.sqrt(values.dot(values))), 1e-12)
+
+    def confidences(self, texts):
+        """
+        Get class confidences of texts (softmax of scaled similarities)
+        :param texts: texts
+        :type texts: list[str]
+        :return: text-by-class confidence matrix (columns are ordered as trained classes)
+        :rtype: numpy.ndarray
+        """
+        return self._confidences(texts, self._snapshot())
+
+    def _confidences(self, texts, model):
+        if len(texts) == 1:
+            similarities = self._text_similarities(texts[0], model)[None, :]
+        else:
+            similarities = self._similarities(texts, model)
+        logits = similarities * self.scale
+        logits -= logits.max(axis=1, keepdims=True)
+        exponents = numpy.exp(logits)
+        return exponents / exponents.sum(axis=1, keepdims=True)
+
+    def classify(self, text):
+        return self.classify_many([text])[0]
+
+    def classify_many(self, texts):
+        if not texts:
+            return []
+        model = self._snapshot()
+        labels = model[0]
+        confidences = self._confidences(texts, model)
+        order = numpy.argsort(-confidences, axis=1, kind='stable')
+        return [
+            OrderedDict((labels[column], float(row_confidences[column])) for column in row_order)
+            for row_confidences, row_order in zip(confidences.tolist(), order.tolist())
+        ]
+
+    def classify_matrix(self, texts, labels=None):
+        from .result import ScoreMatrix
+        model = self._snapshot()
+        matrix = ScoreMatrix(model[0], self._confidences(texts, model) if texts else [])
+        return matrix if labels is None else matrix.reindex(labels)
+
+    def _get_config(self):
+        model = None
+        with self._lock:
+            if self._lookup is not None:
+                model = {
+                    'labels': list(self._labels),
+                    'features': _encode_array(self._features),
+                    'idf': _encode_array(self._idf),
+                    'weights': _encode_array(self._weights)
+                }
+        return {
+            'n_features': self.n_features,
+            'char_ngrams': list(self.char_ngrams) if self.char_ngrams is not None else None,
+            'scale': self.scale,
+            'model': model
+        }
+
+
+BaseClassifier.register('local_tfidf', LocalTfidfClassifier)
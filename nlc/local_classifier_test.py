@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import unittest
+from nlc import BaseClassifier, LocalTfidfClassifier
+from nlc import classifier_test
+
+
+class LocalTfidfClassifierTest(classifier_test.ClassifierTest):
+    def build_classifier(self):
+        return LocalTfidfClassifier()
+
+    def test_nothing(self):
+        # Bag of n-grams has no semantics - "You can't test this" shares "can" with capabilities examples,
+        # so check text without any known features
+        classes = self.classifier.classify("qwerty zxcvb")
+        self.assertTrue(classes['locate_amenity'] <= 0.6)
+        self.assertTrue(classes['capabilities'] <= 0.6)
+
+    def test_classify_many(self):
+        texts = ['where can i eat pizza', 'what can you do', 'where can i eat pizza']
+        results = self.classifier.classify_many(texts)
+        self.assertEqual([list(result.keys())[0] for result in results],
+                         ['locate_amenity', 'capabilities', 'locate_amenity'])
+        for result, text in zip(results, texts):
+            single = self.classifier.classify(text)
+            self.assertEqual(list(result.keys()), list(single.keys()))
+            for name, confidence in single.items():
+                self.assertAlmostEqual(result[name], confidence, places=5)
+        self.assertAlmostEqual(sum(results[0].values()), 1.0, places=5)
+
+    def test_model_version(self):
+        version = self.classifier.model_version
+        self.assertIsNotNone(version)
+        restored = BaseClassifier.from_config(self.classifier.config)
+        self.assertEqual(restored.model_version, version)
+        self.classifier.train({'a': ['first'], 'b': ['second']})
+        self.assertNotEqual(self.classifier.model_version, version)
+
+    def test_classify_during_train(self):
+        # Models have different label orders, so labels of one model with scores of other are wrong
+        models = [{'a_pizza': ['eat pizza'], 'b_weather': ['rain weather']},
+                  {'a_weather': ['rain weather'], 'b_pizza': ['eat pizza']}]
+        classifier = LocalTfidfClassifier()
+        classifier.train(models[0])
+        started = threading.Event()
+        trained = threading.Event()
+
+        class BlockingText(str):
+            # Holds classification after it has started, until model is replaced
+            def casefold(self):
+                started.set()
+                trained.wait(5.0)
+                return str.casefold(self)
+
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(classifier.classify_many, [BlockingText('eat pizza'), 'rain weather'])
+            self.assertTrue(started.wait(5.0))
+            classifier.train(models[1])
+            trained.set()
+            results = future.result(5.0)
+        self.assertIn(set(results[0]), [set(model) for model in models])
+        self.assertEqual([list(result)[0][2:] for result in results], ['pizza', 'weather'])
+        matrix = classifier.classify_matrix(['eat pizza', 'rain weather'])
+        self.assertEqual(list(matrix.labels), list(models[1]))
+        self.assertEqual([labels[0][2:] for labels in matrix.top_k_labels(1)], ['pizza', 'weather'])
+
+
+if __name__ == '__main__':
+    unittest.main()
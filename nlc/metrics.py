@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+
+class Histogram:
+    """
+    Histogram with exponential buckets
+    """
+    BOUNDS = [0.0001 * 2 ** i for i in range(20)]
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(Histogram.BOUNDS) + 1)
+
+    def observe(self, value):
+        """
+        Add value
+        :param value: value
+        :type value: float
+        """
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.buckets[bisect.bisect_left(Histogram.BOUNDS, value)] += 1
+
+    def percentile(self, q):
+        """
+        Get approximate percentile (upper bound of bucket, that contains it)
+        :param q: percentile (0-100)
+        :type q: float
+        :return: value
+        :rtype: float|NoneType
+        """
+        if not self.count:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank and bucket:
+                if index < len(Histogram.BOUNDS):
+                    return min(Histogram.BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    def snapshot(self):
+        """
+        Get histogram summary
+        :return: summary
+        :rtype: dict[str, float]
+        """
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _Timer:
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._registry.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms registry. Disabled registry ignores all measurements,
+    so instrumentation costs single attribute check.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Initialize registry
+        :param enabled: collect measurements?
+        :type enabled: bool
+        """
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """
+        Increment counter
+        :param name: counter name
+        :type name: str
+        :param value: increment
+        :type value: int|float
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for hook in self._hooks:
+            hook('counter', name, value)
+
+    def observe(self, name, value):
+        """
+        Add histogram value
+        :param name: histogram name
+        :type name: str
+        :param value: value (seconds for timings)
+        :type value: float
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = Histogram()
+                self._histograms[name] = histogram
+            histogram.observe(value)
+        for hook in self._hooks:
+            hook('histogram', name, value)
+
+    def timer(self, name):
+        """
+        Get context manager, that measures block time into histogram
+        :param name: histogram name
+        :type name: str
+        :return: context manager
+        """
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name)
+
+    def add_hook(self, hook):
+        """
+        Add measurements hook
+        :param hook: function(kind, name, value), kind is 'counter' or 'histogram'
+        :type hook: callable
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        Remove measurements hook
+        :param hook: hook
+        :type hook: callable
+        """
+        self._hooks.remove(hook)
+
+    def reset(self):
+        """
+        Drop all measurements
+        """
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def stats(self):
+        """
+        Get measurements snapshot
+        :return: {'counters': {name: value}, 'histograms': {name: summary}}
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+            }
+
+    @contextmanager
+    def profile(self):
+        """
+        Collect measurements of code block. Registry is enabled and reset inside block.
+        Usage :
+            with registry.profile() as profile:
+                classifier.classify(text)
+            print(profile['histograms'])
+        :return: dict, that is filled by measurements snapshot on exit
+        :rtype: dict
+        """
+        enabled = self.enabled
+        self.reset()
+        self.enabled = True
+        snapshot = {}
+        try:
+            yield snapshot
+        finally:
+            snapshot.update(self.stats())
+            self.enabled = enabled
+
+
+registry = MetricsRegistry()
+
+
+def stats():
+    """
+    Get default registry measurements snapshot
+    :return: measurements
+    :rtype: dict
+    """
+    return registry.stats()
+
+
+def profile():
+    """
+    Collect default registry measurements of code block (see MetricsRegistry.profile)
+    """
+    return registry.profile()
@@ -1,20 +1,143 @@
+from concurrent.futures import Future, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+import queue
+import threading
+import time
 from .base_classifier import BaseClassifier
+from . import metrics
+
+
+class _CircuitBreaker:
+    """
+    Thread-safe circuit breaker. Opens after `failure_threshold` failures in row,
+    after `cooldown` seconds single probe request is allowed, its result closes or reopens circuit.
+    """
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        if self.failure_threshold is None:
+            return True
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """
+        Finish request without health outcome (e.g. caller error), so probe slot isn't held
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        if self.failure_threshold is None:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self.opens += 1
+
+
+class _DaemonExecutor:
+    """
+    Worker pool on daemon threads, so hanging classifier calls can't keep interpreter from exit.
+    Threads are started on demand (when no worker is idle) up to `max_workers`.
+    """
+
+    def __init__(self, max_workers, name):
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._idle = threading.Semaphore(0)
+        self._threads = 0
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """
+        Run function by worker
+        :param function: function
+        :type function: callable
+        :return: future of function result
+        :rtype: Future
+        """
+        future = Future()
+        self._queue.put((future, function, args))
+        if not self._idle.acquire(timeout=0):
+            with self._lock:
+                if self._threads < self.max_workers:
+                    self._threads += 1
+                    threading.Thread(target=self._work, name='{0}-{1}'.format(self.name, self._threads),
+                                     daemon=True).start()
+        return future
+
+    def _work(self):
+        while True:
+            future, function, args = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = function(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            self._idle.release()
 
 
 class MultiClassifier(BaseClassifier):
     """
     Classifier will use one NLC and return to other if it's throws error.
     E.g. you can use some network NLC (e.g. Watson)
-      and switch back to simple local NLC if it not available
+      and switch back to simple local NLC if it not available.
+    If front NLC doesn't answer within latency budget, back NLC is started in parallel
+    (by its own daemon workers, so hanging front requests can't delay it or process exit) and first valid answer wins.
+    After repeated front failures (or timeouts) all requests go straight to back NLC for cooldown period.
     """
+    _MAX_WORKERS = 32
 
-    def __init__(self, front_classifier, back_classifier):
+    def __init__(self, front_classifier, back_classifier, latency_budget=None, failure_threshold=5, cooldown=30.0,
+                 hedge_timeout=30.0):
         """
         Initialize multiclassifier
         :param front_classifier: first NLC
         :type front_classifier: dict|BaseClassifier
         :param back_classifier: other NLC. Will be used if first throws error
         :type back_classifier: dict|BaseClassifier
+        :param latency_budget: time to wait front NLC answer before hedged back NLC request (seconds),
+            None - use back NLC only after front NLC error
+        :type latency_budget: float|NoneType
+        :param failure_threshold: front NLC failures in row, that open circuit, None - never open circuit
+        :type failure_threshold: int|NoneType
+        :param cooldown: time to send requests to back NLC only after circuit opened (seconds)
+        :type cooldown: float
+        :param hedge_timeout: max time to wait any answer after hedged back NLC request is started (seconds)
+        :type hedge_timeout: float
         """
         if isinstance(front_classifier, BaseClassifier):
             self._front = front_classifier
@@ -24,20 +147,149 @@ class MultiClassifier(BaseClassifier):
             self._back = back_classifier
         else:
             self._back = BaseClassifier.from_config(back_classifier)
+        self.latency_budget = latency_budget
+        self.hedge_timeout = hedge_timeout
+        self._breaker = _CircuitBreaker(failure_threshold, cooldown)
+        self._executors = {}
+        self._executor_lock = threading.Lock()
+        self._counters = {}
+        self._counters_lock = threading.Lock()
+        self.last_error = None
 
     def train(self, classes, verbose=False):
         self._front.train(classes, verbose)
         self._back.train(classes, verbose)
 
+    def publish(self):
+        self._front.publish()
+        self._back.publish()
+
+    @property
+    def model_version(self):
+        return self._front.model_version, self._back.model_version
+
     def classify(self, text):
+        return self._call('classify', text)
+
+    def classify_many(self, texts):
+        return self._call('classify_many', texts)
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+        metrics.registry.increment('multi.' + name)
+
+    def _front_failed(self, error):
+        if error is not None:
+            self.last_error = error
+        self._count('front_errors')
+        self._breaker.record_failure()
+
+    def _get_executor(self, name):
+        """
+        Get worker pool of classifier
+        :param name: 'front' or 'back'
+        :type name: str
+        :rtype: _DaemonExecutor
+        """
+        with self._executor_lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = _DaemonExecutor(MultiClassifier._MAX_WORKERS, 'multi-classifier-' + name)
+                self._executors[name] = executor
+            return executor
+
+    def _call(self, method, argument):
+        """
+        Call classifiers method
+        :param method: method name ('classify' or 'classify_many')
+        :type method: str
+        :param argument: method argument
+        :type argument: str|list[str]
+        :return: first valid result
+        """
+        front = getattr(self._front, method)
+        back = getattr(self._back, method)
+        if not self._breaker.allow():
+            self._count('short_circuits')
+            return back(argument)
+        if self.latency_budget is None:
+            try:
+                result = front(argument)
+            except Exception as e:
+                self._front_failed(e)
+                self._count('fallbacks')
+                return back(argument)
+            self._breaker.record_success()
+            return result
+        front_future = self._get_executor('front').submit(front, argument)
         try:
-            return self._front.classify(text)
+            result = front_future.result(self.latency_budget)
+        except FutureTimeoutError:
+            # Front request is too slow - count budget overrun as failure, even if it never completes
+            self._front_failed(None)
+            if front_future.cancel():
+                # Request didn't even start (front workers are busy) - drop it
+                front_future = None
+            return self._hedge(front_future, self._get_executor('back').submit(back, argument))
         except Exception as e:
-            print(e)
-            return self._back.classify(text)
+            self._front_failed(e)
+            self._count('fallbacks')
+            return back(argument)
+        self._breaker.record_success()
+        return result
+
+    def _hedge(self, front_future, back_future):
+        """
+        Wait first valid answer of slow front request and hedged back request
+        :param front_future: front request, None - front request is dropped
+        :type front_future: concurrent.futures.Future|NoneType
+        :param back_future: back request
+        :type back_future: concurrent.futures.Future
+        :return: result
+        """
+        self._count('hedges')
+        deadline = time.monotonic() + self.hedge_timeout
+        pending = {back_future} if front_future is None else {front_future, back_future}
+        while pending:
+            done, pending = wait(pending, max(deadline - time.monotonic(), 0), FIRST_COMPLETED)
+            if not done:
+                raise FutureTimeoutError("No answer in {0} seconds after hedged request".format(self.hedge_timeout))
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if future is front_future:
+                        self._count('hedge_front_wins')
+                        self._breaker.record_success()
+                    else:
+                        self._count('hedge_back_wins')
+                    return future.result()
+                if future is front_future:
+                    self.last_error = error
+        return back_future.result()
+
+    def stats(self):
+        """
+        Get failover statistics
+        :return: counters (front_errors, fallbacks, hedges, hedge_front_wins, hedge_back_wins,
+            short_circuits, circuit_opens) and circuit state
+        :rtype: dict
+        """
+        with self._counters_lock:
+            result = dict(self._counters)
+        result['circuit_opens'] = self._breaker.opens
+        result['circuit'] = self._breaker.state
+        return result
 
     def _get_config(self):
         return {
             'front_classifier': self._front.config,
-            'back_classifier': self._back.config
+            'back_classifier': self._back.config,
+            'latency_budget': self.latency_budget,
+            'failure_threshold': self._breaker.failure_threshold,
+            'cooldown': self._breaker.cooldown,
+            'hedge_timeout': self.hedge_timeout
         }
+
+
+BaseClassifier.register('multi', MultiClassifier)
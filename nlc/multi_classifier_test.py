@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import subprocess
+import sys
+import time
+import unittest
+from nlc import BaseClassifier, MultiClassifier
+
+
+class StubClassifier(BaseClassifier):
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def classify(self, text):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('{0} is down'.format(self.name))
+        return OrderedDict([(self.name, 1.0)])
+
+    def _get_config(self):
+        return {'name': self.name, 'delay': self.delay, 'fail': self.fail}
+
+
+BaseClassifier.register('multi_test_stub', StubClassifier)
+
+
+class MultiClassifierTest(unittest.TestCase):
+    def test_fallback(self):
+        multi = MultiClassifier(StubClassifier('front', fail=True), StubClassifier('back'))
+        self.assertEqual(list(multi.classify('help')), ['back'])
+        self.assertEqual(multi.stats()['front_errors'], 1)
+        self.assertEqual(multi.stats()['fallbacks'], 1)
+        self.assertEqual(str(multi.last_error), 'front is down')
+
+    def test_hedging(self):
+        multi = MultiClassifier(StubClassifier('front', delay=0.5), StubClassifier('back'), latency_budget=0.02)
+        start = time.perf_counter()
+        self.assertEqual(list(multi.classify('help')), ['back'])
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(multi.stats()['hedge_back_wins'], 1)
+
+    def test_hanging_front(self):
+        multi = MultiClassifier(StubClassifier('front', delay=2.0), StubClassifier('back'), latency_budget=0.05)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(40) as executor:
+            results = list(executor.map(multi.classify, ['help'] * 40))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual([list(result) for result in results], [['back']] * 40)
+        self.assertEqual(multi.stats()['circuit'], 'open')
+
+    def test_hanging_front_does_not_block_exit(self):
+        script = (
+            "from nlc import MultiClassifier\n"
+            "from nlc.multi_classifier_test import StubClassifier\n"
+            "multi = MultiClassifier(StubClassifier('front', delay=60.0), StubClassifier('back'), "
+            "latency_budget=0.01)\n"
+            "print(list(multi.classify('help')))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, timeout=30,
+                                check=True).stdout
+        self.assertEqual(output.strip(), b"['back']")
+        self.assertLess(time.perf_counter() - start, 20.0)
+
+    def test_circuit_breaker(self):
+        front = StubClassifier('front', fail=True)
+        multi = MultiClassifier(front, StubClassifier('back'), failure_threshold=2, cooldown=0.1)
+        for _ in range(5):
+            multi.classify('help')
+        self.assertEqual(front.calls, 2)
+        self.assertEqual(multi.stats()['short_circuits'], 3)
+        self.assertEqual(multi.stats()['circuit'], 'open')
+        time.sleep(0.1)
+        front.fail = False
+        self.assertEqual(list(multi.classify('help')), ['front'])
+        self.assertEqual(multi.stats()['circuit'], 'closed')
+
+    def test_config(self):
+        multi = MultiClassifier(StubClassifier('front'), StubClassifier('back'), latency_budget=0.2,
+                                failure_threshold=3, cooldown=10)
+        config = BaseClassifier.from_config(multi.config).config
+        self.assertEqual(config, multi.config)
+        self.assertEqual(config['latency_budget'], 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
+from .base_classifier import BaseClassifier
+from .multi_classifier import _CircuitBreaker
+from . import metrics
+
+
+class _Replica:
+    """
+    Pool replica with load and health state
+    """
+
+    def __init__(self, classifier, failure_threshold, cooldown, latency_decay):
+        self.classifier = classifier
+        self.breaker = _CircuitBreaker(failure_threshold, cooldown)
+        self.latency_decay = latency_decay
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+
+    def load(self):
+        """
+        Get expected wait of new request: (in-flight requests + 1) * average latency,
+        ties (e.g. no observed latency yet) are broken by in-flight and total requests
+        :rtype: tuple[float, int, int]
+        """
+        return (self.in_flight + 1) * (self.latency or 0.0), self.in_flight, self.requests
+
+    def observe(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_decay * (latency - self.latency)
+
+
+class PoolClassifier(BaseClassifier):
+    """
+    Pool of identically trained classifiers (e.g. several ABBYY projects), that spreads load between them.
+    Every request goes to healthy replica with least expected wait (in-flight requests and observed latency),
+    request, failed by backend error (see register_backend_error), is repeated on next replica,
+    other errors (e.g. invalid input) are raised as is. Replica with `failure_threshold` failures in row
+    is skipped for `cooldown` seconds.
+    """
+    _backend_errors = (OSError, TimeoutError, FutureTimeoutError)
+
+    def __init__(self, replicas, failure_threshold=3, cooldown=30.0, latency_decay=0.2):
+        """
+        Initialize pool
+        :param replicas: replica classifiers or their configs
+        :type replicas: list[dict|BaseClassifier]
+        :param failure_threshold: replica failures in row, that mark it unhealthy
+        :type failure_threshold: int
+        :param cooldown: time to route around unhealthy replica (seconds)
+        :type cooldown: float
+        :param latency_decay: weight of new latency in replica average latency
+        :type latency_decay: float
+        """
+        assert replicas, "Pool needs at least one replica"
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_decay = latency_decay
+        self._replicas = []
+        for replica in replicas:
+            if not isinstance(replica, BaseClassifier):
+                replica = BaseClassifier.from_config(replica)
+            self._replicas.append(_Replica(replica, failure_threshold, cooldown, latency_decay))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def register_backend_error(cls):
+        """
+        Register exception class, that means replica failure (network, server errors)
+        :param cls: exception class
+        :type cls: class
+        """
+        PoolClassifier._backend_errors += (cls,)
+
+    @property
+    def replicas(self):
+        """
+        Get replica classifiers
+        :rtype: list[BaseClassifier]
+        """
+        return [replica.classifier for replica in self._replicas]
+
+    def _fan_out(self, function):
+        """
+        Call function for every replica classifier in parallel
+        :param function: function(classifier)
+        :type function: callable
+        :return: results in replicas order
+        :rtype: list
+        """
+        with ThreadPoolExecutor(len(self._replicas)) as executor:
+            futures = [executor.submit(function, replica.classifier) for replica in self._replicas]
+            return [future.result() for future in futures]
+
+    def train(self, classes, verbose=False):
+        # Generators can't be read by several replicas - materialize examples once
+        classes = {name: list(examples) for name, examples in classes.items()}
+        self._fan_out(lambda classifier: classifier.train(classes, verbose))
+
+    def publish(self):
+        self._fan_out(lambda classifier: classifier.publish())
+
+    @property
+    def model_version(self):
+        return tuple(replica.classifier.model_version for replica in self._replicas)
+
+    def _acquire(self, excluded):
+        """
+        Choose replica and count request as in-flight
+        :param excluded: replicas, that already failed this request
+        :type excluded: set[_Replica]
+        :return: replica, None if all replicas are excluded
+        :rtype: _Replica|NoneType
+        """
+        with self._lock:
+            candidates = sorted((replica for replica in self._replicas if replica not in excluded),
+                                key=_Replica.load)
+            # Healthy replicas first, unhealthy ones are used only if nothing else left
+            chosen = None
+            for replica in candidates:
+                if replica.breaker.allow():
+                    chosen = replica
+                    break
+            if chosen is None and candidates:
+                chosen = candidates[0]
+            if chosen is not None:
+                chosen.in_flight += 1
+                chosen.requests += 1
+            return chosen
+
+    def _call(self, method, argument):
+        """
+        Call replica method with failover
+        :param method: method name ('classify' or 'classify_many')
+        :type method: str
+        :param argument: method argument
+        :type argument: str|list[str]
+        :return: result
+        """
+        excluded = set()
+        error = None
+        while True:
+            replica = self._acquire(excluded)
+            if replica is None:
+                raise error
+            start = time.perf_counter()
+            try:
+                result = getattr(replica.classifier, method)(argument)
+            except Exception as e:
+                if not isinstance(e, PoolClassifier._backend_errors):
+                    with self._lock:
+                        replica.in_flight -= 1
+                    replica.breaker.release()
+                    raise
+                error = e
+                with self._lock:
+                    replica.in_flight -= 1
+                    replica.failures += 1
+                replica.breaker.record_failure()
+                metrics.registry.increment('pool.failovers')
+                excluded.add(replica)
+                continue
+            with self._lock:
+                replica.in_flight -= 1
+                replica.observe(time.perf_counter() - start)
+            replica.breaker.record_success()
+            return result
+
+    def classify(self, text):
+        return self._call('classify', text)
+
+    def classify_many(self, texts):
+        """
+        Classify texts. Texts are split between healthy replicas and classified in parallel.
+        :param texts: texts
+        :type texts: list[str]
+        :return: classification results in input order
+        :rtype: list[OrderedDict[str, float]]
+        """
+        healthy = sum(1 for replica in self._replicas if replica.breaker.state == 'closed')
+        parts = max(1, min(healthy, len(texts)))
+        if parts == 1:
+            return self._call('classify_many', texts)
+        size = (len(texts) + parts - 1) // parts
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        with ThreadPoolExecutor(len(chunks)) as executor:
+            results = []
+            for chunk_results in executor.map(lambda chunk: self._call('classify_many', chunk), chunks):
+                results.extend(chunk_results)
+            return results
+
+    def stats(self):
+        """
+        Get replicas state
+        :return: per replica: in_flight, latency (average, seconds), requests, failures, state
+        :rtype: list[dict]
+        """
+        with self._lock:
+            return [
+                {
+                    'in_flight': replica.in_flight,
+                    'latency': replica.latency,
+                    'requests': replica.requests,
+                    'failures': replica.failures,
+                    'state': replica.breaker.state
+                }
+                for replica in self._replicas
+            ]
+
+    def _get_config(self):
+        return {
+            'replicas': [replica.classifier.config for replica in self._replicas],
+            'failure_threshold': self.failure_threshold,
+            'cooldown': self.cooldown,
+            'latency_decay': self.latency_decay
+        }
+
+
+BaseClassifier.register('pool', PoolClassifier)
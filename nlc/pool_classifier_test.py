@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import threading
+import time
+import unittest
+from nlc import BaseClassifier, PoolClassifier
+
+
+class ReplicaStub(BaseClassifier):
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.trained = None
+        self._lock = threading.Lock()
+
+    def train(self, classes, verbose=False):
+        self.trained = classes
+
+    def classify(self, text):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError('{0} is down'.format(self.name))
+        if text == 'invalid':
+            raise ValueError('invalid text')
+        return OrderedDict([(text, 1.0)])
+
+    def _get_config(self):
+        return {'name': self.name, 'delay': self.delay, 'fail': self.fail}
+
+
+BaseClassifier.register('pool_test_stub', ReplicaStub)
+
+
+class PoolClassifierTest(unittest.TestCase):
+    def test_train_fan_out(self):
+        pool = PoolClassifier([ReplicaStub('a'), ReplicaStub('b')])
+        pool.train({'greeting': (text for text in ['hi', 'hello'])})
+        self.assertEqual([replica.trained for replica in pool.replicas], [{'greeting': ['hi', 'hello']}] * 2)
+
+    def test_least_loaded(self):
+        fast, slow = ReplicaStub('fast', delay=0.001), ReplicaStub('slow', delay=0.02)
+        pool = PoolClassifier([slow, fast])
+        for i in range(20):
+            pool.classify(str(i))
+        self.assertGreater(fast.calls, slow.calls)
+
+    def test_unhealthy_replica(self):
+        broken, healthy = ReplicaStub('broken', fail=True), ReplicaStub('healthy', delay=0.001)
+        pool = PoolClassifier([broken, healthy], failure_threshold=2, cooldown=60)
+        for i in range(10):
+            self.assertEqual(list(pool.classify(str(i))), [str(i)])
+        self.assertEqual(broken.calls, 2)
+        self.assertEqual(pool.stats()[0]['state'], 'open')
+
+    def test_caller_error_is_not_failed_over(self):
+        replicas = [ReplicaStub('a'), ReplicaStub('b')]
+        pool = PoolClassifier(replicas, failure_threshold=1)
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                pool.classify('invalid')
+        self.assertEqual(sum(replica.calls for replica in replicas), 3)
+        self.assertEqual([(stats['failures'], stats['state']) for stats in pool.stats()], [(0, 'closed')] * 2)
+
+    def test_classify_many(self):
+        replicas = [ReplicaStub('a'), ReplicaStub('b'), ReplicaStub('c')]
+        pool = PoolClassifier(replicas)
+        texts = [str(i) for i in range(10)]
+        self.assertEqual([list(result)[0] for result in pool.classify_many(texts)], texts)
+        self.assertTrue(all(replica.calls for replica in replicas))
+
+    def test_config(self):
+        pool = PoolClassifier([ReplicaStub('a'), ReplicaStub('b')], failure_threshold=5, cooldown=1)
+        self.assertEqual(BaseClassifier.from_config(pool.config).config, pool.config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+import threading
+import weakref
+import numpy
+
+
+class LabelIndex:
+    """
+    Immutable class labels list with label -> column lookup.
+    Indexes are interned : all results with same labels share single index (while any of them is alive).
+    """
+    __slots__ = ('labels', '_columns', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+    _interned_lock = threading.Lock()
+
+    def __init__(self, labels):
+        """
+        Initialize index (use `intern` to get shared one)
+        :param labels: class labels (matrix columns order)
+        :type labels: collections.abc.Iterable[str]
+        """
+        self.labels = tuple(labels)
+        self._columns = {label: column for column, label in enumerate(self.labels)}
+
+    @staticmethod
+    def intern(labels):
+        """
+        Get shared index of labels
+        :param labels: class labels
+        :type labels: collections.abc.Iterable[str]
+        :return: index
+        :rtype: LabelIndex
+        """
+        if isinstance(labels, LabelIndex):
+            return labels
+        labels = tuple(labels)
+        with LabelIndex._interned_lock:
+            index = LabelIndex._interned.get(labels)
+            if index is None:
+                index = LabelIndex(labels)
+                LabelIndex._interned[labels] = index
+        return index
+
+    def column(self, label):
+        """
+        Get label column
+        :param label: label
+        :type label: str
+        :return: column, None for unknown label
+        :rtype: int|NoneType
+        """
+        return self._columns.get(label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __getitem__(self, column):
+        return self.labels[column]
+
+    def __contains__(self, label):
+        return label in self._columns
+
+    def __repr__(self):
+        return 'LabelIndex({0!r})'.format(list(self.labels))
+
+
+def _ranked(scores):
+    """
+    Get scores with missing (NaN) ones replaced by -inf to rank them last
+    """
+    return numpy.where(numpy.isnan(scores), -numpy.inf, scores)
+
+
+class ClassificationResult(Mapping):
+    """
+    Single text classification result : label index and float32 scores row.
+    Behaves like read-only OrderedDict[str, float] ordered by descending confidence,
+    labels with missing (NaN) score are not included.
+    """
+    __slots__ = ('labels', 'scores', '_order')
+
+    def __init__(self, labels, scores):
+        """
+        Initialize result
+        :param labels: class labels
+        :type labels: LabelIndex|collections.abc.Iterable[str]
+        :param scores: confidences in labels order (NaN - class is not scored)
+        :type scores: numpy.ndarray
+        """
+        self.labels = LabelIndex.intern(labels)
+        self.scores = scores
+        self._order = None
+
+    def _ordered_columns(self):
+        if self._order is None:
+            order = numpy.argsort(-_ranked(self.scores), kind='stable')
+            self._order = order[~numpy.isnan(self.scores[order])].tolist()
+        return self._order
+
+    def __getitem__(self, label):
+        column = self.labels.column(label)
+        if column is None:
+            raise KeyError(label)
+        score = float(self.scores[column])
+        if score != score:
+            raise KeyError(label)
+        return score
+
+    def __iter__(self):
+        labels = self.labels.labels
+        return (labels[column] for column in self._ordered_columns())
+
+    def __len__(self):
+        return len(self._ordered_columns())
+
+    def top_k(self, k):
+        """
+        Get best classes
+        :param k: classes count
+        :type k: int
+        :return: (label, confidence) pairs by descending confidence
+        :rtype: list[tuple[str, float]]
+        """
+        labels = self.labels.labels
+        return [(labels[column], float(self.scores[column])) for column in self._ordered_columns()[:k]]
+
+    def to_dict(self):
+        """
+        Get result as OrderedDict
+        :rtype: OrderedDict[str, float]
+        """
+        return OrderedDict(self.items())
+
+    def __repr__(self):
+        return 'ClassificationResult({0!r})'.format(list(self.items()))
+
+
+class ScoreMatrix:
+    """
+    Batch classification result : label index and N-by-C float32 scores matrix
+    (rows - texts, columns - classes, NaN - class is not scored).
+    """
+    __slots__ = ('labels', 'scores')
+
+    def __init__(self, labels, scores):
+        """
+        Initialize matrix
+        :param labels: class labels (columns)
+        :type labels: LabelIndex|collections.abc.Iterable[str]
+        :param scores: scores matrix
+        :type scores: numpy.ndarray
+        """
+        self.labels = LabelIndex.intern(labels)
+        self.scores = numpy.asarray(scores, dtype=numpy.float32).reshape(-1, len(self.labels))
+
+    @staticmethod
+    def from_results(results, labels=None):
+        """
+        Build matrix from dict-like classification results
+        :param results: classification results
+        :type results: list[collections.abc.Mapping[str, float]]
+        :param labels: columns, None - labels of results in order of appearance
+        :type labels: LabelIndex|collections.abc.Iterable[str]|NoneType
+        :return: matrix (labels, missing in result, have NaN score)
+        :rtype: ScoreMatrix
+        """
+        if labels is None:
+            seen = OrderedDict()
+            for result in results:
+                for label in result:
+                    seen.setdefault(label, None)
+            labels = seen.keys()
+        labels = LabelIndex.intern(labels)
+        scores = numpy.full((len(results), len(labels)), numpy.nan, dtype=numpy.float32)
+        for row, result in enumerate(results):
+            for label, confidence in result.items():
+                column = labels.column(label)
+                if column is not None:
+                    scores[row, column] = confidence
+        return ScoreMatrix(labels, scores)
+
+    def reindex(self, labels):
+        """
+        Get matrix with other columns
+        :param labels: new columns
+        :type labels: LabelIndex|collections.abc.Iterable[str]
+        :return: matrix (labels, missing in this matrix, have NaN score)
+        :rtype: ScoreMatrix
+        """
+        labels = LabelIndex.intern(labels)
+        if labels is self.labels:
+            return self
+        columns = numpy.array([self.labels.column(label) for label in labels], dtype=object)
+        known = numpy.array([column is not None for column in columns], dtype=bool)
+        scores = numpy.full((len(self), len(labels)), numpy.nan, dtype=numpy.float32)
+        scores[:, known] = self.scores[:, columns[known].astype(numpy.int64)]
+        return ScoreMatrix(labels, scores)
+
+    def __len__(self):
+        return self.scores.shape[0]
+
+    def __getitem__(self, row):
+        """
+        Get single text result (shares scores memory with matrix)
+        :param row: row index
+        :type row: int
+        :rtype: ClassificationResult
+        """
+        return ClassificationResult(self.labels, self.scores[row])
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def top_k(self, k):
+        """
+        Get best classes of every text
+        :param k: classes count
+        :type k: int
+        :return: N-by-k column indexes and N-by-k scores, by descending confidence
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        k = min(k, len(self.labels))
+        ranked = _ranked(self.scores)
+        if k < len(self.labels):
+            columns = numpy.argpartition(-ranked, k - 1, axis=1)[:, :k]
+        else:
+            columns = numpy.broadcast_to(numpy.arange(len(self.labels)), ranked.shape)
+        order = numpy.argsort(-numpy.take_along_axis(ranked, columns, axis=1), axis=1, kind='stable')
+        columns = numpy.take_along_axis(columns, order, axis=1)
+        return columns, numpy.take_along_axis(self.scores, columns, axis=1)
+
+    def top_k_labels(self, k):
+        """
+        Get best class labels of every text
+        :param k: classes count
+        :type k: int
+        :return: labels by descending confidence (not scored classes are skipped)
+        :rtype: list[list[str]]
+        """
+        columns, scores = self.top_k(k)
+        labels = self.labels.labels
+        return [
+            [labels[column] for column, score in zip(row_columns, row_scores) if score == score]
+            for row_columns, row_scores in zip(columns.tolist(), scores.tolist())
+        ]
+
+    def above(self, threshold):
+        """
+        Get thresholded decisions
+        :param threshold: confidence threshold
+        :type threshold: float
+        :return: N-by-C mask of scores > threshold (not scored classes are False)
+        :rtype: numpy.ndarray
+        """
+        with numpy.errstate(invalid='ignore'):
+            return self.scores > threshold
+
+    def to_results(self):
+        """
+        Get results as OrderedDicts (as classify_many returns them)
+        :rtype: list[OrderedDict[str, float]]
+        """
+        return [result.to_dict() for result in self]
+
+    def __repr__(self):
+        return 'ScoreMatrix({0} texts, labels={1!r})'.format(len(self), list(self.labels))
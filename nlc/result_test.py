@@ -0,0 +1,51 @@
+from collections import OrderedDict
+import gc
+import unittest
+import numpy
+from nlc.result import LabelIndex, ScoreMatrix
+
+
+class ScoreMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.results = [
+            OrderedDict([('capabilities', 0.9), ('locate_amenity', 0.1)]),
+            OrderedDict([('locate_amenity', 0.7), ('capabilities', 0.3)]),
+            OrderedDict([('weather', 0.5)])
+        ]
+        self.matrix = ScoreMatrix.from_results(self.results)
+
+    def test_labels_are_interned(self):
+        self.assertIs(self.matrix.labels, LabelIndex.intern(['capabilities', 'locate_amenity', 'weather']))
+        self.assertEqual(self.matrix.scores.dtype, numpy.float32)
+
+    def test_unused_labels_are_released(self):
+        for i in range(100):
+            ScoreMatrix.from_results([{'label {0}'.format(i): 1.0}])
+        gc.collect()
+        self.assertNotIn(('label 0',), LabelIndex._interned)
+        self.assertIn(tuple(self.matrix.labels), LabelIndex._interned)
+
+    def test_dict_access(self):
+        for result, expected in zip(self.matrix, self.results):
+            self.assertEqual(list(result.keys()), list(expected.keys()))
+            for label, confidence in expected.items():
+                self.assertAlmostEqual(result[label], confidence, places=6)
+        self.assertNotIn('weather', self.matrix[0])
+        self.assertEqual(len(self.matrix[2]), 1)
+
+    def test_top_k(self):
+        columns, scores = self.matrix.top_k(2)
+        numpy.testing.assert_array_equal(columns[:2], [[0, 1], [1, 0]])
+        numpy.testing.assert_allclose(scores[:2], [[0.9, 0.1], [0.7, 0.3]], rtol=1e-6)
+        self.assertEqual(self.matrix.top_k_labels(2),
+                         [['capabilities', 'locate_amenity'], ['locate_amenity', 'capabilities'], ['weather']])
+
+    def test_above(self):
+        numpy.testing.assert_array_equal(self.matrix.above(0.4),
+                                         [[True, False, False], [False, True, False], [False, False, True]])
+
+    def test_reindex(self):
+        matrix = self.matrix.reindex(['weather', 'capabilities', 'music'])
+        self.assertAlmostEqual(float(matrix.scores[0, 1]), 0.9, places=6)
+        self.assertTrue(numpy.isnan(matrix.scores[0, 2]))
+        self.assertEqual(matrix.to_results()[2], OrderedDict([('weather', 0.5)]))
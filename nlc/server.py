@@ -0,0 +1,364 @@
+"""
+Local HTTP classification service for any classifier from config.
+Usage : python -m nlc.server CONFIG.json [--host HOST] [--port PORT] [--workers N] [--max-queue N]
+                                       [--batch-window SECONDS] [--max-batch N] [--import MODULE]
+
+Endpoints :
+    POST /classify        {"text": "..."}        -> {"result": {"class": confidence, ...}}
+    POST /classify_batch  {"texts": ["...", ...]} -> {"results": [{...}, ...]}
+    GET  /health                                  -> {"status": "ok", "in_flight": ..., ...}
+    GET  /metrics                                 -> server and nlc.metrics measurements
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import importlib
+import json
+import threading
+import time
+from .base_classifier import BaseClassifier, _has_batch_path
+from .batching import RequestAggregator
+from . import metrics
+
+
+class Overloaded(Exception):
+    """
+    Request is rejected, because request queue is full
+    """
+    pass
+
+
+class ClassificationService:
+    """
+    Classifier wrapper, that runs classification on bounded worker pool.
+    Requests, that don't fit into workers and queue, are rejected (see Overloaded).
+    Concurrent single-text requests are grouped into classify_many batches, if classifier has native batch
+    (failed batch is repeated text by text, so one bad text doesn't fail other requests).
+    """
+
+    def __init__(self, classifier, workers=8, max_queue=64, batch_window=0.005, max_batch=50):
+        """
+        Initialize service
+        :param classifier: classifier
+        :type classifier: BaseClassifier
+        :param workers: concurrent classifier calls
+        :type workers: int
+        :param max_queue: max requests waiting for worker, more requests are rejected
+        :type max_queue: int
+        :param batch_window: time to collect concurrent requests into single batch (seconds), None - no batching
+        :type batch_window: float|NoneType
+        :param max_batch: max batch size
+        :type max_batch: int
+        """
+        self.classifier = classifier
+        self.workers = workers
+        self.max_queue = max_queue
+        self.capacity = workers + max_queue
+        self.registry = metrics.MetricsRegistry(enabled=True)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='nlc-server-worker')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._aggregator = None
+        if batch_window is not None and _has_batch_path(classifier):
+            self._aggregator = RequestAggregator(self._run_isolated_batch, batch_window, max_batch,
+                                                 name='server.batching')
+
+    @property
+    def in_flight(self):
+        """
+        Get accepted requests, that are not answered yet
+        :rtype: int
+        """
+        return self._in_flight
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.registry.increment('server.rejected')
+                raise Overloaded("{0} requests in flight".format(self._in_flight))
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _run_batch(self, texts):
+        self.registry.observe('server.batch_size', len(texts))
+        return self._executor.submit(self.classifier.classify_many, texts).result()
+
+    def _classify_single(self, text):
+        try:
+            return self.classifier.classify(text), None
+        except Exception as e:
+            return None, e
+
+    def _run_isolated_batch(self, texts):
+        """
+        Classify texts of concurrent requests, failed batch is classified text by text,
+        so failed text fails only its own request
+        :return: (result, error) pairs
+        :rtype: list[tuple[OrderedDict[str, float]|NoneType, Exception|NoneType]]
+        """
+        try:
+            return [(result, None) for result in self._run_batch(texts)]
+        except Exception:
+            if len(texts) == 1:
+                raise
+            self.registry.increment('server.batch_failures')
+            return [self._executor.submit(self._classify_single, text).result() for text in texts]
+
+    def _classify_aggregated(self, text):
+        result, error = self._aggregator.submit(text)
+        if error is not None:
+            raise error
+        return result
+
+    def _call(self, name, function, *args):
+        """
+        Run request under admission control and measure it
+        """
+        self._admit()
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except Exception:
+            self.registry.increment('server.errors')
+            raise
+        finally:
+            self._release()
+            self.registry.increment('server.requests.' + name)
+            self.registry.observe('server.latency.' + name, time.perf_counter() - start)
+
+    def classify(self, text):
+        """
+        Classify text
+        :param text: text
+        :type text: str
+        :return: classification result
+        :rtype: OrderedDict[str, float]
+        """
+        if self._aggregator is not None:
+            return self._call('classify', self._classify_aggregated, text)
+        return self._call('classify', lambda: self._executor.submit(self.classifier.classify, text).result())
+
+    def classify_batch(self, texts):
+        """
+        Classify texts by single classify_many call
+        :param texts: texts
+        :type texts: list[str]
+        :return: classification results
+        :rtype: list[OrderedDict[str, float]]
+        """
+        return self._call('classify_batch', self._run_batch, texts)
+
+    def health(self):
+        """
+        Get service state
+        :rtype: dict
+        """
+        return {
+            'status': 'ok' if self._in_flight < self.capacity else 'overloaded',
+            'in_flight': self._in_flight,
+            'capacity': self.capacity,
+            'workers': self.workers,
+            'batching': self._aggregator is not None,
+            'model_version': _json_value(self.classifier.model_version)
+        }
+
+    def stats(self):
+        """
+        Get service measurements and global nlc.metrics measurements
+        :rtype: dict
+        """
+        stats = self.registry.stats()
+        if self._aggregator is not None:
+            stats['batching'] = self._aggregator.stats()
+        stats['global'] = metrics.stats()
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def _json_value(value):
+    try:
+        json.dumps(value)
+        return value
+    except TypeError:
+        return str(value)
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, answer, headers=()):
+        data = json.dumps(answer, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json_body(self, field, kind):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            value = json.loads(self.rfile.read(length).decode('utf-8'))[field]
+        except (ValueError, KeyError, TypeError):
+            raise _BadRequest('JSON object with "{0}" field expected'.format(field))
+        if not isinstance(value, kind) or (kind is list and not all(isinstance(item, str) for item in value)):
+            raise _BadRequest('"{0}" field has wrong type'.format(field))
+        return value
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            self._send(200, self.service.health())
+        elif path == '/metrics':
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            if path == '/classify':
+                answer = {'result': self.service.classify(self._json_body('text', str))}
+            elif path == '/classify_batch':
+                answer = {'results': self.service.classify_batch(self._json_body('texts', list))}
+            else:
+                self._send(404, {'error': 'Not found'})
+                return
+        except _BadRequest as e:
+            self._send(400, {'error': str(e)})
+        except Overloaded as e:
+            self._send(503, {'error': 'Overloaded : {0}'.format(e)}, [('Retry-After', '1')])
+        except Exception as e:
+            self._send(500, {'error': '{0}: {1}'.format(type(e).__name__, e)})
+        else:
+            self._send(200, answer)
+
+
+class ClassificationServer:
+    """
+    HTTP server of ClassificationService
+    """
+
+    def __init__(self, classifier, host='127.0.0.1', port=0, **options):
+        """
+        Initialize server
+        :param classifier: classifier or its config
+        :type classifier: BaseClassifier|dict
+        :param host: listen host
+        :type host: str
+        :param port: listen port, 0 - any free port
+        :type port: int
+        :param options: ClassificationService options (workers, max_queue, batch_window, max_batch)
+        """
+        if not isinstance(classifier, BaseClassifier):
+            classifier = BaseClassifier.from_config(classifier)
+        self.service = ClassificationService(classifier, **options)
+        self._host = host
+        self._port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Get server url
+        :rtype: str
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def _create_server(self):
+        service = self.service
+
+        class Handler(_RequestHandler):
+            pass
+
+        Handler.service = service
+        server = ThreadingHTTPServer((self._host, self._port), Handler)
+        server.daemon_threads = True
+        return server
+
+    def start(self):
+        """
+        Start server in background thread
+        :return: server url
+        :rtype: str
+        """
+        self._server = self._create_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='nlc-server', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        """
+        Serve in current thread (until KeyboardInterrupt)
+        """
+        self._server = self._create_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            self.service.close()
+
+    def stop(self):
+        """
+        Stop server
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self.service.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve classifier from config over HTTP')
+    parser.add_argument('config', help='classifier config JSON (see BaseClassifier.from_config)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent classifier calls')
+    parser.add_argument('--max-queue', type=int, default=64, help='max waiting requests, more are rejected by 503')
+    parser.add_argument('--batch-window', type=float, default=0.005,
+                        help='time to collect concurrent requests into batch (seconds), 0 - no batching')
+    parser.add_argument('--max-batch', type=int, default=50)
+    parser.add_argument('--import', dest='imports', action='append', default=[],
+                        help='module, that registers classifier class (e.g. nlc_abbyy)')
+    args = parser.parse_args(argv)
+    for module in args.imports:
+        importlib.import_module(module)
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    server = ClassificationServer(config, args.host, args.port, workers=args.workers, max_queue=args.max_queue,
+                                  batch_window=args.batch_window or None, max_batch=args.max_batch)
+    print("Serving on http://{0}:{1}".format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+import json
+import threading
+import time
+import unittest
+from nlc import BaseClassifier
+from nlc.server import ClassificationServer
+
+
+class BackendStub(BaseClassifier):
+    """
+    Batch-capable stand-in backend. Calls can be held by `gate` event.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def classify(self, text):
+        return self.classify_many([text])[0]
+
+    def classify_many(self, texts):
+        self.gate.wait()
+        self.batches.append(list(texts))
+        if 'fail' in texts:
+            raise ValueError('backend failure')
+        return [OrderedDict([('upper', 0.9), ('lower', 0.1)]) if text.isupper()
+                else OrderedDict([('lower', 0.8), ('upper', 0.2)]) for text in texts]
+
+    def _get_config(self):
+        return {}
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = BackendStub()
+
+    def request(self, server, method, path, data=None):
+        parts = urlsplit(server.url)
+        connection = HTTPConnection(parts.hostname, parts.port, timeout=10)
+        try:
+            body = json.dumps(data).encode('utf-8') if data is not None else None
+            connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+
+    def test_classify(self):
+        with ClassificationServer(self.backend) as server:
+            status, answer = self.request(server, 'POST', '/classify', {'text': 'HELLO'})
+            self.assertEqual(status, 200)
+            self.assertEqual(list(answer['result'].items()), [('upper', 0.9), ('lower', 0.1)])
+            status, answer = self.request(server, 'POST', '/classify_batch', {'texts': ['a', 'B']})
+            self.assertEqual(status, 200)
+            self.assertEqual([next(iter(result)) for result in answer['results']], ['lower', 'upper'])
+            self.assertEqual(self.request(server, 'POST', '/classify', {'txt': 'a'})[0], 400)
+            self.assertEqual(self.request(server, 'POST', '/classify', {'text': 'fail'})[0], 500)
+            status, health = self.request(server, 'GET', '/health')
+            self.assertEqual((status, health['status'], health['in_flight']), (200, 'ok', 0))
+            status, stats = self.request(server, 'GET', '/metrics')
+            self.assertEqual(stats['counters']['server.requests.classify'], 2)
+            self.assertEqual(stats['counters']['server.errors'], 1)
+
+    def test_concurrent_requests_are_batched(self):
+        texts = ['text {0}'.format(i) for i in range(16)]
+        with ClassificationServer(self.backend, workers=2, batch_window=0.05) as server:
+            with ThreadPoolExecutor(len(texts)) as executor:
+                answers = list(executor.map(lambda text: self.request(server, 'POST', '/classify', {'text': text}),
+                                            texts))
+        self.assertEqual([status for status, _ in answers], [200] * len(texts))
+        self.assertLess(len(self.backend.batches), len(texts))
+        self.assertEqual(sorted(text for batch in self.backend.batches for text in batch), sorted(texts))
+
+    def test_failed_text_fails_only_its_request(self):
+        texts = ['good', 'fail']
+        with ClassificationServer(self.backend, workers=2, batch_window=1.0, max_batch=2) as server:
+            with ThreadPoolExecutor(len(texts)) as executor:
+                answers = list(executor.map(lambda text: self.request(server, 'POST', '/classify', {'text': text}),
+                                            texts))
+        self.assertIn(sorted(texts), [sorted(batch) for batch in self.backend.batches])
+        self.assertEqual([status for status, _ in answers], [200, 500])
+        self.assertEqual(next(iter(answers[0][1]['result'])), 'lower')
+
+    def test_backpressure(self):
+        self.backend.gate.clear()
+        with ClassificationServer(self.backend, workers=1, max_queue=1, batch_window=None) as server:
+            with ThreadPoolExecutor(2) as executor:
+                held = [executor.submit(self.request, server, 'POST', '/classify_batch', {'texts': [str(i)]})
+                        for i in range(2)]
+                try:
+                    while server.service.in_flight < 2:
+                        time.sleep(0.01)
+                    status, answer = self.request(server, 'POST', '/classify', {'text': 'rejected'})
+                    self.assertEqual(status, 503)
+                    self.assertEqual(self.request(server, 'GET', '/health')[1]['status'], 'overloaded')
+                finally:
+                    self.backend.gate.set()
+                self.assertEqual([future.result()[0] for future in held], [200, 200])
+            self.assertEqual(server.service.stats()['counters']['server.rejected'], 1)
@@ -1,4 +1,31 @@
-from .abbyy_classifier import ABBYYClassifier
-from .abbyy_network import AbbyyNetwork
+import importlib
+from nlc import BaseClassifier
 from .language import Language
 from .data import *
+
+
+# Client modules (and HTTP stack under them) are imported on first access
+_LAZY_ATTRIBUTES = {
+    'ABBYYClassifier': 'abbyy_classifier',
+    'AbbyyNetwork': 'abbyy_network',
+    'Transport': 'transport',
+    'HttpTransport': 'transport',
+    'CurlTransport': 'transport',
+    'AbbyySession': 'session',
+    'AdaptiveLimiter': 'rate_limit',
+    'TokenBucket': 'rate_limit',
+}
+BaseClassifier.register_lazy('abbyy', 'nlc_abbyy.abbyy_classifier')
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    module = importlib.import_module('.' + _LAZY_ATTRIBUTES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRIBUTES.keys()))
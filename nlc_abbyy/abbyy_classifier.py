@@ -1,16 +1,57 @@
+import functools
+import json
+import operator
 import os
-from nlc import BaseClassifier
+import tempfile
+import time
+from nlc import BaseClassifier, PoolClassifier, metrics
+from nlc.batching import RequestAggregator
 from collections import OrderedDict
 from .abbyy_network import AbbyyNetwork
 from .language import Language
 from .abbyy_exception import ABBYYException
+from .category_index import CategoryIndex
+from .document_index import DocumentIndex
+from .eviction import ClassificationSetManager
+from .manifest import TrainingManifest
+from .training_set import TrainingSetFingerprint
+from .rate_limit import lane, BACKGROUND
+
+
+_UNKNOWN_VERSION = object()
+_SNAPSHOT_FORMAT = 1
+_confidence = operator.itemgetter(1)
+
+
+def _recorded(method):
+    """
+    Record method call as operation to API trace, if classifier records traffic (see nlc_abbyy.trace)
+    """
+    @functools.wraps(method)
+    def wrapper(self, argument, *args, **kwargs):
+        recorder = self._abbyy.recorder
+        if recorder is None:
+            return method(self, argument, *args, **kwargs)
+        # Arguments can be generators - materialize them to record and process same data
+        if isinstance(argument, dict):
+            argument = {name: list(examples) for name, examples in argument.items()}
+        elif not isinstance(argument, str):
+            argument = list(argument)
+        with recorder.operation(method.__name__, self.id, argument):
+            return method(self, argument, *args, **kwargs)
+    return wrapper
 
 
 class ABBYYClassifier(BaseClassifier):
     _MAX_CLASSIFICAATION_DOCUMENTS = 100
+    _SNAPSHOT_COOKIES_MAX_AGE = 20 * 60
+    _JOB_TIMEOUT = 60 * 60
 
     def __init__(self, auth, endpoint,
-                 classifier_id=None, new_classifier=None):
+                 classifier_id=None, new_classifier=None, transport='http',
+                 job_timeout=_JOB_TIMEOUT, max_documents=_MAX_CLASSIFICAATION_DOCUMENTS, eviction='lru',
+                 zip_compresslevel=None, manifest=None, batch_window=0.005, max_batch=None, record=None,
+                 rate_limit=None):
         """
         Initialize classifier
         :param auth: login, password
@@ -21,10 +62,41 @@ class ABBYYClassifier(BaseClassifier):
         :type classifier_id: str|NoneType
         :param new_classifier: new classifier data
         :type new_classifier: dict|NoneType
+        :param transport: API transport name ('http' - in-process client, 'curl' - curl subprocess)
+        :type transport: str
+        :param job_timeout: max wait time for single job (seconds, one hour by default), None - wait forever
+        :type job_timeout: float|NoneType
+        :param max_documents: classification set size limit
+        :type max_documents: int
+        :param eviction: classification set eviction policy ('lru', 'lfu' - delete single documents
+            in background, 'clear' - clear whole set in background when it's full)
+        :type eviction: str
+        :param zip_compresslevel: train/test set archive deflate level (0-9), None - no compression
+        :type zip_compresslevel: int|NoneType
+        :param manifest: trained sets manifest path (see TrainingManifest), None - default path
+        :type manifest: str|NoneType
+        :param batch_window: time to collect concurrent classify calls into single batch (seconds),
+            None - classify every call separately
+        :type batch_window: float|NoneType
+        :param max_batch: max classify calls batch size, None - max_documents
+        :type max_batch: int|NoneType
+        :param record: trace file to record API traffic and operations to (see nlc_abbyy.trace), None - don't record
+        :type record: str|NoneType
+        :param rate_limit: client-side API limits (see AdaptiveLimiter, shared by classifiers of account),
+            None - default limits, False - don't limit requests
+        :type rate_limit: dict|bool|NoneType
         """
         assert (classifier_id is None) ^ (new_classifier is None)
         username, password = auth
-        self._abbyy = AbbyyNetwork(username, password, endpoint)
+        self._transport = transport
+        self._job_timeout = job_timeout
+        self._zip_compresslevel = zip_compresslevel
+        self._manifest_path = manifest
+        self._manifest = TrainingManifest(manifest)
+        self._model_version = _UNKNOWN_VERSION
+        self._record = record
+        self._rate_limit = rate_limit
+        self._abbyy = AbbyyNetwork(username, password, endpoint, transport, record, rate_limit)
         if classifier_id is not None:
             self.id = classifier_id
         else:
@@ -35,6 +107,19 @@ class ABBYYClassifier(BaseClassifier):
             use_semantics = new_classifier['use_semantics']
             inclusiveness = new_classifier['inclusiveness']
             self.id = self._abbyy.create_classifier(name, language, use_semantics, inclusiveness)
+        self._categories = CategoryIndex.for_project(self._abbyy, self.id)
+        self._documents = DocumentIndex.for_project(self._abbyy, self.id)
+        self._eviction = eviction
+        self._max_documents = max_documents
+        self._classification_set = ClassificationSetManager.for_project(self._abbyy, self.id, self._documents,
+                                                                        max_documents, eviction)
+        self._batch_window = batch_window
+        self._max_batch = max_batch
+        self._label_columns_cache = None
+        self._aggregator = None
+        if batch_window is not None:
+            self._aggregator = RequestAggregator(self.classify_many, batch_window, max_batch or max_documents,
+                                                 self._abbyy.classifier_document_name, 'abbyy.batching')
 
     def _wait_for_job_completion(self, job_id):
         """
@@ -42,61 +127,145 @@ class ABBYYClassifier(BaseClassifier):
         :param job_id: job id
         :type job_id: str
         """
-        while True:
-            jobs = self._abbyy.jobs()
-            job = jobs[job_id]
-            if job.status == 'Completed':
-                break
-            if job.error:
-                raise ABBYYException(0, job.error)
+        self._abbyy.job_watcher.wait(job_id, self._job_timeout, self._abbyy)
 
-    def train(self, classes, verbose=False):
+    def _wait_for_jobs_completion(self, job_ids):
         """
-        Upload train data
-        :param classes: class examples
-        :type classes: dict[str, list[str]]
+        Wait until all jobs will be completed
+        :param job_ids: job ids
+        :type job_ids: list[str]
+        """
+        self._abbyy.job_watcher.wait_all(job_ids, self._job_timeout, self._abbyy)
+
+    @_recorded
+    @lane(BACKGROUND)
+    def train(self, classes, verbose=False, force=False):
+        """
+        Upload train data. Training is skipped if training set and deployed model
+        are not changed since last training (see TrainingManifest).
+        :param classes: class examples (any iterables, e.g. generators)
+        :type classes: dict[str, collections.abc.Iterable[str]]
         :param verbose: verbose?
         :type verbose: bool
+        :param force: train even if training set is not changed?
+        :type force: bool
+        :return: training set changes since last training
+        :rtype: TrainingSetChanges
         """
-        path = self._abbyy.classes_zip(classes)
-        if verbose:
-            print("Train classes .zip path : {0}".format(path))
-        job_id = self._abbyy.upload_train_set(self.id, path)
+        timer = metrics.registry.timer
+        fingerprint = TrainingSetFingerprint()
+        with timer('abbyy.train.zip'):
+            archive = self._classes_zip(classes, verbose, 'Train', fingerprint)
+        try:
+            previous, trained_version = self._manifest.get(self._abbyy.endpoint, self.id)
+            changes = fingerprint.compare(previous)
+            if not changes and not force and trained_version is not None \
+                    and trained_version == self.model_version:
+                metrics.registry.increment('abbyy.train.skipped')
+                if verbose:
+                    print("Train set is not changed, training skipped")
+                return changes
+            if verbose:
+                print("Train set changes :\n{0}".format(changes))
+            with timer('abbyy.train.upload'):
+                job_id = self._abbyy.upload_train_set(self.id, archive)
+        finally:
+            archive.close()
         if verbose:
             print("Train job id : {0}".format(job_id))
-        os.remove(path)
-        if verbose:
-            print("Train zip {0} removed".format(path))
-        self._wait_for_job_completion(job_id)
+        with timer('abbyy.train.job_wait'):
+            self._wait_for_job_completion(job_id)
         if verbose:
             print("Train job completed")
+        with timer('abbyy.train.publish'):
+            self.publish()
+        self._manifest.save(self._abbyy.endpoint, self.id, fingerprint, self.model_version)
+        return changes
+
+    def _classes_zip(self, classes, verbose, title, fingerprint=None):
+        """
+        Build train/test set archive
+        :param classes: class examples
+        :type classes: dict[str, collections.abc.Iterable[str]]
+        :param verbose: print build time and peak memory?
+        :type verbose: bool
+        :param title: set title for verbose output
+        :type title: str
+        :param fingerprint: fingerprint to fill with archived examples
+        :type fingerprint: TrainingSetFingerprint|NoneType
+        :return: archive buffer
+        :rtype: tempfile.SpooledTemporaryFile
+        """
+        if not verbose:
+            return self._abbyy.classes_zip_buffer(classes, self._zip_compresslevel, fingerprint=fingerprint)
+        import tracemalloc
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            archive = self._abbyy.classes_zip_buffer(classes, self._zip_compresslevel, fingerprint=fingerprint)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        size = archive.seek(0, 2)
+        archive.seek(0)
+        print("{0} classes .zip built in {1:.3f}s : {2} bytes, peak memory {3:.1f} KiB".format(
+            title, time.perf_counter() - start, size, peak / 1024.0))
+        return archive
+
+    def publish(self):
+        """
+        Publish trained model
+        """
         self._abbyy.publish(self.id)
+        self._model_version = _UNKNOWN_VERSION
+
+    @property
+    def model_version(self):
+        """
+        Get deployed model version (deploy timestamp)
+        :return: model version
+        :rtype: str
+        """
+        if self._model_version is _UNKNOWN_VERSION:
+            self._model_version = self._abbyy.classifiers()[self.id].deployed_timestamp
+        return self._model_version
 
+    @_recorded
+    @lane(BACKGROUND)
     def test(self, classes, verbose=False):
         """
         Upload test set and return error value
-        :param classes: class examples
-        :type classes: dict[str, list[str]]
+        :param classes: class examples (any iterables, e.g. generators)
+        :type classes: dict[str, collections.abc.Iterable[str]]
         :param verbose: verbose?
         :type verbose: bool
         :return: F-Measure error
         :rtype: float
         """
-        path = self._abbyy.classes_zip(classes)
-        if verbose:
-            print("Test classes .zip path : {0}".format(path))
-        job_id = self._abbyy.upload_test_set(self.id, path)
+        timer = metrics.registry.timer
+        with timer('abbyy.test.zip'):
+            archive = self._classes_zip(classes, verbose, 'Test')
+        try:
+            with timer('abbyy.test.upload'):
+                job_id = self._abbyy.upload_test_set(self.id, archive)
+        finally:
+            archive.close()
         if verbose:
             print("Test job id : {0}".format(job_id))
-        os.remove(path)
-        if verbose:
-            print("Test zip {0} removed".format(path))
-        self._wait_for_job_completion(job_id)
+        with timer('abbyy.test.job_wait'):
+            self._wait_for_job_completion(job_id)
         if verbose:
             print("Test job completed")
-        classifier = self._abbyy.classifiers()[self.id]
+        with timer('abbyy.test.fmeasure'):
+            classifier = self._abbyy.classifiers()[self.id]
         return 1 - classifier.control_fmeasure
 
+    @_recorded
     def classify(self, text):
         """
         Classify text
@@ -105,37 +274,277 @@ class ABBYYClassifier(BaseClassifier):
         :return: classification result
         :rtype: OrderedDict[str, float]
         """
-        def class_confidence_pair_comparer(pair):
-            _, conf = pair
-            return conf
+        if self._aggregator is None:
+            return self.classify_many([text])[0]
+        self._documents.ensure_loaded()
+        if self._documents.get(self._abbyy.classifier_document_name(text)) is not None:
+            # Already classified - nothing to wait for
+            return self.classify_many([text])[0]
+        # Concurrent calls are classified by single batch, same texts share result
+        return OrderedDict(self._aggregator.submit(text))
+
+    @_recorded
+    def classify_many(self, texts):
+        """
+        Classify texts. Documents missing in classification set are uploaded together
+        and classified by single job per chunk of max_documents documents.
+        Already classified documents are served from local document index.
+        :param texts: texts
+        :type texts: list[str]
+        :return: classification results in input order
+        :rtype: list[OrderedDict[str, float]]
+        """
+        return self._classified(texts, self._classification_result)
+
+    @_recorded
+    def classify_matrix(self, texts, labels=None):
+        """
+        Classify texts into score matrix. Rows are filled from classified documents directly,
+        without per-text result dicts.
+        :param texts: texts
+        :type texts: list[str]
+        :param labels: matrix columns, None - all classifier categories
+        :type labels: nlc.result.LabelIndex|collections.abc.Iterable[str]|NoneType
+        :return: text-by-class scores (NaN - class is not scored)
+        :rtype: nlc.result.ScoreMatrix
+        """
+        import numpy
+        from nlc.result import ScoreMatrix
+        documents = self._classified(texts, lambda document: document)
+        index, columns = self._label_columns()
+        scores = numpy.full((len(texts), len(index)), numpy.nan, dtype=numpy.float32)
+        for row, document in enumerate(documents):
+            for category in document.raw["ClassifiedCategories"]:
+                column = columns.get(category["CategoryId"])
+                if column is None:
+                    # New category - reload categories and fill matrix again
+                    self._categories.get(category["CategoryId"])
+                    return self.classify_matrix(texts, labels)
+                scores[row, column] = category["Probability"]
+        matrix = ScoreMatrix(index, scores)
+        return matrix if labels is None else matrix.reindex(labels)
+
+    def _label_columns(self):
+        """
+        Get label index of classifier categories and category id -> column mapping
+        (cached while categories are not reloaded)
+        :rtype: tuple[nlc.result.LabelIndex, dict[int, int]]
+        """
+        from nlc.result import LabelIndex
+        categories = self._categories.categories()
+        cached = self._label_columns_cache
+        if cached is None or cached[0] is not categories:
+            index = LabelIndex.intern(category.name for category in categories.values())
+            cached = (categories, index, {category_id: column for column, category_id in enumerate(categories)})
+            self._label_columns_cache = cached
+        return cached[1], cached[2]
 
-        name = self._abbyy.classifier_document_name(text)
-        documents = self._abbyy.documents(self.id)
-        if name not in documents:
-            self._wait_for_job_completion(self._abbyy.upload_classifier_document(self.id, text))
+    def _classified(self, texts, result):
+        """
+        Classify texts. Documents missing in classification set are uploaded together
+        and classified by single job per chunk of max_documents documents.
+        :param texts: texts
+        :type texts: list[str]
+        :param result: function, that builds result from classified document
+        :type result: callable
+        :return: results in input order
+        :rtype: list
+        """
+        registry = metrics.registry
+        timer = registry.timer
+        with timer('abbyy.classify.total'):
+            with timer('abbyy.classify.document_name'):
+                names = [self._abbyy.classifier_document_name(text) for text in texts]
+            unique = OrderedDict()
+            for name, text in zip(names, texts):
+                unique.setdefault(name, text)
+            unique_items = list(unique.items())
+            chunk_size = self._classification_set.max_documents
+            with timer('abbyy.classify.documents'):
+                self._documents.ensure_loaded()
+            resolved = {}
+            # Documents of this call must not be evicted until results are built
+            self._documents.pin(unique)
+            try:
+                for chunk_start in range(0, len(unique_items), chunk_size):
+                    chunk = unique_items[chunk_start:chunk_start + chunk_size]
+                    found = {name: self._documents.get(name) for name, _ in chunk}
+                    missing = [(name, text) for name, text in chunk if found[name] is None]
+                    registry.increment('abbyy.classify.texts', len(chunk))
+                    registry.increment('abbyy.classify.missing', len(missing))
+                    classified = self._classify_missing(missing) if missing else {}
+                    self._documents.touch([name for name, _ in chunk])
+                    with timer('abbyy.classify.result'):
+                        for name, _ in chunk:
+                            document = found[name] or classified.get(name)
+                            if document is None:
+                                raise ABBYYException(0, "Document {0} is not classified".format(name))
+                            resolved[name] = result(document)
+            finally:
+                self._documents.unpin(unique)
+            self._classification_set.schedule()
+        return [resolved[name] for name in names]
+
+    def _classify_missing(self, missing):
+        """
+        Upload and classify documents
+        :param missing: document name, text pairs
+        :type missing: list[tuple[str, str]]
+        :return: classified documents
+        :rtype: dict[str, DocumentData]
+        """
+        timer = metrics.registry.timer
+        new = [(name, text) for name, text in missing
+               if self._documents.state(name) in (None, DocumentIndex.STALE)]
+        if new:
+            with timer('abbyy.classify.upload'):
+                upload_jobs = [self._abbyy.upload_classifier_document(self.id, text) for _, text in new]
+                self._documents.mark_uploaded([name for name, _ in new])
+            with timer('abbyy.classify.job_wait'):
+                self._wait_for_jobs_completion(upload_jobs)
+        with timer('abbyy.classify.job_wait'):
             self._wait_for_job_completion(self._abbyy.classify_documents(self.id))
-            documents = self._abbyy.documents(self.id)
-        if len(documents) > ABBYYClassifier._MAX_CLASSIFICAATION_DOCUMENTS:
-            self._abbyy.clear_sets(self.id, classification=True)
-        document = documents[name]
-        categories = self._abbyy.categories(self.id)
-        class_confidence_pairs = []
-        for classified_category in document.classified_categories:
-            category_name = categories[classified_category.category_id].name
-            confidence = classified_category.probability
-            class_confidence_pairs.append((category_name, confidence,))
-        class_confidence_pairs.sort(key=class_confidence_pair_comparer, reverse=True)
-        result = OrderedDict()
-        for item in class_confidence_pairs:
-            class_name, confidence = item
-            result[class_name] = confidence
-        return result
+        with timer('abbyy.classify.documents'):
+            return self._documents.fetch([name for name, _ in missing])
+
+    def batching_stats(self):
+        """
+        Get classify calls aggregation counters
+        :return: batches, items, coalesced (see RequestAggregator.stats)
+        :rtype: dict[str, int]
+        """
+        if self._aggregator is None:
+            return {'batches': 0, 'items': 0, 'coalesced': 0}
+        return self._aggregator.stats()
+
+    def snapshot(self):
+        """
+        Get runtime state (login cookies, categories, classification set documents, model version)
+        to restore it after restart (see restore)
+        :return: JSON-serializable state
+        :rtype: dict
+        """
+        saved = time.time()
+        cookies = self._abbyy.session.cookies
+        return {
+            'format': _SNAPSHOT_FORMAT,
+            'endpoint': self._abbyy.endpoint,
+            'classifier_id': self.id,
+            'model_version': self.model_version,
+            'saved': saved,
+            'cookies': cookies,
+            'cookies_expire': saved + ABBYYClassifier._SNAPSHOT_COOKIES_MAX_AGE if cookies else None,
+            'categories': self._categories.snapshot(),
+            'documents': self._documents.snapshot()
+        }
+
+    def restore(self, snapshot):
+        """
+        Restore runtime state. Snapshot is validated by single request (deployed model version),
+        stale snapshot is ignored.
+        :param snapshot: state (see snapshot)
+        :type snapshot: dict
+        :return: is state restored? (False - cold start)
+        :rtype: bool
+        """
+        if snapshot.get('format') != _SNAPSHOT_FORMAT or snapshot['endpoint'] != self._abbyy.endpoint \
+                or snapshot['classifier_id'] != self.id:
+            return False
+        cookies = snapshot['cookies']
+        if cookies and snapshot['cookies_expire'] > time.time():
+            self._abbyy.session.restore(cookies)
+        self._model_version = _UNKNOWN_VERSION
+        if self.model_version != snapshot['model_version']:
+            metrics.registry.increment('abbyy.snapshot.stale')
+            return False
+        if snapshot['categories'] is not None:
+            self._categories.restore(snapshot['categories'])
+        self._documents.restore(snapshot['documents'])
+        metrics.registry.increment('abbyy.snapshot.restored')
+        return True
+
+    def save_snapshot(self, path):
+        """
+        Save runtime state to JSON file (see snapshot)
+        :param path: file path
+        :type path: str
+        """
+        snapshot = self.snapshot()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp('.snapshot.json', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path)
+
+    def load_snapshot(self, path):
+        """
+        Restore runtime state from JSON file (see restore)
+        :param path: file path
+        :type path: str
+        :return: is state restored? (False - file is missing, broken or stale)
+        :rtype: bool
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return self.restore(snapshot)
+
+    def warm_up(self, queries):
+        """
+        Pre-classify common queries, so they will be answered from local document index
+        :param queries: queries
+        :type queries: collections.abc.Iterable[str]
+        :return: classified queries count
+        :rtype: int
+        """
+        queries = list(queries)
+        if queries:
+            with metrics.registry.timer('abbyy.warm_up'):
+                self.classify_many(queries)
+        return len(queries)
+
+    def classification_set_stats(self):
+        """
+        Get classification set occupancy and eviction counters
+        :return: counters
+        :rtype: dict[str, int|float]
+        """
+        return self._classification_set.stats()
+
+    def _classification_result(self, document):
+        """
+        Build classification result from classified document
+        :param document: document
+        :type document: DocumentData
+        :return: classification result
+        :rtype: OrderedDict[str, float]
+        """
+        categories = self._categories
+        class_confidence_pairs = [
+            (categories.get(classified_category.category_id).name, classified_category.probability)
+            for classified_category in document.classified_categories
+        ]
+        class_confidence_pairs.sort(key=_confidence, reverse=True)
+        return OrderedDict(class_confidence_pairs)
 
     def _get_config(self):
         return {
             'auth': (self._abbyy.username, self._abbyy.password,),
             'endpoint': self._abbyy.endpoint,
-            'classifier_id': self.id
+            'classifier_id': self.id,
+            'transport': self._transport,
+            'job_timeout': self._job_timeout,
+            'max_documents': self._max_documents,
+            'eviction': self._eviction,
+            'zip_compresslevel': self._zip_compresslevel,
+            'manifest': self._manifest_path,
+            'batch_window': self._batch_window,
+            'max_batch': self._max_batch,
+            'record': self._record,
+            'rate_limit': self._rate_limit
         }
 
 BaseClassifier.register('abbyy', ABBYYClassifier)
+PoolClassifier.register_backend_error(ABBYYException)
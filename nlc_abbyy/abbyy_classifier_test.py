@@ -0,0 +1,244 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import tempfile
+import unittest
+from nlc import BaseClassifier
+from nlc_abbyy import ABBYYClassifier, Language
+from nlc_abbyy import AbbyySession
+from nlc_abbyy.abbyy_exception import ABBYYException
+from nlc_abbyy.category_index import CategoryIndex
+from nlc_abbyy.document_index import DocumentIndex
+from nlc_abbyy.benchmark import SAMPLE_CLASSES, SAMPLE_TEST_CLASSES, unique_texts
+from nlc_abbyy.fake_server import FakeSmartClassifier
+from nlc_abbyy.training_set import TrainingSetFingerprint, example_digest
+
+
+class ABBYYClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSmartClassifier(job_duration={'default': 0.01})
+        self.server.start()
+        self.manifest_dir = tempfile.TemporaryDirectory()
+        self.classifier = self.build_classifier()
+        self.classifier.train(SAMPLE_CLASSES)
+
+    def tearDown(self):
+        self.server.stop()
+        self.manifest_dir.cleanup()
+
+    def build_classifier(self, **kwargs):
+        kwargs.setdefault('manifest', os.path.join(self.manifest_dir.name, 'manifest.json'))
+        return ABBYYClassifier(('user', 'password'), self.server.endpoint, new_classifier={
+            'name': 'TestNlcProjectFromPython',
+            'language': Language.english,
+            'use_semantics': True,
+            'inclusiveness': 1
+        }, **kwargs)
+
+    def test_classify(self):
+        classes = self.classifier.classify('where can i eat pizza')
+        self.assertEqual(list(classes.keys())[0], 'locate_amenity')
+        self.assertEqual(set(classes.keys()), set(SAMPLE_CLASSES.keys()))
+        self.assertEqual(list(classes.values()), sorted(classes.values(), reverse=True))
+
+    def test_document_names(self):
+        from transliterate import translit
+        network = self.classifier._abbyy
+        # Russian names are same as names of auto-detected language, Latin texts are kept as is
+        self.assertEqual(network.classifier_document_name('где банкомат?'), 'gdebankomat.txt')
+        self.assertEqual(network.classifier_document_name('где банкомат?'), translit('гдебанкомат.txt', reversed=True))
+        self.assertEqual(network.classifier_document_name('where is ATM?'), 'whereisATM.txt')
+
+    def test_classified_document_needs_no_calls(self):
+        self.classifier.classify('what can you do for me')
+        self.server.reset_calls()
+        self.classifier.classify('what can you do for me')
+        self.assertEqual(self.server.total_calls(), 0)
+
+    def test_retrained_model_classifies_again(self):
+        text = 'where can i eat pizza'
+        self.assertEqual(list(self.classifier.classify(text).keys())[0], 'locate_amenity')
+        self.classifier.train({
+            'locate_amenity': SAMPLE_CLASSES['capabilities'],
+            'capabilities': SAMPLE_CLASSES['locate_amenity']
+        })
+        self.assertEqual(list(self.classifier.classify(text).keys())[0], 'capabilities')
+
+    def test_classify_many(self):
+        texts = ['what can you do', 'i want pizza', 'what can you do', 'help me']
+        self.server.reset_calls()
+        results = self.classifier.classify_many(texts)
+        self.assertEqual(self.server.calls['classifying'], 1)
+        self.assertEqual(self.server.calls['document_import'], 3)
+        self.assertEqual(results, [self.classifier.classify(text) for text in texts])
+
+    def test_classify_matrix(self):
+        texts = ['what can you do', 'i want pizza', 'help me']
+        matrix = self.classifier.classify_matrix(texts)
+        self.assertEqual(set(matrix.labels), set(SAMPLE_CLASSES.keys()))
+        self.assertEqual(matrix.scores.shape, (3, len(SAMPLE_CLASSES)))
+        for row, text in enumerate(texts):
+            expected = self.classifier.classify(text)
+            self.assertEqual(list(matrix[row].keys()), list(expected.keys()))
+            for label, confidence in expected.items():
+                self.assertAlmostEqual(matrix[row][label], confidence, places=6)
+        self.assertEqual(matrix.top_k_labels(1), [[next(iter(self.classifier.classify(text)))] for text in texts])
+
+    def test_concurrent_classify_is_batched(self):
+        texts = ['what can you do', 'i want pizza', 'what can you do', 'help me'] * 3
+        self.server.reset_calls()
+        with ThreadPoolExecutor(len(texts)) as executor:
+            results = list(executor.map(self.classifier.classify, texts))
+        self.assertLessEqual(self.server.calls['classifying'], 2)
+        self.assertEqual(self.server.calls['document_import'], 3)
+        self.assertEqual(results, [self.classifier.classify(text) for text in texts])
+
+    def test_test(self):
+        error = self.classifier.test(SAMPLE_TEST_CLASSES)
+        self.assertTrue(0 <= error <= 1)
+
+    def test_config(self):
+        instantiated_classifier = BaseClassifier.from_config(self.classifier.config)
+        self.assertEqual(
+            self.classifier.classify('find restaurants or something like it'),
+            instantiated_classifier.classify('find restaurants or something like it')
+        )
+
+    def test_unchanged_training_is_skipped(self):
+        self.server.reset_calls()
+        changes = self.classifier.train({name: reversed(examples) for name, examples in SAMPLE_CLASSES.items()})
+        self.assertFalse(changes)
+        self.assertEqual(self.server.calls['import'], 0)
+        self.assertEqual(self.server.calls['deploy'], 0)
+        classes = dict(SAMPLE_CLASSES, capabilities=SAMPLE_CLASSES['capabilities'] + ['what else'])
+        changes = self.classifier.train(classes)
+        self.assertEqual(list(changes.changed.keys()), ['capabilities'])
+        self.assertEqual(changes.changed['capabilities'], (1, 0))
+        self.assertEqual(self.server.calls['import'], 1)
+
+    def test_manifest_keeps_class_hashes(self):
+        with open(self.classifier._manifest.path) as f:
+            entry = next(iter(json.load(f).values()))
+        self.assertEqual({name: value['count'] for name, value in entry['classes'].items()},
+                         {name: len(examples) for name, examples in SAMPLE_CLASSES.items()})
+        current = TrainingSetFingerprint(entry['classes'])
+        legacy = TrainingSetFingerprint({name: [example_digest(example) for example in examples]
+                                         for name, examples in SAMPLE_CLASSES.items()})
+        self.assertEqual(legacy.digest(), current.digest())
+        replaced = dict(SAMPLE_CLASSES, capabilities=SAMPLE_CLASSES['capabilities'][1:] + ['what else'])
+        changes = self.classifier.train(replaced)
+        self.assertEqual(changes.changed, {'capabilities': (1, 1)})
+
+    def test_session_is_shared(self):
+        self.server.reset_calls()
+        instantiated_classifier = BaseClassifier.from_config(self.classifier.config)
+        self.assertEqual(self.server.total_calls(), 0)
+        instantiated_classifier.classify('what can you do')
+        self.assertEqual(self.server.calls['login'], 0)
+
+    def test_rejected_session_is_renewed(self):
+        self.classifier.classify('what can you do')
+        self.server.sessions.clear()
+        self.server.reset_calls()
+        self.classifier.classify('where is ATM')
+        self.assertEqual(self.server.calls['login'], 1)
+
+    def reset_process_state(self):
+        AbbyySession.reset_all()
+        CategoryIndex._indexes.clear()
+        DocumentIndex._indexes.clear()
+
+    def test_snapshot(self):
+        self.classifier.warm_up(['what can you do', 'where is ATM'])
+        path = os.path.join(self.manifest_dir.name, 'snapshot.json')
+        self.classifier.save_snapshot(path)
+        self.reset_process_state()
+        self.server.reset_calls()
+        restored = BaseClassifier.from_config(self.classifier.config)
+        self.assertTrue(restored.load_snapshot(path))
+        self.assertEqual(self.server.calls['projects'], 1)
+        restored.classify('what can you do')
+        restored.classify('where is ATM')
+        self.assertEqual(self.server.total_calls(), 1)
+
+    def test_stale_snapshot(self):
+        self.classifier.classify('what can you do')
+        snapshot = self.classifier.snapshot()
+        self.classifier.train(SAMPLE_CLASSES, force=True)
+        self.reset_process_state()
+        restored = BaseClassifier.from_config(self.classifier.config)
+        self.assertFalse(restored.restore(snapshot))
+
+    def test_eviction(self):
+        classifier = self.build_classifier(max_documents=10)
+        classifier.train(SAMPLE_CLASSES)
+        for text in unique_texts(30):
+            classifier.classify(text)
+        eviction_thread = classifier._classification_set._thread
+        if eviction_thread is not None:
+            eviction_thread.join()
+        stats = classifier.classification_set_stats()
+        self.assertLessEqual(stats['documents'], 10)
+        self.assertGreater(stats['evicted'], 0)
+        self.assertEqual(stats['clears'], 0)
+
+    def test_eviction_retries_transient_errors(self):
+        classifier = self.build_classifier(max_documents=10)
+        classifier.train(SAMPLE_CLASSES)
+        self.server.errors = {'delete': 1.0}
+        for text in unique_texts(30):
+            classifier.classify(text)
+        self.server.errors = {}
+        eviction_thread = classifier._classification_set._thread
+        if eviction_thread is not None:
+            eviction_thread.join()
+        stats = classifier.classification_set_stats()
+        self.assertEqual(classifier._classification_set.policy.__class__.__name__, 'LRUEviction')
+        self.assertGreater(classifier._classification_set.errors, 0)
+        self.assertGreater(stats['evicted'], 0)
+        self.assertEqual(stats['clears'], 0)
+
+    def test_document_evicted_during_request(self):
+        known = 'what can you do'
+        expected = self.classifier.classify(known)
+        name = self.classifier._abbyy.classifier_document_name(known)
+        classify_missing = self.classifier._classify_missing
+
+        def classify_missing_and_evict(missing):
+            self.assertNotIn(name, self.classifier._documents.access_stats())
+            # Concurrent eviction removes known document while missing ones are classified
+            self.classifier._documents.remove([name])
+            return classify_missing(missing)
+
+        self.classifier._classify_missing = classify_missing_and_evict
+        results = self.classifier.classify_many([known, 'i want pizza'])
+        self.assertEqual(results[0], expected)
+        self.assertEqual(list(results[1].keys())[0], 'locate_amenity')
+
+    def test_classification_set_is_shared_by_project(self):
+        other = self.build_classifier()
+        same_project = ABBYYClassifier(('user', 'password'), self.server.endpoint, classifier_id=self.classifier.id)
+        self.assertIs(same_project._classification_set, self.classifier._classification_set)
+        self.assertIsNot(other._classification_set, self.classifier._classification_set)
+
+    def test_clear_eviction_keeps_in_flight_documents(self):
+        classifier = self.build_classifier(max_documents=4, eviction='clear', batch_window=None)
+        classifier.train(SAMPLE_CLASSES)
+        texts = unique_texts(40)
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(classifier.classify, texts))
+        self.assertEqual([set(result.keys()) for result in results], [set(SAMPLE_CLASSES.keys())] * len(texts))
+        eviction_thread = classifier._classification_set._thread
+        if eviction_thread is not None:
+            eviction_thread.join()
+        self.assertGreater(classifier.classification_set_stats()['clears'], 0)
+
+    def test_classification_set_options_must_match(self):
+        with self.assertRaises(ValueError):
+            ABBYYClassifier(('user', 'password'), self.server.endpoint, classifier_id=self.classifier.id,
+                            max_documents=5)
+
+    def test_job_failure(self):
+        self.server.job_errors = {'classifying': 1.0}
+        with self.assertRaises(ABBYYException):
+            self.classifier.classify('job will fail')
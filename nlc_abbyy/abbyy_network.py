@@ -1,53 +1,281 @@
 from .language import Language
-from subprocess import Popen, PIPE
+import base64
 import json
-import zipfile
+import re
+import time
 import tempfile
 import os
 from .data import *
 from .abbyy_exception import ABBYYException
-import threading
-from transliterate import translit
+from .transport import encode_multipart
+from .training_set import write_classes_zip
+from .session import AbbyySession
+from .category_index import CategoryIndex
+from .document_index import DocumentIndex
+from . import rate_limit
+from nlc import metrics
 
 
-_LOCK = threading.Lock()
+_JSON_ACCEPT = 'application/json, text/plain, */*'
+_PROJECT_ID_RE = re.compile(r'projects/[^/]+')
+_SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+
+
+def endpoint_name(method, uri):
+    """
+    Get API endpoint name for metrics (without project id and query)
+    :param method: HTTP method
+    :type method: str
+    :param uri: uri
+    :type uri: str
+    :return: endpoint name, e.g. "GET projects/{id}/categories"
+    :rtype: str
+    """
+    path = uri.split('?', 1)[0].lstrip('/')
+    if path.startswith('api/'):
+        path = path[len('api/'):]
+    return '{0} {1}'.format(method, _PROJECT_ID_RE.sub('projects/{id}', path))
+
 
 class AbbyyNetwork:
-    def __init__(self, username, password, endpoint):
+    def __init__(self, username, password, endpoint, transport='http', record=None, rate_limit=None):
         """
-        Initialize ABBYY SmartClassifier
+        Initialize ABBYY SmartClassifier.
+        Clients with same username and endpoint share session (see AbbyySession), login is done on first request.
+        Requests are limited by limiter of session (see AdaptiveLimiter), throttled requests are repeated.
         :param username: username
         :type username: str
         :param password: password
         :type password: str
         :param endpoint: API endpoint
         :type endpoint: str
+        :param transport: transport name ('http', 'curl') or instance
+        :type transport: str|Transport
+        :param record: trace file to record requests and responses to (see nlc_abbyy.trace), None - don't record
+        :type record: str|NoneType
+        :param rate_limit: AdaptiveLimiter options (used by first client of session), None - default options,
+            False - don't limit requests of this client
+        :type rate_limit: dict|bool|NoneType
         """
         self.username = username
         self.password = password
         self.endpoint = endpoint
-        self.auth_cookie = self._login()
+        self.session = AbbyySession.for_account(username, password, endpoint)
+        self.transport = self.session.transport(transport)
+        self.limiter = None
+        if rate_limit is not False:
+            self.limiter = self.session.limiter(rate_limit)
+        self.recorder = None
+        if record is not None:
+            from .trace import TraceRecorder, RecordingTransport
+            self.recorder = TraceRecorder.for_path(record)
+            self.transport = RecordingTransport(self.transport, self.recorder, endpoint)
+        self._authorization = 'Basic ' + base64.b64encode(
+            '{0}:{1}'.format(username, password).encode('utf-8')).decode('ascii')
+
+    @property
+    def auth_cookie(self):
+        """
+        Get login cookies (log in if it's not done yet)
+        :return: cookies
+        :rtype: dict[str, str]
+        """
+        return self.session.login_cookies(self._login)
+
+    @property
+    def job_watcher(self):
+        """
+        Get job watcher, shared by session
+        :return: job watcher
+        :rtype: JobWatcher
+        """
+        return self.session.job_watcher()
+
+    def _request(self, uri, method='GET', headers=None, body=None, authenticate=True):
+        """
+        Send request or throw error. Rejected session is renewed and request is repeated once.
+        :param uri: uri
+        :type uri: str
+        :param method: HTTP method
+        :type method: str
+        :param headers: extra headers
+        :type headers: dict[str, str]|NoneType
+        :param body: request body
+        :type body: bytes|MultipartBody|NoneType
+        :param authenticate: send login cookies (log in if required)?
+        :type authenticate: bool
+        :return: response
+        :rtype: TransportResponse
+        """
+        request_headers = {
+            'Authorization': self._authorization,
+            'Accept': _JSON_ACCEPT,
+        }
+        if headers:
+            request_headers.update(headers)
+        if body is None and method != 'GET':
+            request_headers['Content-Length'] = '0'
+        elif body is not None and not isinstance(body, bytes):
+            request_headers['Content-Length'] = str(len(body))
+        url = self.endpoint.rstrip('/') + '/' + uri.lstrip('/')
+        cookies = None
+        if authenticate:
+            cookies = self.session.login_cookies(self._login)
+            request_headers['Cookie'] = self._cookie_header(cookies)
+        response = self._send(method, uri, url, request_headers, body)
+        if response.status == 401 and authenticate:
+            metrics.registry.increment('abbyy.session.renewals')
+            cookies = self.session.renew(cookies, self._login)
+            request_headers['Cookie'] = self._cookie_header(cookies)
+            response = self._send(method, uri, url, request_headers, body)
+        if response.status >= 400:
+            raise ABBYYException(response.status, response.body.decode('utf-8', 'replace'))
+        return response
+
+    def _send(self, method, uri, url, headers, body):
+        """
+        Send request with transport under limiter, repeat throttled request after Retry-After delay
+        :return: response
+        :rtype: TransportResponse
+        """
+        limiter = self.limiter
+        if limiter is None:
+            return self._transport_request(method, uri, url, headers, body)
+        name = endpoint_name(method, uri)
+        attempt = 0
+        while True:
+            permit = limiter.acquire(name)
+            try:
+                response = self._transport_request(method, uri, url, headers, body)
+            except Exception:
+                limiter.release(permit, rate_limit.ERROR)
+                raise
+            throttled = response.status in rate_limit.THROTTLED_STATUSES
+            if throttled:
+                limiter.release(permit, rate_limit.THROTTLED)
+            else:
+                limiter.release(permit, rate_limit.ERROR if response.status >= 500 else rate_limit.OK)
+            if not throttled or attempt >= limiter.retries:
+                return response
+            limiter.pause(self._retry_after(response, limiter.retry_delay * 2 ** attempt))
+            attempt += 1
+
+    @staticmethod
+    def _retry_after(response, default):
+        """
+        Get delay, that server asked to wait before next request
+        :param response: response
+        :type response: TransportResponse
+        :param default: delay if server didn't send Retry-After seconds
+        :type default: float
+        :return: delay (seconds)
+        :rtype: float
+        """
+        for name, value in response.headers:
+            if name.lower() == 'retry-after':
+                try:
+                    return max(float(value), 0.0)
+                except ValueError:
+                    break
+        return default
+
+    def _transport_request(self, method, uri, url, headers, body):
+        """
+        Send request with transport
+        :return: response
+        :rtype: TransportResponse
+        """
+        if not metrics.registry.enabled:
+            return self.transport.request(method, url, headers, body)
+        return self._measured_request(method, uri, url, headers, body)
+
+    def _measured_request(self, method, uri, url, headers, body):
+        """
+        Send request and record per-endpoint calls count, latency and transferred bytes
+        :return: response
+        :rtype: TransportResponse
+        """
+        registry = metrics.registry
+        name = endpoint_name(method, uri)
+        start = time.perf_counter()
+        try:
+            response = self.transport.request(method, url, headers, body)
+        except Exception:
+            registry.increment('abbyy.errors.' + name)
+            raise
+        finally:
+            registry.increment('abbyy.requests.' + name)
+            registry.observe('abbyy.latency.' + name, time.perf_counter() - start)
+        registry.increment('abbyy.bytes_sent.' + name, len(body) if body else 0)
+        registry.increment('abbyy.bytes_received.' + name, len(response.body))
+        if response.status >= 400:
+            registry.increment('abbyy.errors.' + name)
+        return response
 
-    def _command(self, uri, args):
+    def _command(self, uri, method='GET', headers=None, body=None):
         """
-        Return CURL output or throw error
+        Return response text or throw error
         :param uri: uri
         :type uri: str
-        :param args: CURL extra args
-        :type args: list[str]
+        :param method: HTTP method
+        :type method: str
+        :param headers: extra headers
+        :type headers: dict[str, str]|NoneType
+        :param body: request body
+        :type body: bytes|MultipartBody|NoneType
         :return: output
         :rtype: str
         """
-        command = [
-            'curl', '-s', '-u', '{0}:{1}'.format(self.username, self.password),
-            self.endpoint + '/' + uri
-        ] + args
-        with _LOCK:
-            popen = Popen(command, stdout=PIPE, stderr=PIPE)
-        output, error = popen.communicate()
-        if popen.returncode != 0:
-            raise ABBYYException(popen.returncode, error.decode())
-        return output.decode()
+        return self._request(uri, method, headers, body).text
+
+    def _json_command(self, uri, method='GET', data=None):
+        """
+        Send JSON request and parse JSON answer
+        :param uri: uri
+        :type uri: str
+        :param method: HTTP method
+        :type method: str
+        :param data: JSON-serializable request data
+        :type data: object
+        :return: answer
+        :rtype: object
+        """
+        headers = None
+        body = None
+        if data is not None:
+            headers = {'Content-Type': 'application/json;charset=UTF-8'}
+            body = json.dumps(data).encode('utf-8')
+        return json.loads(self._command(uri, method, headers, body))
+
+    def _upload(self, uri, file_name, content):
+        """
+        Upload file as multipart form
+        :param uri: uri
+        :type uri: str
+        :param file_name: file name
+        :type file_name: str
+        :param content: file content (bytes or binary file object to stream)
+        :type content: bytes|io.IOBase
+        :return: answer
+        :rtype: object
+        """
+        content_type, body = encode_multipart({'name': file_name}, 'file', file_name, content)
+        return json.loads(self._command(uri, 'POST', {
+            'Content-Type': content_type,
+            'X-Compress': 'null',
+            'Accept': '*/*'
+        }, body))
+
+    @staticmethod
+    def _cookie_header(cookies):
+        """
+        Get Cookie header value
+        :param cookies: cookies
+        :type cookies: dict[str, str]
+        :return: cookie header
+        :rtype: str
+        """
+        return '; '.join('{0}={1}'.format(name, value) for name, value in cookies.items())
 
     def _login(self):
         """
@@ -55,26 +283,16 @@ class AbbyyNetwork:
         :return: cookies
         :rtype: dict[str, str]
         """
-        cookies = self._command('/api/account/login', [
-            '--cookie-jar', '-',
-            '-H', 'X-Compress: null',
-            '-H', 'Content-Type: application/json;charset=UTF-8',
-            '-H', 'Accept: application/json, text/plain, */*',
-            '--data-binary', json.dumps({
-                'username': self.username,
-                'password': self.password,
-                'isPersistent': True,
-                'accountType': 'custom'
-            })])
-        lines = cookies.split('\n')
-        result = {}
-        for line in lines:
-            parts = [part for part in line.split('\t') if part != '']
-            if len(parts) >= 7:
-                name = parts[5]
-                value = parts[6]
-                result[name] = value
-        return result
+        response = self._request('api/account/login', 'POST', {
+            'X-Compress': 'null',
+            'Content-Type': 'application/json;charset=UTF-8'
+        }, json.dumps({
+            'username': self.username,
+            'password': self.password,
+            'isPersistent': True,
+            'accountType': 'custom'
+        }).encode('utf-8'), authenticate=False)
+        return response.cookies
 
     def classifiers(self):
         """
@@ -82,28 +300,26 @@ class AbbyyNetwork:
         :return: classifiers dict
         :rtype: dict[str, ProjectData]
         """
-        json_code = self._command('api/projects', [
-            '-H', 'Content-Type: application/json;charset=UTF-8',
-            '-H', 'Accept: application/json, text/plain, */*'
-        ])
-        data = json.loads(json_code)
+        data = self._json_command('api/projects')
         classifiers = {}
         for item in data:
             classifier = ProjectData(item)
             classifiers[classifier.id] = classifier
         return classifiers
 
-    def jobs(self):
+    def jobs(self, job_ids=None):
         """
         Get jobs
+        :param job_ids: ids of jobs to parse, None - parse all jobs
+        :type job_ids: set[str]|NoneType
         :return: jobs
         :rtype: dict[str, JobData]
         """
-        data = json.loads(self._command('api/jobs', [
-            '-H', 'Accept: application/json, text/plain, */*'
-        ]))
+        data = self._json_command('api/jobs')
         jobs = {}
         for item in data:
+            if job_ids is not None and item["Id"] not in job_ids:
+                continue
             job = JobData(item)
             jobs[job.id] = job
         return jobs
@@ -124,62 +340,73 @@ class AbbyyNetwork:
         """
         assert name != ""
         assert 0 <= inclusiveness <= 2
-        return json.loads(self._command('api/projects', [
-            '-H', 'Content-Type: application/json;charset=UTF-8',
-            '-H', 'Accept: application/json, text/plain, */*',
-            '--data-binary', json.dumps({
-                'name': name,
-                'language': language.value,
-                'useSemantics': use_semantics,
-                'inclusiveness': inclusiveness
-            })
-        ]))
-
-    def classes_zip(self, classes):
+        return self._json_command('api/projects', 'POST', {
+            'name': name,
+            'language': language.value,
+            'useSemantics': use_semantics,
+            'inclusiveness': inclusiveness
+        })
+
+    def classes_zip(self, classes, compresslevel=None):
         """
         Build classes zip file
-        :param classes: class examples
-        :type classes: dict[str, list[str]]
+        :param classes: class name -> examples (any iterable, e.g. generator)
+        :type classes: collections.abc.Mapping[str, collections.abc.Iterable[str]]
+        :param compresslevel: deflate compression level (0-9), None - no compression
+        :type compresslevel: int|NoneType
         :return: path to zip file
         :rtype: str
         """
-        path = tempfile.mktemp('.classes.zip')
-        zf = zipfile.ZipFile(path, 'w')
-        for class_name, examples in classes.items():
-            for i, example in enumerate(examples):
-                zf.writestr(class_name + '/' + str(i) + '.txt', example)
-        zf.close()
+        fd, path = tempfile.mkstemp('.classes.zip')
+        with os.fdopen(fd, 'wb') as f:
+            write_classes_zip(classes, f, compresslevel)
         return path
 
-    def _import_set(self, project_id, set_path, type):
+    def classes_zip_buffer(self, classes, compresslevel=None, max_memory=_SPOOL_MAX_MEMORY, fingerprint=None):
+        """
+        Build classes zip in memory (spooled to temporary file if it's bigger than max_memory)
+        :param classes: class name -> examples (any iterable, e.g. generator)
+        :type classes: collections.abc.Mapping[str, collections.abc.Iterable[str]]
+        :param compresslevel: deflate compression level (0-9), None - no compression
+        :type compresslevel: int|NoneType
+        :param max_memory: max archive size kept in memory (bytes)
+        :type max_memory: int
+        :param fingerprint: fingerprint to fill with archived examples
+        :type fingerprint: TrainingSetFingerprint|NoneType
+        :return: archive buffer, positioned at start
+        :rtype: tempfile.SpooledTemporaryFile
+        """
+        buffer = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        write_classes_zip(classes, buffer, compresslevel, fingerprint)
+        buffer.seek(0)
+        return buffer
+
+    def _import_set(self, project_id, set_file, type):
         """
         Set set from zip file
         :param project_id: project id
         :type project_id: str
-        :param set_path: train set zip path (see classes_zip)
-        :type set_path: str
+        :param set_file: zip path (see classes_zip) or binary file object (see classes_zip_buffer)
+        :type set_file: str|io.IOBase
         :param type: set type (trainingSet/controlSet)
         :type type: str
         :return: work id
         :rtype: str
         """
-        _, fname = os.path.split(set_path)
-        work_id = json.loads(self._command(
-            'api/projects/{0}/{1}/import?runNextStep=true'.format(project_id, type), [
-                '-H', 'Content-Type: multipart/form-data',
-                '-H', 'X-Compress: null',
-                '-H', 'Accept: */*',
-                '-F', 'name={0}'.format(fname),
-                '-F', 'file=@{0}'.format(set_path)]))
-        return work_id
+        uri = 'api/projects/{0}/{1}/import?runNextStep=true'.format(project_id, type)
+        if isinstance(set_file, str):
+            _, fname = os.path.split(set_file)
+            with open(set_file, 'rb') as f:
+                return self._upload(uri, fname, f)
+        return self._upload(uri, 'classes.zip', set_file)
 
     def upload_train_set(self, project_id, set_path):
         """
         Set train set from zip file
         :param project_id: project id
         :type project_id: str
-        :param set_path: train set zip path (see classes_zip)
-        :type set_path: str
+        :param set_path: train set zip path (see classes_zip) or file object (see classes_zip_buffer)
+        :type set_path: str|io.IOBase
         :return: work id
         :rtype: str
         """
@@ -190,8 +417,8 @@ class AbbyyNetwork:
         Set test set from zip file
         :param project_id: project id
         :type project_id: str
-        :param set_path: train set zip path (see classes_zip)
-        :type set_path: str
+        :param set_path: test set zip path (see classes_zip) or file object (see classes_zip_buffer)
+        :type set_path: str|io.IOBase
         :return: work id
         :rtype: str
         """
@@ -203,9 +430,9 @@ class AbbyyNetwork:
         :param project_id: project id
         :type project_id: str
         """
-        self._command('api/projects/{0}/deploy'.format(project_id), [
-            '-X', 'POST', '-H', 'Accept: application/json, text/plain, */*',
-            '-H', 'Content-Length: 0'])
+        self._command('api/projects/{0}/deploy'.format(project_id), 'POST')
+        CategoryIndex.invalidate_project(self.endpoint, project_id)
+        DocumentIndex.invalidate_project(self.endpoint, project_id)
 
     def classifier_document_name(self, content):
         """
@@ -215,7 +442,10 @@ class AbbyyNetwork:
         :return: document file name
         :rtype: str
         """
-        return translit(''.join([char for char in content if char.isalpha()]) + '.txt', reversed=True)
+        from transliterate import translit
+        # Source language is set explicitly : language detection fails on Latin-only texts,
+        # Russian texts get same names as with detected language
+        return translit(''.join([char for char in content if char.isalpha()]) + '.txt', 'ru', reversed=True)
 
     def upload_classifier_document(self, project_id, content):
         """
@@ -227,28 +457,9 @@ class AbbyyNetwork:
         :return: job id
         :rtype: str
         """
-        auth_cookie = ""
-        for cookie_name, cookie_value in self.auth_cookie.items():
-            auth_cookie += "{0}={1}; ".format(cookie_name, cookie_value)
         fname = self.classifier_document_name(content)
-        temp_path = tempfile.mkdtemp()
-        temp = os.path.join(temp_path, fname)
-        with open(temp, 'w') as f:
-            f.write(content)
-        try:
-            answer = json.loads(self._command('api/projects/{0}/classificationSet/documents/import'.format(project_id), [
-                '-H', 'Cookie: {0}'.format(auth_cookie),
-                '-H', 'X-Compress: null',
-                '-H', 'Content-Type: multipart/form-data',
-                '-H', 'Accept: */*',
-                '-H', 'Connection: keep-alive',
-                '-F', 'name={0}'.format(fname),
-                '-F', 'file=@{0}'.format(temp)]))
-        except Exception as e:
-            raise e
-        finally:
-            os.remove(temp)
-            #TODO: remove directory too
+        answer = self._upload('api/projects/{0}/classificationSet/documents/import'.format(project_id),
+                              fname, content.encode('utf-8'))
         if isinstance(answer, dict):
             raise ABBYYException(0, answer["ErrorMessage"])
         else:
@@ -262,27 +473,38 @@ class AbbyyNetwork:
         :return: job id
         :rtype: str
         """
-        return json.loads(self._command('api/projects/{0}/classifying'.format(project_id), [
-            '-X', 'POST', '-H', 'Accept: application/json, text/plain, */*',
-            '-H', 'Content-Length: 0']))
+        return self._json_command('api/projects/{0}/classifying'.format(project_id), 'POST')
 
-    def documents(self, project_id):
+    def documents(self, project_id, names=None):
         """
         Get documents data
         :param project_id: project id
         :type project_id: str
+        :param names: names of documents to parse, None - parse all documents
+        :type names: set[str]|NoneType
         :return: documents
         :rtype: dict[str, DocumentData]
         """
-        documents = [DocumentData(item) for item in json.loads(self._command('api/projects/{0}/classificationSet/documents'.format(project_id), [
-            '-H', self.auth_cookie,
-            '-H', 'X-Compress: null',
-            '-H', 'Accept: application/json, text/plain, */*']))]
+        data = self._json_command('api/projects/{0}/classificationSet/documents'.format(project_id))
         result = {}
-        for item in documents:
-            result[item.name] = item
+        for item in data:
+            if names is not None and item["Name"] not in names:
+                continue
+            document = DocumentData(item)
+            result[document.name] = document
         return result
 
+    def delete_classifier_documents(self, project_id, names):
+        """
+        Delete documents from classification set
+        :param project_id: project id
+        :type project_id: str
+        :param names: document names
+        :type names: list[str]
+        """
+        self._json_command('api/projects/{0}/classificationSet/documents/delete'.format(project_id),
+                           'POST', list(names))
+
     def categories(self, project_id):
         """
         Get categories
@@ -291,11 +513,10 @@ class AbbyyNetwork:
         :return: categories
         :rtype: dict[int, CategoryData]
         """
-        categories = [CategoryData(item) for item in json.loads(self._command('api/projects/{0}/categories'.format(project_id), [
-            '-H', self.auth_cookie,
-            '-H', 'Accept: application/json, text/plain, */*']))]
+        data = self._json_command('api/projects/{0}/categories'.format(project_id))
         result = {}
-        for category in categories:
+        for item in data:
+            category = CategoryData(item)
             result[category.id] = category
         return result
 
@@ -314,8 +535,4 @@ class AbbyyNetwork:
         bool2str = {True:'true', False:'false'}
         uri = 'api/projects/{0}/clear?clearClassificationSet={1}&clearControlSet={2}&clearTrainingSet={3}'\
             .format(project_id, bool2str[classification], bool2str[control], bool2str[training])
-        self._command(uri, [
-            '-X', 'POST',
-            '-H', self.auth_cookie,
-            '-H', 'Accept: application/json, text/plain, */*',
-            '-H', 'Content-Length: 0'])
+        self._command(uri, 'POST')
@@ -0,0 +1,384 @@
+"""
+Latency/throughput benchmarks against local fake SmartClassifier server.
+Usage : python -m nlc_abbyy.benchmark [--operations N] [--concurrency N] [--latency SECONDS] [--job-duration SECONDS]
+                                     [--cold-starts N] [--profile]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from nlc import LocalTfidfClassifier, MultiClassifier, PoolClassifier, metrics
+from .abbyy_classifier import ABBYYClassifier
+from .fake_server import FakeSmartClassifier
+from .language import Language
+
+
+SAMPLE_CLASSES = {
+    "capabilities": [
+        "can you turn on the radio", "help", "help me",
+        "How are you going to help me?", "how can you help me",
+        "need help", "tell me what you can do", "What are you",
+        "what are you capable of", "what are your capabilities Watson?",
+        "what can I do", "What can i say", "what can you do",
+        "what can you do for me", "what can you help me with",
+        "what do you know", "what else", "what things can you do"
+    ],
+    "locate_amenity": [
+        "Amenities", "can you find a good place to eat?",
+        "can you find the nearest gas station for me",
+        "find a restaurant", "Find best gas option", "find me a restaurant",
+        "get me directions", "I am hungry", "I'd like to get something to eat",
+        "i'm hungry", "im hungry I want to eat something", "i need some coffee",
+        "i need to stop for gas", "Information on locations near me", "I want a bar",
+        "i want drink", "I want eat", "i want pizza", "I want to eat pizza",
+        "I want to stop for some food", "let's get some grub", "locate ammenity",
+        "Navigation", "nearby restaurant", "order a pizza", "pizza", "restaurant",
+        "restaurants", "show me the best path", "Stop for food/coffee",
+        "where are the closest restrooms", "where can i drink", "where can i eat pizza?",
+        "where can i have pizza", "where is a restaurant", "where is ATM",
+        "where is the bathroom?", "where is the pool", "where's the nearest exit"
+    ]
+}
+
+SAMPLE_TEST_CLASSES = {
+    'capabilities': [
+        'so, what your current version can do?',
+        'what\'s your abilities?', 'can switch off phone?'
+    ],
+    'locate_amenity': [
+        'find restaurants or something like it', 'what places you know?',
+        'search for hotels'
+    ]
+}
+
+
+class BenchmarkResult:
+    """
+    Benchmark scenario result
+    """
+
+    def __init__(self, name, latencies, wall_time, remote_calls, operations=None):
+        """
+        Initialize result
+        :param name: scenario name
+        :type name: str
+        :param latencies: call latencies (seconds)
+        :type latencies: list[float]
+        :param wall_time: total scenario time (seconds)
+        :type wall_time: float
+        :param remote_calls: API calls made by scenario
+        :type remote_calls: int
+        :param operations: processed items count (if single call processes many items), None - calls count
+        :type operations: int|NoneType
+        """
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.wall_time = wall_time
+        self.remote_calls = remote_calls
+        self.operations = len(self.latencies) if operations is None else operations
+
+    def percentile(self, q):
+        """
+        Get latency percentile
+        :param q: percentile (0-100)
+        :type q: float
+        :return: latency (seconds)
+        :rtype: float
+        """
+        if not self.latencies:
+            return 0.0
+        index = max(0, int(math.ceil(q / 100.0 * len(self.latencies))) - 1)
+        return self.latencies[index]
+
+    def summary(self):
+        """
+        Get result summary
+        :return: summary
+        :rtype: dict[str, float]
+        """
+        return {
+            'name': self.name,
+            'operations': self.operations,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'ops_per_second': self.operations / self.wall_time if self.wall_time else 0.0,
+            'calls_per_operation': self.remote_calls / self.operations if self.operations else 0.0
+        }
+
+    def __str__(self):
+        return '{name:<28} {operations:>6} {p50_ms:>10.2f} {p95_ms:>10.2f} {p99_ms:>10.2f} ' \
+               '{ops_per_second:>10.1f} {calls_per_operation:>8.2f}'.format(**self.summary())
+
+
+def _header():
+    return '{0:<28} {1:>6} {2:>10} {3:>10} {4:>10} {5:>10} {6:>8}'.format(
+        'scenario', 'ops', 'p50 ms', 'p95 ms', 'p99 ms', 'ops/s', 'calls/op')
+
+
+def _letters(number):
+    """
+    Convert number to letters-only suffix (document names use only letters)
+    """
+    result = ''
+    while True:
+        number, digit = divmod(number, len(string.ascii_lowercase))
+        result += string.ascii_lowercase[digit]
+        if number == 0:
+            return result
+
+
+def unique_texts(count, start=0):
+    """
+    Get texts, that map to different classification documents
+    :param count: texts count
+    :type count: int
+    :param start: first text number (to get texts different from previous calls)
+    :type start: int
+    :return: texts
+    :rtype: list[str]
+    """
+    examples = [example for examples in SAMPLE_CLASSES.values() for example in examples]
+    return ['{0} {1}'.format(examples[i % len(examples)], _letters(i)) for i in range(start, start + count)]
+
+
+def repeated_texts(count):
+    """
+    Get texts from small set of hot queries
+    :param count: texts count
+    :type count: int
+    :return: texts
+    :rtype: list[str]
+    """
+    hot = SAMPLE_TEST_CLASSES['capabilities'] + SAMPLE_TEST_CLASSES['locate_amenity']
+    return [hot[i % len(hot)] for i in range(count)]
+
+
+def run_benchmark(name, operation, items, concurrency=1, servers=(), operations=None):
+    """
+    Run operation for every item and measure latencies
+    :param name: scenario name
+    :type name: str
+    :param operation: function to benchmark
+    :type operation: callable
+    :param items: operation arguments
+    :type items: list
+    :param concurrency: concurrent workers
+    :type concurrency: int
+    :param servers: fake servers to count API calls
+    :type servers: list[FakeSmartClassifier]
+    :param operations: processed items count, None - one per item
+    :type operations: int|NoneType
+    :return: result
+    :rtype: BenchmarkResult
+    """
+    def timed(item):
+        start = time.perf_counter()
+        operation(item)
+        return time.perf_counter() - start
+
+    calls_before = sum(server.total_calls() for server in servers)
+    start = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [timed(item) for item in items]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(executor.map(timed, items))
+    wall_time = time.perf_counter() - start
+    remote_calls = sum(server.total_calls() for server in servers) - calls_before
+    return BenchmarkResult(name, latencies, wall_time, remote_calls, operations)
+
+
+def _new_classifier(server, name, manifest):
+    return ABBYYClassifier(('benchmark', 'benchmark'), server.endpoint, new_classifier={
+        'name': name,
+        'language': Language.english,
+        'use_semantics': True,
+        'inclusiveness': 1
+    }, manifest=manifest)
+
+
+# Runs in fresh interpreter : times package imports and first classification of classifier from config
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import nlc
+nlc_imported = time.perf_counter()
+import nlc_abbyy
+nlc_abbyy_imported = time.perf_counter()
+heavy = sorted(name for name in ('numpy', 'transliterate', 'http.client', 'ssl') if name in sys.modules)
+classifier = nlc.BaseClassifier.from_config(json.loads(sys.argv[1]))
+classifier.classify(sys.argv[2])
+classified = time.perf_counter()
+print(json.dumps({
+    'import nlc': nlc_imported - start,
+    'import nlc_abbyy': nlc_abbyy_imported - nlc_imported,
+    'first classify': classified - nlc_abbyy_imported,
+    'heavy_modules': heavy
+}))
+"""
+
+COLD_START_STAGES = ('import nlc', 'import nlc_abbyy', 'first classify')
+
+
+def cold_start_benchmark(server, config, repeats=5):
+    """
+    Measure short-lived process cost : package imports and first classification in fresh interpreters
+    :param server: fake server, that hosts trained classifier
+    :type server: FakeSmartClassifier
+    :param config: classifier config
+    :type config: dict
+    :param repeats: processes to run
+    :type repeats: int
+    :return: results per stage, heavy modules loaded by package imports
+    :rtype: tuple[list[BenchmarkResult], list[str]]
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [root, environment.get('PYTHONPATH')]))
+    latencies = {stage: [] for stage in COLD_START_STAGES}
+    heavy = set()
+    calls_before = server.total_calls()
+    for i in range(repeats):
+        output = subprocess.check_output(
+            [sys.executable, '-c', _COLD_START_SCRIPT, json.dumps(config), unique_texts(1, 10 ** 6 + i)[0]],
+            env=environment)
+        timings = json.loads(output.decode())
+        heavy.update(timings.pop('heavy_modules'))
+        for stage, elapsed in timings.items():
+            latencies[stage].append(elapsed)
+    remote_calls = server.total_calls() - calls_before
+    return [
+        BenchmarkResult('cold: ' + stage, latencies[stage], sum(latencies[stage]),
+                        remote_calls if stage == 'first classify' else 0)
+        for stage in COLD_START_STAGES
+    ], sorted(heavy)
+
+
+def benchmark_suite(operations=200, concurrency=4, latency=0.002, job_duration=0.02, cold_starts=5):
+    """
+    Run all benchmark scenarios
+    :param operations: classifications per classify scenario
+    :type operations: int
+    :param concurrency: concurrent workers
+    :type concurrency: int
+    :param latency: fake API latency per request (seconds)
+    :type latency: float
+    :param job_duration: fake API job duration (seconds)
+    :type job_duration: float
+    :param cold_starts: fresh processes for cold start scenarios (0 - skip them)
+    :type cold_starts: int
+    :return: results
+    :rtype: list[BenchmarkResult]
+    """
+    results = []
+    server_options = {'latency': {'default': latency}, 'job_duration': {'default': job_duration},
+                      'serial_jobs': True}
+    with FakeSmartClassifier(**server_options) as server, FakeSmartClassifier(**server_options) as back_server, \
+            tempfile.TemporaryDirectory() as manifest_dir:
+        manifest = os.path.join(manifest_dir, 'manifest.json')
+        classifier = _new_classifier(server, 'Benchmark', manifest)
+        results.append(run_benchmark('train', lambda classes: classifier.train(classes, force=True),
+                                     [SAMPLE_CLASSES] * 3, 1, [server]))
+        results.append(run_benchmark('train (unchanged set)', lambda classes: classifier.train(classes),
+                                     [SAMPLE_CLASSES] * 3, 1, [server]))
+        results.append(run_benchmark('test', lambda classes: classifier.test(classes),
+                                     [SAMPLE_TEST_CLASSES] * 3, 1, [server]))
+        if cold_starts:
+            cold_results, heavy = cold_start_benchmark(server, classifier.config, cold_starts)
+            results.extend(cold_results)
+            if heavy:
+                print("Warning : package imports load {0}".format(', '.join(heavy)))
+        results.append(run_benchmark('classify (unique texts)', classifier.classify,
+                                     unique_texts(operations), concurrency, [server]))
+        results.append(run_benchmark('classify (repeated texts)', classifier.classify,
+                                     repeated_texts(operations), concurrency, [server]))
+        batch_size = 50
+        texts = unique_texts(operations, operations)
+        batches = [texts[i:i + batch_size] for i in range(0, operations, batch_size)]
+        results.append(run_benchmark('classify_many (batch=50)', classifier.classify_many, batches, 1, [server],
+                                     operations))
+        texts = unique_texts(operations, 200 * operations)
+        batches = [texts[i:i + batch_size] for i in range(0, operations, batch_size)]
+        results.append(run_benchmark('classify_matrix (batch=50)', classifier.classify_matrix, batches, 1, [server],
+                                     operations))
+        server.max_concurrency = 2
+        try:
+            results.append(run_benchmark('classify (throttled server)', classifier.classify,
+                                         unique_texts(operations, 6 * operations), concurrency, [server]))
+        finally:
+            server.max_concurrency = None
+
+        back = _new_classifier(back_server, 'BenchmarkBack', manifest)
+        back.train(SAMPLE_CLASSES)
+        multi = MultiClassifier(classifier, back)
+        server.errors = {'default': 1.0}
+        try:
+            results.append(run_benchmark('multi failover (front down)', multi.classify,
+                                         unique_texts(operations, 2 * operations), concurrency, [server, back_server]))
+        finally:
+            server.errors = {}
+        with FakeSmartClassifier(**server_options) as second_server, \
+                FakeSmartClassifier(**server_options) as third_server:
+            replica_servers = [back_server, second_server, third_server]
+            pool = PoolClassifier([_new_classifier(replica_server, 'BenchmarkReplica', manifest)
+                                   for replica_server in replica_servers])
+            pool.train(SAMPLE_CLASSES)
+            results.append(run_benchmark('pool x3 classify (unique)', pool.classify,
+                                         unique_texts(operations, 5 * operations), concurrency, replica_servers))
+
+        local = LocalTfidfClassifier()
+        local.train(SAMPLE_CLASSES)
+        local_texts = unique_texts(100 * operations, 4 * operations)
+        results.append(run_benchmark('local_tfidf classify', local.classify, local_texts))
+        results.append(run_benchmark('local_tfidf classify_many', local.classify_many,
+                                     [local_texts[i:i + 1000] for i in range(0, len(local_texts), 1000)], 1, (),
+                                     len(local_texts)))
+        results.append(run_benchmark('local_tfidf classify_matrix', local.classify_matrix,
+                                     [local_texts[i:i + 1000] for i in range(0, len(local_texts), 1000)], 1, (),
+                                     len(local_texts)))
+        hedged = MultiClassifier(classifier, back, latency_budget=0.05)
+        server.latency = {'default': 0.5}
+        try:
+            results.append(run_benchmark('multi hedged (front slow)', hedged.classify,
+                                         unique_texts(operations, 3 * operations), concurrency, [server, back_server]))
+        finally:
+            server.latency = server_options['latency']
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='nlc_abbyy benchmarks against local fake SmartClassifier')
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.002, help='fake API latency per request (seconds)')
+    parser.add_argument('--job-duration', type=float, default=0.02, help='fake API job duration (seconds)')
+    parser.add_argument('--cold-starts', type=int, default=5,
+                        help='fresh processes for import/first classify timings (0 - skip)')
+    parser.add_argument('--profile', action='store_true', help='print per-stage and per-endpoint timings')
+    args = parser.parse_args(argv)
+    with metrics.profile() as profile:
+        results = benchmark_suite(args.operations, args.concurrency, args.latency, args.job_duration,
+                                  args.cold_starts)
+    print(_header())
+    for result in results:
+        print(result)
+    if args.profile:
+        print()
+        print('{0:<72} {1:>8} {2:>10} {3:>10} {4:>10}'.format('timing', 'count', 'mean ms', 'p95 ms', 'max ms'))
+        for name, histogram in sorted(profile['histograms'].items()):
+            print('{0:<72} {1:>8} {2:>10.2f} {3:>10.2f} {4:>10.2f}'.format(
+                name, histogram['count'], histogram['mean'] * 1000, histogram['p95'] * 1000, histogram['max'] * 1000))
+        print()
+        for name, value in sorted(profile['counters'].items()):
+            print('{0:<72} {1:>12}'.format(name, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import threading
+from nlc import metrics
+from .data import CategoryData
+
+
+class CategoryIndex:
+    """
+    Project categories, loaded once and shared between all classifiers of same project.
+    Reloaded after invalidation (train/publish) or when unknown category id requested.
+    """
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, network, project_id):
+        """
+        Initialize index
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        """
+        self._network = network
+        self.project_id = project_id
+        self._categories = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @staticmethod
+    def for_project(network, project_id):
+        """
+        Get shared index of project
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        :return: index
+        :rtype: CategoryIndex
+        """
+        key = (network.endpoint, project_id)
+        with CategoryIndex._indexes_lock:
+            index = CategoryIndex._indexes.get(key)
+            if index is None:
+                index = CategoryIndex(network, project_id)
+                CategoryIndex._indexes[key] = index
+            return index
+
+    @staticmethod
+    def invalidate_project(endpoint, project_id):
+        """
+        Invalidate shared index of project (if exists)
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :param project_id: project id
+        :type project_id: str
+        """
+        with CategoryIndex._indexes_lock:
+            index = CategoryIndex._indexes.get((endpoint, project_id))
+        if index is not None:
+            index.invalidate()
+
+    def invalidate(self):
+        """
+        Drop loaded categories. They will be reloaded on next access.
+        """
+        with self._lock:
+            self._categories = None
+
+    def _load(self, stale):
+        """
+        Load categories, unless other thread already replaced stale ones
+        :param stale: categories dict known by caller
+        :type stale: dict[int, CategoryData]|NoneType
+        :return: categories
+        :rtype: dict[int, CategoryData]
+        """
+        with self._lock:
+            if self._categories is None or self._categories is stale:
+                with metrics.registry.timer('abbyy.categories.load'):
+                    self._categories = self._network.categories(self.project_id)
+                self.loads += 1
+            return self._categories
+
+    def categories(self):
+        """
+        Get categories
+        :return: categories
+        :rtype: dict[int, CategoryData]
+        """
+        categories = self._categories
+        if categories is None:
+            categories = self._load(None)
+        return categories
+
+    def get(self, category_id):
+        """
+        Get category
+        :param category_id: category id
+        :type category_id: int
+        :return: category
+        :rtype: CategoryData
+        """
+        categories = self.categories()
+        category = categories.get(category_id)
+        if category is None:
+            category = self._load(categories)[category_id]
+        return category
+
+    def snapshot(self):
+        """
+        Get loaded categories as JSON-serializable records
+        :return: raw category records, None if categories aren't loaded
+        :rtype: list[dict]|NoneType
+        """
+        categories = self._categories
+        if categories is None:
+            return None
+        return [category.raw for category in categories.values()]
+
+    def restore(self, records):
+        """
+        Restore categories from snapshot
+        :param records: raw category records (see snapshot)
+        :type records: list[dict]
+        """
+        categories = {}
+        for record in records:
+            category = CategoryData(record)
+            categories[category.id] = category
+        with self._lock:
+            self._categories = categories
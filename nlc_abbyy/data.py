@@ -2,35 +2,86 @@ from .language import Language
 
 
 class Data:
+    """
+    Base API data model. Models keep raw JSON record and read fields from it on access,
+    nested fields are parsed on first access only.
+    """
+    __slots__ = ()
+    _fields = ()
+
     def __str__(self):
-        return str(self.__dict__)
+        return str({name: getattr(self, name) for name in self._fields})
 
     def __repr__(self):
         return str(self)
 
 
+class _RecordData(Data):
+    """
+    Model over raw JSON record
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, data):
+        """
+        Initialize data
+        :param data: raw JSON record
+        :type data: dict
+        """
+        self.raw = data
+
+
 class ClassifiedCategoriesData(Data):
+    __slots__ = ('probability', 'is_confident', 'category_id')
+    _fields = __slots__
+
     def __init__(self, probability, is_confident, category_id):
         self.probability = probability
         self.is_confident = is_confident
         self.category_id = category_id
 
 
-class DocumentData(Data):
+def _warnings(data):
+    return [
+        item["LocalizedMessages"]
+        for item in data["Warnings"]
+        ]
+
+
+class DocumentData(_RecordData):
+    __slots__ = ('_classified_categories',)
+    _fields = ('name', 'error', 'warnings', 'classified_categories')
+
     def __init__(self, data):
-        self.name = data["Name"]
-        self.error = data["Error"]
-        self.warnings = [
-            item["LocalizedMessages"]
-            for item in data["Warnings"]
-            ]
-        self.classified_categories = [
-            ClassifiedCategoriesData(category["Probability"], category["IsConfident"], category["CategoryId"])
-            for category in data["ClassifiedCategories"]
-            ]
+        super().__init__(data)
+        self._classified_categories = None
+
+    @property
+    def name(self):
+        return self.raw["Name"]
+
+    @property
+    def error(self):
+        return self.raw["Error"]
+
+    @property
+    def warnings(self):
+        return _warnings(self.raw)
+
+    @property
+    def classified_categories(self):
+        if self._classified_categories is None:
+            self._classified_categories = [
+                ClassifiedCategoriesData(category["Probability"], category["IsConfident"], category["CategoryId"])
+                for category in self.raw["ClassifiedCategories"]
+                ]
+        return self._classified_categories
 
 
 class ProjectConfiguration(Data):
+    __slots__ = ('name', 'language', 'use_sematics', 'inclusiveness')
+    _fields = __slots__
+
     def __init__(self, name, language, use_semantics, inclusiveness):
         self.name = name
         self.language = Language(language)
@@ -38,59 +89,123 @@ class ProjectConfiguration(Data):
         self.inclusiveness = inclusiveness
 
 
-class ProjectData(Data):
+def _fmeasure(data, set_info):
+    """
+    Get set F-Measure from project record (1.0 if it's unknown)
+    """
+    model_info = data.get("ModelInfo")
+    if not model_info:
+        return 1.0
+    info = model_info.get(set_info)
+    if info and "FMeasure" in info:
+        return info["FMeasure"]
+    return 1.0
+
+
+class ProjectData(_RecordData):
+    __slots__ = ('_configuration',)
+    _fields = ('id', 'configuration', 'created_timestamp', 'deployed_timestamp', 'is_model_only',
+               'control_fmeasure', 'train_fmeasure')
+
     def __init__(self, data):
         """
         Initialize data
         :param data: dict
         :type data: dict
         """
-        self.id = data["Id"]
-        self.configuration = ProjectConfiguration(
-            data["Configuration"]["Name"],
-            data["Configuration"]["Language"],
-            data["Configuration"]["UseSemantics"],
-            data["Configuration"]["Inclusiveness"]
-        )
-        self.created_timestamp = data["CreatedTimestamp"]
-        self.deployed_timestamp = data["DeployedTimestamp"]
-        self.is_model_only = data["IsModelOnly"]
-        self.control_fmeasure = 1.0
-        self.train_fmeasure = 1.0
-        if "ModelInfo" in data:
-            if "ControlSetInfo" in data["ModelInfo"]:
-                control_set_info = data["ModelInfo"]["ControlSetInfo"]
-                if control_set_info and "FMeasure" in control_set_info:
-                    self.control_fmeasure = control_set_info["FMeasure"]
-            if "TrainingSetInfo" in data["ModelInfo"]:
-                training_set_info = data["ModelInfo"]["TrainingSetInfo"]
-                if training_set_info and "FMeasure" in training_set_info:
-                    self.train_fmeasure = training_set_info["FMeasure"]
-
-
-class JobData(Data):
-    def __init__(self, data):
-        """
-        Initialize job data
-        :param data: data
-        :type data: dict
-        """
-        self.id = data["Id"]
-        self.project_id = data["ProjectId"]
-        self.started = data["Started"]
-        self.finished = data["Finished"]
-        self.status = data["Status"]
-        self.progress = data["Progress"]
-        self.error = data["Error"]
-        self.type = data["Type"]
-        self.warnings = [
-            warning["LocalizedMessages"]
-            for warning in data["Warnings"]
-            ]
-
-
-class CategoryData(Data):
-    def __init__(self, data):
-        self.id = data["Id"]
-        self.parent_id = data["ParentId"]
-        self.name = data["Configuration"]["Name"]
+        super().__init__(data)
+        self._configuration = None
+
+    @property
+    def id(self):
+        return self.raw["Id"]
+
+    @property
+    def configuration(self):
+        if self._configuration is None:
+            configuration = self.raw["Configuration"]
+            self._configuration = ProjectConfiguration(
+                configuration["Name"],
+                configuration["Language"],
+                configuration["UseSemantics"],
+                configuration["Inclusiveness"]
+            )
+        return self._configuration
+
+    @property
+    def created_timestamp(self):
+        return self.raw["CreatedTimestamp"]
+
+    @property
+    def deployed_timestamp(self):
+        return self.raw["DeployedTimestamp"]
+
+    @property
+    def is_model_only(self):
+        return self.raw["IsModelOnly"]
+
+    @property
+    def control_fmeasure(self):
+        return _fmeasure(self.raw, "ControlSetInfo")
+
+    @property
+    def train_fmeasure(self):
+        return _fmeasure(self.raw, "TrainingSetInfo")
+
+
+class JobData(_RecordData):
+    __slots__ = ()
+    _fields = ('id', 'project_id', 'started', 'finished', 'status', 'progress', 'error', 'type', 'warnings')
+
+    @property
+    def id(self):
+        return self.raw["Id"]
+
+    @property
+    def project_id(self):
+        return self.raw["ProjectId"]
+
+    @property
+    def started(self):
+        return self.raw["Started"]
+
+    @property
+    def finished(self):
+        return self.raw["Finished"]
+
+    @property
+    def status(self):
+        return self.raw["Status"]
+
+    @property
+    def progress(self):
+        return self.raw["Progress"]
+
+    @property
+    def error(self):
+        return self.raw["Error"]
+
+    @property
+    def type(self):
+        return self.raw["Type"]
+
+    @property
+    def warnings(self):
+        return _warnings(self.raw)
+
+
+class CategoryData(_RecordData):
+    __slots__ = ()
+    _fields = ('id', 'parent_id', 'name')
+
+    @property
+    def id(self):
+        return self.raw["Id"]
+
+    @property
+    def parent_id(self):
+        return self.raw["ParentId"]
+
+    @property
+    def name(self):
+        return self.raw["Configuration"]["Name"]
@@ -0,0 +1,297 @@
+from contextlib import contextmanager
+import itertools
+import threading
+from .data import DocumentData
+
+
+class DocumentIndex:
+    """
+    Local view of project classification set: known document names, upload state and classification results.
+    Shared between all classifiers of same project. Updated from upload and classification results,
+    so server is asked only about documents missing locally. Documents of in-flight requests are pinned
+    to keep them from eviction, whole set is changed only when no documents are pinned (see exclusive). Documents, classified by previous model, are stale : they stay in the set
+    until they are evicted or uploaded again for classification by current model.
+    """
+    UPLOADED = 'uploaded'
+    CLASSIFIED = 'classified'
+    STALE = 'stale'
+
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, network, project_id):
+        """
+        Initialize index
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        """
+        self._network = network
+        self.project_id = project_id
+        self._states = {}
+        self._documents = {}
+        self._last_access = {}
+        self._hits = {}
+        self._pins = {}
+        self._clock = itertools.count()
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._pins_changed = threading.Condition(self._lock)
+        self._exclusive = False
+        self.fetches = 0
+
+    @staticmethod
+    def for_project(network, project_id):
+        """
+        Get shared index of project
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        :return: index
+        :rtype: DocumentIndex
+        """
+        key = (network.endpoint, project_id)
+        with DocumentIndex._indexes_lock:
+            index = DocumentIndex._indexes.get(key)
+            if index is None:
+                index = DocumentIndex(network, project_id)
+                DocumentIndex._indexes[key] = index
+            return index
+
+    @staticmethod
+    def invalidate_project(endpoint, project_id):
+        """
+        Invalidate classification results of shared index of project (if exists)
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :param project_id: project id
+        :type project_id: str
+        """
+        with DocumentIndex._indexes_lock:
+            index = DocumentIndex._indexes.get((endpoint, project_id))
+        if index is not None:
+            index.invalidate()
+
+    def __contains__(self, name):
+        return name in self._states
+
+    def __len__(self):
+        return len(self._states)
+
+    def state(self, name):
+        """
+        Get document state
+        :param name: document name
+        :type name: str
+        :return: UPLOADED, CLASSIFIED, STALE or None for unknown document
+        :rtype: str|NoneType
+        """
+        return self._states.get(name)
+
+    def get(self, name):
+        """
+        Get classified document
+        :param name: document name
+        :type name: str
+        :return: document (None if document isn't classified yet)
+        :rtype: DocumentData|NoneType
+        """
+        return self._documents.get(name)
+
+    def ensure_loaded(self):
+        """
+        Load whole classification set once
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.fetch()
+                    self._loaded = True
+
+    def fetch(self, names=None):
+        """
+        Fetch documents from server and update index
+        :param names: document names to update, None - update all documents
+        :type names: list[str]|NoneType
+        :return: fetched documents
+        :rtype: dict[str, DocumentData]
+        """
+        documents = self._network.documents(self.project_id, None if names is None else set(names))
+        self.update(documents)
+        self.fetches += 1
+        return documents
+
+    def mark_uploaded(self, names):
+        """
+        Mark documents as uploaded (but not classified yet)
+        :param names: document names
+        :type names: list[str]
+        """
+        with self._lock:
+            for name in names:
+                self._states[name] = DocumentIndex.UPLOADED
+                self._documents.pop(name, None)
+
+    def update(self, documents):
+        """
+        Store classified documents
+        :param documents: documents
+        :type documents: dict[str, DocumentData]
+        """
+        with self._lock:
+            for name, document in documents.items():
+                if document.classified_categories:
+                    self._states[name] = DocumentIndex.CLASSIFIED
+                    self._documents[name] = document
+                else:
+                    self._states[name] = DocumentIndex.UPLOADED
+
+    def touch(self, names):
+        """
+        Register documents access
+        :param names: document names
+        :type names: list[str]
+        """
+        with self._lock:
+            for name in names:
+                self._last_access[name] = next(self._clock)
+                self._hits[name] = self._hits.get(name, 0) + 1
+
+    def access_stats(self):
+        """
+        Get access statistics of classified and stale documents, that are not pinned
+        :return: document name -> (last access tick, access count)
+        :rtype: dict[str, tuple[int, int]]
+        """
+        with self._lock:
+            return {
+                name: (self._last_access.get(name, -1), self._hits.get(name, 0))
+                for name, state in self._states.items()
+                if state != DocumentIndex.UPLOADED and name not in self._pins
+            }
+
+    def pin(self, names):
+        """
+        Keep documents from eviction until they are unpinned (waits while exclusive block runs)
+        :param names: document names
+        :type names: collections.abc.Iterable[str]
+        """
+        with self._lock:
+            while self._exclusive:
+                self._pins_changed.wait()
+            for name in names:
+                self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, names):
+        """
+        Release documents pinned by pin
+        :param names: document names
+        :type names: collections.abc.Iterable[str]
+        """
+        with self._lock:
+            for name in names:
+                count = self._pins[name] - 1
+                if count:
+                    self._pins[name] = count
+                else:
+                    del self._pins[name]
+            if not self._pins:
+                self._pins_changed.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Run block (e.g. clearing whole set) when documents of in-flight requests are released,
+        new requests can't pin documents until block ends
+        """
+        with self._lock:
+            while self._exclusive:
+                self._pins_changed.wait()
+            self._exclusive = True
+            try:
+                while self._pins:
+                    self._pins_changed.wait()
+                yield
+            finally:
+                self._exclusive = False
+                self._pins_changed.notify_all()
+
+    def unpinned(self, names):
+        """
+        Filter out pinned documents
+        :param names: document names
+        :type names: list[str]
+        :return: names of documents, that are not pinned
+        :rtype: list[str]
+        """
+        with self._lock:
+            return [name for name in names if name not in self._pins]
+
+    def remove(self, names):
+        """
+        Forget documents (e.g. after they were deleted from classification set)
+        :param names: document names
+        :type names: list[str]
+        """
+        with self._lock:
+            for name in names:
+                self._states.pop(name, None)
+                self._documents.pop(name, None)
+                self._last_access.pop(name, None)
+                self._hits.pop(name, None)
+
+    def invalidate(self):
+        """
+        Mark all documents stale (e.g. after new model was deployed)
+        """
+        with self._lock:
+            for name in self._states:
+                self._states[name] = DocumentIndex.STALE
+            self._documents.clear()
+
+    def reset(self):
+        """
+        Forget all documents (e.g. after classification set was cleared)
+        """
+        with self._lock:
+            self._states.clear()
+            self._documents.clear()
+            self._last_access.clear()
+            self._hits.clear()
+
+    def snapshot(self):
+        """
+        Get index state as JSON-serializable dict
+        :return: classified documents (raw records, least recently used first), uploaded document names,
+            access counts
+        :rtype: dict
+        """
+        with self._lock:
+            classified = sorted(self._documents.keys(), key=lambda name: self._last_access.get(name, -1))
+            return {
+                'documents': [self._documents[name].raw for name in classified],
+                'uploaded': [name for name, state in self._states.items() if state == DocumentIndex.UPLOADED],
+                'hits': dict(self._hits)
+            }
+
+    def restore(self, data):
+        """
+        Restore index state from snapshot. Restored index is considered loaded.
+        :param data: index state (see snapshot)
+        :type data: dict
+        """
+        with self._lock:
+            self._states.clear()
+            self._documents.clear()
+            self._last_access.clear()
+            self._hits = dict(data['hits'])
+            for name in data['uploaded']:
+                self._states[name] = DocumentIndex.UPLOADED
+            for record in data['documents']:
+                document = DocumentData(record)
+                self._states[document.name] = DocumentIndex.CLASSIFIED
+                self._documents[document.name] = document
+                self._last_access[document.name] = next(self._clock)
+            self._loaded = True
@@ -0,0 +1,252 @@
+import threading
+import time
+from .abbyy_exception import ABBYYException
+from .rate_limit import lane, BACKGROUND
+
+
+class EvictionPolicy:
+    """
+    Base eviction policy. Policy chooses classification set documents to delete.
+    """
+    _policies = {}
+
+    def select(self, access_stats, count):
+        """
+        Select documents to evict
+        :param access_stats: document name -> (last access tick, access count)
+        :type access_stats: dict[str, tuple[int, int]]
+        :param count: documents count to evict
+        :type count: int
+        :return: document names
+        :rtype: list[str]
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def register(name, cls):
+        """
+        Register eviction policy class
+        :param name: name (to use in configs)
+        :type name: str
+        :param cls: class
+        :type cls: class
+        """
+        EvictionPolicy._policies[name] = cls
+
+    @staticmethod
+    def create(policy):
+        """
+        Get policy instance
+        :param policy: policy name or instance
+        :type policy: str|EvictionPolicy
+        :return: policy
+        :rtype: EvictionPolicy
+        """
+        if isinstance(policy, EvictionPolicy):
+            return policy
+        if policy not in EvictionPolicy._policies:
+            raise ValueError("Unknown eviction policy : {0}".format(policy))
+        return EvictionPolicy._policies[policy]()
+
+
+class LRUEviction(EvictionPolicy):
+    """
+    Evict least recently used documents
+    """
+
+    def select(self, access_stats, count):
+        def last_access(name):
+            return access_stats[name][0]
+
+        return sorted(access_stats.keys(), key=last_access)[:count]
+
+
+class LFUEviction(EvictionPolicy):
+    """
+    Evict least frequently used documents (least recently used first on ties)
+    """
+
+    def select(self, access_stats, count):
+        def hits_and_last_access(name):
+            last_access, hits = access_stats[name]
+            return hits, last_access
+
+        return sorted(access_stats.keys(), key=hits_and_last_access)[:count]
+
+
+class ClearEviction(EvictionPolicy):
+    """
+    Legacy policy : drop whole classification set
+    """
+
+    def select(self, access_stats, count):
+        return list(access_stats.keys())
+
+
+EvictionPolicy.register('lru', LRUEviction)
+EvictionPolicy.register('lfu', LFUEviction)
+EvictionPolicy.register('clear', ClearEviction)
+
+
+class ClassificationSetManager:
+    """
+    Keep classification set size under limit.
+    When set grows over max_documents, background thread deletes documents chosen by eviction policy
+    until set shrinks to low_watermark * max_documents ('clear' policy clears whole set instead).
+    Failed deletion is retried with backoff, policy falls back to clearing whole set only if API doesn't support
+    single document deletion. Documents, pinned by in-flight requests, are not evicted, set is cleared
+    when they are released. Shared by all classifiers of same project (see for_project),
+    so classifiers don't evict documents of each other.
+    """
+    _managers = {}
+    _managers_lock = threading.Lock()
+    _RETRIES = 5
+    _RETRY_DELAY = 0.5
+    # Answers of API without single document deletion
+    _UNSUPPORTED_CODES = (404, 405)
+
+    def __init__(self, network, project_id, index, max_documents, policy='lru', low_watermark=0.8):
+        """
+        Initialize manager
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        :param index: project documents index
+        :type index: DocumentIndex
+        :param max_documents: classification set size limit
+        :type max_documents: int
+        :param policy: eviction policy name or instance
+        :type policy: str|EvictionPolicy
+        :param low_watermark: set size fraction to keep after eviction
+        :type low_watermark: float
+        """
+        assert max_documents > 0
+        assert 0 <= low_watermark < 1
+        self._network = network
+        self.project_id = project_id
+        self._index = index
+        self.max_documents = max_documents
+        self.policy = EvictionPolicy.create(policy)
+        self.low_watermark = low_watermark
+        self._options = (max_documents, policy, low_watermark)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.evicted = 0
+        self.clears = 0
+        self.errors = 0
+
+    @staticmethod
+    def for_project(network, project_id, index, max_documents, policy='lru', low_watermark=0.8):
+        """
+        Get shared manager of project (options must be same for all calls)
+        :param network: ABBYY network client
+        :type network: AbbyyNetwork
+        :param project_id: project id
+        :type project_id: str
+        :param index: project documents index
+        :type index: DocumentIndex
+        :param max_documents: classification set size limit
+        :type max_documents: int
+        :param policy: eviction policy name or instance
+        :type policy: str|EvictionPolicy
+        :param low_watermark: set size fraction to keep after eviction
+        :type low_watermark: float
+        :return: manager
+        :rtype: ClassificationSetManager
+        :raise ValueError: if manager of project was created with other options
+        """
+        key = (network.endpoint, project_id)
+        options = (max_documents, policy, low_watermark)
+        with ClassificationSetManager._managers_lock:
+            manager = ClassificationSetManager._managers.get(key)
+            if manager is None:
+                manager = ClassificationSetManager(network, project_id, index, max_documents, policy, low_watermark)
+                ClassificationSetManager._managers[key] = manager
+            elif manager._options != options:
+                raise ValueError("Classification set of project {0} is managed with other options : "
+                                 "max_documents, eviction, low_watermark = {1}".format(project_id, manager._options))
+            return manager
+
+    def schedule(self):
+        """
+        Start background eviction if set is over limit
+        """
+        if len(self._index) <= self.max_documents:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='abbyy-eviction', daemon=True)
+                self._thread.start()
+
+    def clear(self):
+        """
+        Remove all documents from classification set (waits until in-flight requests release their documents)
+        """
+        with self._index.exclusive():
+            self._network.clear_sets(self.project_id, classification=True)
+            self._index.reset()
+        self.clears += 1
+
+    @lane(BACKGROUND)
+    def _run(self):
+        failures = 0
+        try:
+            while len(self._index) > self.max_documents:
+                try:
+                    if isinstance(self.policy, ClearEviction):
+                        self.clear()
+                        break
+                    if not self._evict(len(self._index) - int(self.max_documents * self.low_watermark)):
+                        break
+                    failures = 0
+                except ABBYYException:
+                    # Transient failure - retry with backoff, after last retry eviction is restarted by next schedule()
+                    self.errors += 1
+                    failures += 1
+                    if failures > ClassificationSetManager._RETRIES:
+                        break
+                    time.sleep(ClassificationSetManager._RETRY_DELAY * 2 ** (failures - 1))
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def _evict(self, count):
+        """
+        Delete documents chosen by policy
+        :param count: documents count to evict
+        :type count: int
+        :return: should eviction go on?
+        :rtype: bool
+        """
+        names = self._index.unpinned(self.policy.select(self._index.access_stats(), count))
+        if not names:
+            return False
+        try:
+            self._network.delete_classifier_documents(self.project_id, names)
+        except ABBYYException as e:
+            if e.code not in ClassificationSetManager._UNSUPPORTED_CODES:
+                raise
+            # Can't delete single documents - fall back to clearing whole set
+            self.errors += 1
+            self.policy = ClearEviction()
+            return True
+        self._index.remove(names)
+        self.evicted += len(names)
+        return True
+
+    def stats(self):
+        """
+        Get classification set occupancy
+        :return: counters
+        :rtype: dict[str, int|float]
+        """
+        documents = len(self._index)
+        return {
+            'documents': documents,
+            'max_documents': self.max_documents,
+            'occupancy': documents / self.max_documents,
+            'evicted': self.evicted,
+            'clears': self.clears,
+            'errors': self.errors
+        }
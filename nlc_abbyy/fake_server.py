@@ -0,0 +1,512 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.parser import BytesParser
+from collections import Counter
+import datetime
+import io
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+
+
+_TOKEN_RE = re.compile(r'\w+')
+
+_ROUTES = [
+    ('POST', re.compile(r'^api/account/login$'), 'login'),
+    ('GET', re.compile(r'^api/projects$'), 'projects'),
+    ('POST', re.compile(r'^api/projects$'), 'create'),
+    ('GET', re.compile(r'^api/jobs$'), 'jobs'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/(?P<set>trainingSet|controlSet)/import$'), 'import'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/classificationSet/documents/import$'), 'document_import'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/classificationSet/documents/delete$'), 'delete'),
+    ('GET', re.compile(r'^api/projects/(?P<project>[^/]+)/classificationSet/documents$'), 'documents'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/classifying$'), 'classifying'),
+    ('GET', re.compile(r'^api/projects/(?P<project>[^/]+)/categories$'), 'categories'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/deploy$'), 'deploy'),
+    ('POST', re.compile(r'^api/projects/(?P<project>[^/]+)/clear$'), 'clear'),
+]
+
+
+def _timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class _FakeProject:
+    """
+    Fake SmartClassifier project state
+    """
+
+    def __init__(self, project_id, configuration):
+        self.id = project_id
+        self.configuration = configuration
+        self.created = _timestamp()
+        self.deployed = None
+        self.training = {}
+        self.control_fmeasure = None
+        self.train_fmeasure = None
+        self.categories = {}
+        self.documents = {}
+        self._category_ids = itertools.count(1)
+        self._model = None
+
+    def set_training(self, classes):
+        self.training = classes
+        by_name = {category['Configuration']['Name']: category for category in self.categories.values()}
+        self.categories = {}
+        for class_name in sorted(classes.keys()):
+            category = by_name.get(class_name)
+            if category is None:
+                category = {'Id': next(self._category_ids), 'ParentId': None, 'Configuration': {'Name': class_name}}
+            self.categories[category['Id']] = category
+        self._model = None
+
+    def _build_model(self):
+        """
+        Multinomial naive bayes model : category id -> (log prior, token log probabilities, unknown token log probability)
+        """
+        vocabulary = set()
+        counts = {}
+        examples_total = sum(len(examples) for examples in self.training.values())
+        for category_id, category in self.categories.items():
+            counter = Counter()
+            for example in self.training.get(category['Configuration']['Name'], []):
+                counter.update(_tokens(example))
+            counts[category_id] = counter
+            vocabulary.update(counter.keys())
+        model = {}
+        for category_id, counter in counts.items():
+            total = sum(counter.values()) + len(vocabulary) + 1
+            examples = len(self.training.get(self.categories[category_id]['Configuration']['Name'], []))
+            prior = math.log((examples + 1) / (examples_total + len(counts)))
+            model[category_id] = (
+                prior,
+                {token: math.log((count + 1) / total) for token, count in counter.items()},
+                math.log(1 / total)
+            )
+        self._model = model
+
+    def classify(self, text):
+        """
+        Classify text
+        :return: ClassifiedCategories list
+        :rtype: list[dict]
+        """
+        if self._model is None:
+            self._build_model()
+        if not self._model:
+            return []
+        tokens = _tokens(text)
+        scores = {}
+        for category_id, (prior, token_probabilities, unknown) in self._model.items():
+            scores[category_id] = prior + sum(token_probabilities.get(token, unknown) for token in tokens)
+        top = max(scores.values())
+        exponents = {category_id: math.exp(score - top) for category_id, score in scores.items()}
+        total = sum(exponents.values())
+        return [
+            {'Probability': value / total, 'IsConfident': value / total > 0.5, 'CategoryId': category_id}
+            for category_id, value in exponents.items()
+        ]
+
+    def fmeasure(self, classes):
+        """
+        Get macro-averaged accuracy-like F-measure of examples
+        """
+        right = 0
+        total = 0
+        names = {category_id: category['Configuration']['Name'] for category_id, category in self.categories.items()}
+        for class_name, examples in classes.items():
+            for example in examples:
+                classified = self.classify(example)
+                total += 1
+                if classified and names[max(classified, key=lambda item: item['Probability'])['CategoryId']] == class_name:
+                    right += 1
+        return right / total if total else 1.0
+
+    def data(self):
+        model_info = {
+            'ControlSetInfo': None if self.control_fmeasure is None else {'FMeasure': self.control_fmeasure},
+            'TrainingSetInfo': None if self.train_fmeasure is None else {'FMeasure': self.train_fmeasure},
+        }
+        return {
+            'Id': self.id,
+            'Configuration': self.configuration,
+            'CreatedTimestamp': self.created,
+            'DeployedTimestamp': self.deployed,
+            'IsModelOnly': False,
+            'ModelInfo': model_info
+        }
+
+
+class FakeSmartClassifier:
+    """
+    Local stand-in for SmartClassifier API. Implements endpoints used by AbbyyNetwork,
+    classifies documents by naive bayes model and supports latency, job duration, error injection
+    and throttling (429 answers to requests over concurrency limit).
+    Endpoint names (for latency/errors configuration and call counters) :
+    login, projects, create, jobs, import, document_import, delete, documents, classifying,
+    categories, deploy, clear.
+    """
+
+    def __init__(self, latency=None, job_duration=None, errors=None, job_errors=None,
+                 users=None, seed=0, host='127.0.0.1', port=0, serial_jobs=False, max_concurrency=None):
+        """
+        Initialize server
+        :param latency: endpoint name ('default' for any endpoint) -> response delay (seconds)
+        :type latency: dict[str, float]|NoneType
+        :param job_duration: job type ('import', 'document_import', 'classifying', 'default') -> duration (seconds)
+        :type job_duration: dict[str, float]|NoneType
+        :param errors: endpoint name ('default' for any endpoint) -> probability of HTTP 500 answer
+        :type errors: dict[str, float]|NoneType
+        :param job_errors: job type ('default' for any job) -> probability of job failure
+        :type job_errors: dict[str, float]|NoneType
+        :param users: username -> password, None - accept any credentials
+        :type users: dict[str, str]|NoneType
+        :param seed: random seed for error injection
+        :type seed: int
+        :param host: host to listen
+        :type host: str
+        :param port: port to listen (0 - any free port)
+        :type port: int
+        :param serial_jobs: run jobs of every project one by one (like SmartClassifier job queue)?
+        :type serial_jobs: bool
+        :param max_concurrency: max concurrent requests, others are throttled (HTTP 429), None - no limit
+        :type max_concurrency: int|NoneType
+        """
+        self.latency = latency or {}
+        self.job_duration = job_duration or {}
+        self.errors = errors or {}
+        self.job_errors = job_errors or {}
+        self.users = users
+        self.calls = Counter()
+        self.projects = {}
+        self.jobs = {}
+        self.sessions = set()
+        self.serial_jobs = serial_jobs
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.peak_active = 0
+        self.throttled = 0
+        self._queue_end = {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._host = host
+        self._port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        """
+        Get API endpoint
+        :return: endpoint
+        :rtype: str
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}/classifier'.format(host, port)
+
+    def start(self):
+        """
+        Start server in background thread
+        :return: API endpoint
+        :rtype: str
+        """
+        fake = self
+
+        class Handler(_FakeRequestHandler):
+            server_state = fake
+
+        self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-smartclassifier', daemon=True)
+        self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        """
+        Stop server
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset_calls(self):
+        """
+        Reset call counters
+        """
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self):
+        """
+        Get total API calls count
+        :return: calls
+        :rtype: int
+        """
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _chance(self, probabilities, key):
+        probability = probabilities.get(key, probabilities.get('default', 0.0))
+        with self._lock:
+            return probability > 0 and self._random.random() < probability
+
+    def _new_job(self, project_id, job_type):
+        job_id = str(uuid.uuid4())
+        duration = self.job_duration.get(job_type, self.job_duration.get('default', 0.0))
+        error = None
+        if self._chance(self.job_errors, job_type):
+            error = 'Injected {0} job failure'.format(job_type)
+        with self._lock:
+            started = time.time()
+            if self.serial_jobs:
+                started = max(started, self._queue_end.get(project_id, 0.0))
+                self._queue_end[project_id] = started + duration
+            self.jobs[job_id] = {
+                'id': job_id,
+                'project_id': project_id,
+                'type': job_type,
+                'started': started,
+                'duration': duration,
+                'error': error
+            }
+        return job_id
+
+    def _job_data(self, job):
+        finished = time.time() >= job['started'] + job['duration']
+        if not finished:
+            status = 'Running'
+        elif job['error']:
+            status = 'Failed'
+        else:
+            status = 'Completed'
+        return {
+            'Id': job['id'],
+            'ProjectId': job['project_id'],
+            'Started': job['started'],
+            'Finished': job['started'] + job['duration'] if finished else None,
+            'Status': status,
+            'Progress': 100 if finished else 0,
+            'Error': job['error'] if finished else None,
+            'Type': job['type'],
+            'Warnings': []
+        }
+
+    def _project(self, project_id):
+        project = self.projects.get(project_id)
+        if project is None:
+            raise _HTTPError(404, {'ErrorMessage': 'Project {0} not found'.format(project_id)})
+        return project
+
+    def handle(self, method, path, query, headers, body):
+        """
+        Handle API request
+        :return: status, response headers, JSON-serializable answer
+        :rtype: tuple[int, list[tuple[str, str]], object]
+        """
+        route = None
+        match = None
+        for route_method, pattern, name in _ROUTES:
+            if route_method == method:
+                match = pattern.match(path)
+                if match:
+                    route = name
+                    break
+        if route is None:
+            raise _HTTPError(404, {'ErrorMessage': 'Unknown API method {0} {1}'.format(method, path)})
+        with self._lock:
+            self.calls[route] += 1
+            if self.max_concurrency is not None and self.active >= self.max_concurrency:
+                self.throttled += 1
+                raise _HTTPError(429, {'ErrorMessage': 'Too many requests'}, [('Retry-After', '0.05')])
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            delay = self.latency.get(route, self.latency.get('default', 0.0))
+            if delay:
+                time.sleep(delay)
+            if self._chance(self.errors, route):
+                raise _HTTPError(500, {'ErrorMessage': 'Injected {0} error'.format(route)})
+            if route != 'login':
+                self._check_auth(headers)
+            handler = getattr(self, '_api_' + route)
+            with self._lock:
+                return handler(match.groupdict(), query, headers, body)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _check_auth(self, headers):
+        for cookie in (headers.get('Cookie') or '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == '.ASPXAUTH' and value in self.sessions:
+                return
+        raise _HTTPError(401, {'ErrorMessage': 'Unauthorized'})
+
+    def _api_login(self, params, query, headers, body):
+        data = json.loads(body.decode('utf-8'))
+        if self.users is not None and self.users.get(data.get('username')) != data.get('password'):
+            raise _HTTPError(401, {'ErrorMessage': 'Wrong username or password'})
+        token = uuid.uuid4().hex
+        self.sessions.add(token)
+        return 200, [('Set-Cookie', '.ASPXAUTH={0}; path=/; HttpOnly'.format(token))], True
+
+    def _api_projects(self, params, query, headers, body):
+        return 200, [], [project.data() for project in self.projects.values()]
+
+    def _api_create(self, params, query, headers, body):
+        data = json.loads(body.decode('utf-8'))
+        project_id = str(uuid.uuid4())
+        self.projects[project_id] = _FakeProject(project_id, {
+            'Name': data['name'],
+            'Language': data['language'],
+            'UseSemantics': data['useSemantics'],
+            'Inclusiveness': data['inclusiveness']
+        })
+        return 200, [], project_id
+
+    def _api_jobs(self, params, query, headers, body):
+        return 200, [], [self._job_data(job) for job in self.jobs.values()]
+
+    def _api_import(self, params, query, headers, body):
+        project = self._project(params['project'])
+        _, content = _parse_upload(headers, body)
+        classes = {}
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            for info in zf.infolist():
+                class_name, _, _ = info.filename.partition('/')
+                classes.setdefault(class_name, []).append(zf.read(info).decode('utf-8'))
+        if params['set'] == 'trainingSet':
+            project.set_training(classes)
+            project.train_fmeasure = project.fmeasure(classes)
+        else:
+            project.control_fmeasure = project.fmeasure(classes)
+        return 200, [], self._new_job(project.id, 'import')
+
+    def _api_document_import(self, params, query, headers, body):
+        project = self._project(params['project'])
+        name, content = _parse_upload(headers, body)
+        project.documents[name] = {'text': content.decode('utf-8'), 'classified': None}
+        return 200, [], self._new_job(project.id, 'document_import')
+
+    def _api_delete(self, params, query, headers, body):
+        project = self._project(params['project'])
+        for name in json.loads(body.decode('utf-8')):
+            project.documents.pop(name, None)
+        return 200, [], True
+
+    def _api_documents(self, params, query, headers, body):
+        project = self._project(params['project'])
+        return 200, [], [
+            {
+                'Name': name,
+                'Error': None,
+                'Warnings': [],
+                'ClassifiedCategories': document['classified'] or []
+            }
+            for name, document in project.documents.items()
+        ]
+
+    def _api_classifying(self, params, query, headers, body):
+        project = self._project(params['project'])
+        for document in project.documents.values():
+            if document['classified'] is None:
+                document['classified'] = project.classify(document['text'])
+        return 200, [], self._new_job(project.id, 'classifying')
+
+    def _api_categories(self, params, query, headers, body):
+        project = self._project(params['project'])
+        return 200, [], list(project.categories.values())
+
+    def _api_deploy(self, params, query, headers, body):
+        project = self._project(params['project'])
+        project.deployed = _timestamp()
+        return 200, [], True
+
+    def _api_clear(self, params, query, headers, body):
+        project = self._project(params['project'])
+        if query.get('clearClassificationSet') == 'true':
+            project.documents.clear()
+        if query.get('clearControlSet') == 'true':
+            project.control_fmeasure = None
+        if query.get('clearTrainingSet') == 'true':
+            project.set_training({})
+            project.train_fmeasure = None
+        return 200, [], True
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, answer, headers=()):
+        self.status = status
+        self.answer = answer
+        self.headers = list(headers)
+        super(_HTTPError, self).__init__(status)
+
+
+def _parse_upload(headers, body):
+    """
+    Parse multipart upload
+    :return: uploaded file name, file content
+    :rtype: tuple[str, bytes]
+    """
+    message = BytesParser().parsebytes(
+        'Content-Type: {0}\r\n\r\n'.format(headers['Content-Type']).encode('utf-8') + body)
+    fields = {}
+    file_name = None
+    content = b''
+    for part in message.get_payload():
+        name = part.get_param('name', header='content-disposition')
+        if part.get_filename() is not None:
+            file_name = part.get_filename()
+            content = part.get_payload(decode=True)
+        else:
+            fields[name] = part.get_payload(decode=True).decode('utf-8')
+    return fields.get('name', file_name), content
+
+
+class _FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path, _, query_string = self.path.partition('?')
+        index = path.find('/api/')
+        path = path[index + 1:] if index >= 0 else path.lstrip('/')
+        query = dict(pair.partition('=')[::2] for pair in query_string.split('&') if pair)
+        try:
+            status, headers, answer = self.server_state.handle(self.command, path, query, self.headers, body)
+        except _HTTPError as e:
+            status, headers, answer = e.status, e.headers, e.answer
+        data = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _handle
+    do_POST = _handle
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_fresh(script):
+    """
+    Run script in fresh interpreter and get its JSON output
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, environment.get('PYTHONPATH')]))
+    output = subprocess.check_output([sys.executable, '-c', script], env=environment)
+    return json.loads(output.decode())
+
+
+class ImportTest(unittest.TestCase):
+    def test_heavy_modules_are_lazy(self):
+        loaded = run_fresh(
+            "import json, sys, nlc, nlc_abbyy\n"
+            "print(json.dumps([name for name in ('numpy', 'transliterate', 'http.client', 'ssl', 'tracemalloc')\n"
+            "                  if name in sys.modules]))")
+        self.assertEqual(loaded, [])
+
+    def test_public_api(self):
+        names = run_fresh(
+            "import json, sys, nlc, nlc_abbyy\n"
+            "from nlc import LocalTfidfClassifier, EvaluationReport, evaluate\n"
+            "from nlc_abbyy import ABBYYClassifier, AbbyyNetwork, AbbyySession, Transport, HttpTransport, Language\n"
+            "from nlc_abbyy import DocumentData\n"
+            "print(json.dumps([ABBYYClassifier.__name__, HttpTransport.__name__, 'numpy' in sys.modules]))")
+        self.assertEqual(names, ['ABBYYClassifier', 'HttpTransport', True])
+
+    def test_config_loads_lazy_class(self):
+        names = run_fresh(
+            "import json, nlc\n"
+            "classifier = nlc.BaseClassifier.from_config({'class': 'local_tfidf'})\n"
+            "print(json.dumps(type(classifier).__name__))")
+        self.assertEqual(names, 'LocalTfidfClassifier')
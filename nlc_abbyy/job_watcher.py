@@ -0,0 +1,212 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import threading
+import time
+from nlc import metrics
+from .abbyy_exception import ABBYYException
+
+
+class JobWatcher:
+    """
+    Background job poller. Fetch jobs status once per tick and notify every waiter.
+    Jobs are polled by network clients of their waiters, one request per transport.
+    Poll interval grows while nothing changes and resets when job completes or new job is watched.
+    Failed poll is repeated with growing interval, waiters fail on permanent (4xx) poll error,
+    after `max_poll_errors` failed polls in a row or when their job is missing for `max_missing_polls` polls.
+    Poller thread is started on demand and stops when there is nothing to wait.
+    """
+
+    def __init__(self, network=None, min_interval=0.05, max_interval=2.0, backoff=1.5, max_poll_errors=8,
+                 max_missing_polls=10):
+        """
+        Initialize watcher
+        :param network: default ABBYY network client to poll jobs with, None - waiters must give own client
+        :type network: AbbyyNetwork|NoneType
+        :param min_interval: initial poll interval (seconds)
+        :type min_interval: float
+        :param max_interval: max poll interval (seconds)
+        :type max_interval: float
+        :param backoff: poll interval multiplier for idle ticks
+        :type backoff: float
+        :param max_poll_errors: failed polls in a row, that fail all waiters
+        :type max_poll_errors: int
+        :param max_missing_polls: polls in a row without job, that fail its waiters
+        :type max_missing_polls: int
+        """
+        self._network = network
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_poll_errors = max_poll_errors
+        self.max_missing_polls = max_missing_polls
+        self._waiters = {}
+        self._networks = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self, job_id, callback=None, network=None):
+        """
+        Start watching job
+        :param job_id: job id
+        :type job_id: str
+        :param callback: function, that will be called with completed future
+        :type callback: callable|NoneType
+        :param network: network client to poll job with, None - default client of watcher
+        :type network: AbbyyNetwork|NoneType
+        :return: future with JobData result (or ABBYYException if job failed)
+        :rtype: Future
+        """
+        network = network or self._network
+        assert network is not None
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        with self._lock:
+            self._waiters.setdefault(job_id, []).append(future)
+            self._networks[job_id] = network
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='abbyy-job-watcher', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def wait(self, job_id, timeout=None, network=None):
+        """
+        Wait until job will be completed
+        :param job_id: job id
+        :type job_id: str
+        :param timeout: max wait time (seconds), None - wait forever
+        :type timeout: float|NoneType
+        :param network: network client to poll job with, None - default client of watcher
+        :type network: AbbyyNetwork|NoneType
+        :return: completed job
+        :rtype: JobData
+        """
+        return self.wait_all([job_id], timeout, network)[0]
+
+    def wait_all(self, job_ids, timeout=None, network=None):
+        """
+        Wait until all jobs will be completed
+        :param job_ids: job ids
+        :type job_ids: list[str]
+        :param timeout: max wait time for every job (seconds), None - wait forever
+        :type timeout: float|NoneType
+        :param network: network client to poll jobs with, None - default client of watcher
+        :type network: AbbyyNetwork|NoneType
+        :return: completed jobs
+        :rtype: list[JobData]
+        """
+        futures = [self.watch(job_id, network=network) for job_id in job_ids]
+        start = time.perf_counter()
+        try:
+            jobs = [future.result(timeout) for future in futures]
+            metrics.registry.observe('abbyy.job_watcher.wait', time.perf_counter() - start)
+            return jobs
+        except FutureTimeoutError:
+            raise ABBYYException(0, "Job is not completed in {0} seconds".format(timeout))
+        finally:
+            for job_id, future in zip(job_ids, futures):
+                if not future.done():
+                    self._forget(job_id, future)
+
+    def _forget(self, job_id, future):
+        """
+        Stop watching job for given waiter
+        :param job_id: job id
+        :type job_id: str
+        :param future: waiter future
+        :type future: Future
+        """
+        with self._lock:
+            futures = self._waiters.get(job_id, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self._waiters.pop(job_id, None)
+                self._networks.pop(job_id, None)
+        future.cancel()
+
+    @staticmethod
+    def _is_permanent(error):
+        """
+        Check if poll error won't go away on repeat (client errors except throttling)
+        :type error: Exception
+        :rtype: bool
+        """
+        return isinstance(error, ABBYYException) and 400 <= error.code < 500 and error.code != 429
+
+    def _run(self):
+        interval = self.min_interval
+        errors = {}
+        missing = {}
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._thread = None
+                    return
+                polls = {}
+                for job_id in self._waiters:
+                    network = self._networks[job_id]
+                    polls.setdefault(id(network.transport), (network, []))[1].append(job_id)
+                missing = {job_id: count for job_id, count in missing.items() if job_id in self._waiters}
+            self._wakeup.clear()
+            completed = {}
+            failed = {}
+            retry = False
+            for key, (network, job_ids) in polls.items():
+                metrics.registry.increment('abbyy.job_watcher.polls')
+                try:
+                    jobs = network.jobs(set(job_ids))
+                except Exception as e:
+                    metrics.registry.increment('abbyy.job_watcher.poll_errors')
+                    errors[key] = errors.get(key, 0) + 1
+                    if self._is_permanent(e) or errors[key] >= self.max_poll_errors:
+                        failed.update((job_id, e) for job_id in job_ids)
+                        del errors[key]
+                    else:
+                        retry = True
+                    continue
+                errors.pop(key, None)
+                for job_id in job_ids:
+                    job = jobs.get(job_id)
+                    if job is None:
+                        missing[job_id] = missing.get(job_id, 0) + 1
+                        if missing[job_id] >= self.max_missing_polls:
+                            failed[job_id] = ABBYYException(0, "Job {0} is not found".format(job_id))
+                        continue
+                    missing.pop(job_id, None)
+                    if job.status == 'Completed':
+                        completed[job_id] = job
+                    elif job.error:
+                        failed[job_id] = ABBYYException(0, job.error)
+            self._notify(failed, completed)
+            if completed or failed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            # Failed poll is repeated after interval even if new job is watched
+            if self._wakeup.wait(interval) and not retry:
+                interval = self.min_interval
+
+    def _notify(self, failed, completed):
+        """
+        Notify waiters
+        :param failed: failed job id -> error
+        :type failed: dict[str, Exception]
+        :param completed: completed job id -> job
+        :type completed: dict[str, JobData]
+        """
+        if not failed and not completed:
+            return
+        job_ids = list(failed.keys()) + list(completed.keys())
+        with self._lock:
+            futures = [(future, job_id) for job_id in job_ids for future in self._waiters.pop(job_id, [])]
+            for job_id in job_ids:
+                self._networks.pop(job_id, None)
+        for future, job_id in futures:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if job_id in failed:
+                future.set_exception(failed[job_id])
+            else:
+                future.set_result(completed[job_id])
@@ -0,0 +1,76 @@
+import threading
+import unittest
+from nlc_abbyy.abbyy_exception import ABBYYException
+from nlc_abbyy.data import JobData
+from nlc_abbyy.job_watcher import JobWatcher
+
+
+class _FlakyNetwork:
+    """
+    Fails first `failures` jobs polls with `code`, then reports every job except `missing` as completed
+    """
+
+    def __init__(self, failures, code=500, missing=()):
+        self.failures = failures
+        self.code = code
+        self.missing = set(missing)
+        self.polls = 0
+        self.transport = object()
+        self._lock = threading.Lock()
+
+    def jobs(self, job_ids):
+        with self._lock:
+            self.polls += 1
+            if self.polls <= self.failures:
+                raise ABBYYException(self.code, "Poll failed")
+        return {job_id: JobData({'Id': job_id, 'Status': 'Completed', 'Error': None})
+                for job_id in job_ids if job_id not in self.missing}
+
+
+class JobWatcherTest(unittest.TestCase):
+    def test_failed_poll_is_repeated(self):
+        network = _FlakyNetwork(3)
+        watcher = JobWatcher(network, min_interval=0.01, max_interval=0.05)
+        jobs = watcher.wait_all(['first', 'second'], timeout=5.0)
+        self.assertEqual([job.id for job in jobs], ['first', 'second'])
+        self.assertEqual(network.polls, 4)
+
+    def test_persistent_poll_errors_fail_waiters(self):
+        network = _FlakyNetwork(float('inf'))
+        watcher = JobWatcher(network, min_interval=0.01, max_interval=0.05, max_poll_errors=4)
+        with self.assertRaises(ABBYYException) as context:
+            watcher.wait('job')
+        self.assertEqual(context.exception.code, 500)
+        self.assertEqual(network.polls, 4)
+
+    def test_client_error_fails_waiters_at_once(self):
+        network = _FlakyNetwork(float('inf'), code=401)
+        watcher = JobWatcher(network, min_interval=0.01, max_interval=0.05)
+        with self.assertRaises(ABBYYException) as context:
+            watcher.wait_all(['first', 'second'])
+        self.assertEqual(context.exception.code, 401)
+        self.assertEqual(network.polls, 1)
+
+    def test_missing_job_fails_waiter(self):
+        network = _FlakyNetwork(0, missing=['lost'])
+        watcher = JobWatcher(network, min_interval=0.01, max_interval=0.05, max_missing_polls=3)
+        found = watcher.watch('found')
+        with self.assertRaises(ABBYYException):
+            watcher.wait('lost')
+        self.assertEqual(found.result(5.0).id, 'found')
+        self.assertGreaterEqual(network.polls, 3)
+
+
+    def test_jobs_are_polled_by_waiter_clients(self):
+        closed = _FlakyNetwork(float('inf'), code=401)
+        working = _FlakyNetwork(0)
+        watcher = JobWatcher(min_interval=0.01, max_interval=0.05)
+        broken = watcher.watch('broken', network=closed)
+        self.assertEqual(watcher.wait('job', timeout=5.0, network=working).id, 'job')
+        with self.assertRaises(ABBYYException):
+            broken.result(5.0)
+        self.assertEqual(closed.polls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
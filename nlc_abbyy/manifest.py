@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import threading
+from .training_set import TrainingSetFingerprint
+
+
+class TrainingManifest:
+    """
+    Local JSON file with fingerprints of last trained sets, keyed by endpoint and classifier id.
+    Every entry also keeps deployed model version, so retraining is not skipped if project
+    was retrained or redeployed by somebody else.
+    """
+    DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.nlc_abbyy', 'manifest.json')
+
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        """
+        Initialize manifest
+        :param path: manifest file path, None - NLC_ABBYY_MANIFEST environment variable or DEFAULT_PATH
+        :type path: str|NoneType
+        """
+        if path is None:
+            path = os.environ.get('NLC_ABBYY_MANIFEST', TrainingManifest.DEFAULT_PATH)
+        self.path = path
+
+    @staticmethod
+    def _key(endpoint, classifier_id):
+        return '{0} {1}'.format(endpoint, classifier_id)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            # Broken manifest only means retraining
+            return {}
+
+    def _write(self, entries):
+        """
+        Replace manifest atomically (by temporary file), so readers never see partial file
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp('.manifest.json', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, endpoint, classifier_id):
+        """
+        Get last trained set
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :param classifier_id: classifier id
+        :type classifier_id: str
+        :return: fingerprint, deployed model version (None, None if classifier wasn't trained)
+        :rtype: tuple[TrainingSetFingerprint|NoneType, str|NoneType]
+        """
+        with TrainingManifest._lock:
+            entry = self._read().get(self._key(endpoint, classifier_id))
+        if entry is None:
+            return None, None
+        # Entries of old versions keep example fingerprints
+        return TrainingSetFingerprint(entry.get('classes', entry.get('examples'))), entry['model_version']
+
+    def save(self, endpoint, classifier_id, fingerprint, model_version):
+        """
+        Store trained set
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :param classifier_id: classifier id
+        :type classifier_id: str
+        :param fingerprint: training set fingerprint
+        :type fingerprint: TrainingSetFingerprint
+        :param model_version: deployed model version
+        :type model_version: str
+        """
+        with TrainingManifest._lock:
+            entries = self._read()
+            entries[self._key(endpoint, classifier_id)] = {
+                'digest': fingerprint.digest(),
+                'model_version': model_version,
+                'classes': fingerprint.to_dict()
+            }
+            self._write(entries)
+
+    def forget(self, endpoint, classifier_id):
+        """
+        Remove classifier entry, so next train will upload training set
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :param classifier_id: classifier id
+        :type classifier_id: str
+        """
+        with TrainingManifest._lock:
+            entries = self._read()
+            if entries.pop(self._key(endpoint, classifier_id), None) is None:
+                return
+            self._write(entries)
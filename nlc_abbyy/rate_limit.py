@@ -0,0 +1,310 @@
+"""
+Client-side API rate limiting : token bucket per API endpoint and adaptive concurrency limit
+with priority lanes. Limiter is shared by all clients of one account (see AbbyySession.limiter).
+"""
+from contextlib import contextmanager
+import threading
+import time
+from nlc import metrics
+
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+LANES = (INTERACTIVE, BACKGROUND)
+
+OK = 'ok'
+ERROR = 'error'
+THROTTLED = 'throttled'
+
+# Statuses of requests, that were rejected because of load and can be repeated
+THROTTLED_STATUSES = frozenset([429, 503])
+
+_local = threading.local()
+
+
+def current_lane():
+    """
+    Get priority lane of current thread requests
+    :return: lane (INTERACTIVE by default)
+    :rtype: str
+    """
+    return getattr(_local, 'lane', INTERACTIVE)
+
+
+@contextmanager
+def lane(name):
+    """
+    Send requests of current thread by given priority lane (can be used as decorator)
+    :param name: lane (INTERACTIVE or BACKGROUND)
+    :type name: str
+    """
+    assert name in LANES
+    previous = current_lane()
+    _local.lane = name
+    try:
+        yield
+    finally:
+        _local.lane = previous
+
+
+class TokenBucket:
+    """
+    Request rate limit. Token is taken by every request, tokens are refilled at `rate` per second
+    up to `capacity`. Requests, that found bucket empty, reserve future tokens and are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize bucket
+        :param rate: requests per second
+        :type rate: float
+        :param capacity: max burst size, None - one second of rate
+        :type capacity: float|NoneType
+        """
+        assert rate > 0
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take token
+        :return: time to wait before sending request (seconds)
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        Wait for token
+        :return: wait time (seconds)
+        :rtype: float
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class _EndpointLatency:
+    __slots__ = ('baseline', 'average', 'samples')
+
+    def __init__(self, latency):
+        self.baseline = latency
+        self.average = latency
+        self.samples = 1
+
+
+class Permit:
+    """
+    Admission of single request, must be returned by AdaptiveLimiter.release
+    """
+    __slots__ = ('endpoint', 'lane', 'start')
+
+    def __init__(self, endpoint, lane, start):
+        self.endpoint = endpoint
+        self.lane = lane
+        self.start = start
+
+
+class AdaptiveLimiter:
+    """
+    Adaptive (AIMD) concurrency limit of API requests. Limit grows by one request per `limit` successful
+    requests while it's fully used, and it's multiplied by `backoff` on errors, throttling answers and
+    endpoint latency growth - at most once per average request latency, so burst of failures cuts it once.
+    Requests over limit wait by priority lanes : interactive requests go first, background ones
+    can't take more than `background_share` of limit. Throttling answer pauses all requests for Retry-After.
+    """
+
+    def __init__(self, rates=None, initial_limit=8, min_limit=1, max_limit=64, backoff=0.5,
+                 latency_tolerance=2.0, min_latency_growth=0.05, background_share=0.5,
+                 retries=3, retry_delay=0.5):
+        """
+        Initialize limiter
+        :param rates: endpoint name (see endpoint_name, 'default' for any endpoint) -> requests per second,
+            None - no rate limits
+        :type rates: dict[str, float]|NoneType
+        :param initial_limit: initial concurrent requests limit
+        :type initial_limit: int
+        :param min_limit: min concurrent requests limit
+        :type min_limit: int
+        :param max_limit: max concurrent requests limit
+        :type max_limit: int
+        :param backoff: limit multiplier on overload
+        :type backoff: float
+        :param latency_tolerance: endpoint average latency / baseline latency ratio, that means overload
+        :type latency_tolerance: float
+        :param min_latency_growth: min latency growth over baseline, that means overload (seconds)
+        :type min_latency_growth: float
+        :param background_share: max fraction of limit, that background requests can take
+        :type background_share: float
+        :param retries: max repeats of throttled request
+        :type retries: int
+        :param retry_delay: throttled request delay if server didn't send Retry-After (seconds, doubled every repeat)
+        :type retry_delay: float
+        """
+        assert 1 <= min_limit <= initial_limit <= max_limit
+        assert 0 < backoff < 1
+        assert 0 < background_share <= 1
+        self.rates = dict(rates or {})
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_growth = min_latency_growth
+        self.background_share = background_share
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.decreases = 0
+        self.throttled = 0
+        self._buckets = {}
+        self._latencies = {}
+        self._latency = None
+        self._in_flight = {name: 0 for name in LANES}
+        self._waiting = {name: 0 for name in LANES}
+        self._decreased = float('-inf')
+        self._paused_until = float('-inf')
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight(self):
+        """
+        Get requests in flight
+        :rtype: int
+        """
+        return sum(self._in_flight.values())
+
+    def _bucket(self, endpoint):
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            rate = self.rates.get(endpoint, self.rates.get('default'))
+            if rate is None:
+                return None
+            with self._condition:
+                bucket = self._buckets.setdefault(endpoint, TokenBucket(rate))
+        return bucket
+
+    def _admits(self, lane):
+        if self.in_flight >= int(self.limit):
+            return False
+        if lane == BACKGROUND:
+            if self._waiting[INTERACTIVE]:
+                return False
+            if self._in_flight[BACKGROUND] >= max(1, int(self.limit * self.background_share)):
+                return False
+        return True
+
+    def acquire(self, endpoint):
+        """
+        Wait until request can be sent
+        :param endpoint: API endpoint name
+        :type endpoint: str
+        :return: permit (must be released after request)
+        :rtype: Permit
+        """
+        request_lane = current_lane()
+        start = time.perf_counter()
+        bucket = self._bucket(endpoint)
+        if bucket is not None:
+            bucket.acquire()
+        with self._condition:
+            self._waiting[request_lane] += 1
+            try:
+                while True:
+                    pause = self._paused_until - time.monotonic()
+                    if pause > 0:
+                        self._condition.wait(pause)
+                    elif self._admits(request_lane):
+                        break
+                    else:
+                        self._condition.wait()
+            finally:
+                self._waiting[request_lane] -= 1
+            self._in_flight[request_lane] += 1
+            if self._waiting[BACKGROUND]:
+                # Background requests could be held by this request only
+                self._condition.notify_all()
+        now = time.perf_counter()
+        metrics.registry.observe('abbyy.rate_limit.wait.' + request_lane, now - start)
+        return Permit(endpoint, request_lane, now)
+
+    def _latency_grew(self, endpoint, latency):
+        """
+        Update endpoint latency and check it for growth over baseline (best recent latency)
+        """
+        self._latency = latency if self._latency is None else self._latency + (latency - self._latency) * 0.2
+        stats = self._latencies.get(endpoint)
+        if stats is None:
+            self._latencies[endpoint] = _EndpointLatency(latency)
+            return False
+        stats.samples += 1
+        stats.average += (latency - stats.average) * 0.2
+        # Baseline slowly follows average, so persistent latency change becomes new baseline
+        stats.baseline = min(latency, stats.baseline + (stats.average - stats.baseline) * 0.01)
+        return stats.samples >= 5 and stats.average > stats.baseline * self.latency_tolerance \
+            and stats.average - stats.baseline > self.min_latency_growth
+
+    def release(self, permit, outcome):
+        """
+        Return request permit and adapt limit to request outcome
+        :param permit: permit
+        :type permit: Permit
+        :param outcome: OK, ERROR (server or network failure) or THROTTLED (server asked to slow down)
+        :type outcome: str
+        """
+        latency = time.perf_counter() - permit.start
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit) or any(self._waiting.values())
+            self._in_flight[permit.lane] -= 1
+            overloaded = outcome != OK
+            if outcome == OK:
+                overloaded = self._latency_grew(permit.endpoint, latency)
+            decreased = False
+            now = time.monotonic()
+            if overloaded:
+                if now - self._decreased >= (self._latency or 0.0) and self.limit > self.min_limit:
+                    self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                    self._decreased = now
+                    self.decreases += 1
+                    decreased = True
+            elif saturated:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            if outcome == THROTTLED:
+                self.throttled += 1
+            self._condition.notify_all()
+        if outcome == THROTTLED:
+            metrics.registry.increment('abbyy.rate_limit.throttled')
+        if decreased:
+            metrics.registry.increment('abbyy.rate_limit.decreases')
+
+    def pause(self, delay):
+        """
+        Hold all new requests
+        :param delay: pause duration (seconds)
+        :type delay: float
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def stats(self):
+        """
+        Get limiter state
+        :rtype: dict
+        """
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'in_flight': dict(self._in_flight),
+                'waiting': dict(self._waiting),
+                'decreases': self.decreases,
+                'throttled': self.throttled
+            }
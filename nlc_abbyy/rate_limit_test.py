@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+from nlc_abbyy.abbyy_exception import ABBYYException
+from nlc_abbyy.abbyy_network import AbbyyNetwork
+from nlc_abbyy.fake_server import FakeSmartClassifier
+from nlc_abbyy.rate_limit import AdaptiveLimiter, TokenBucket, lane, BACKGROUND, OK
+
+
+class RateLimitTest(unittest.TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(100, capacity=1)
+        start = time.perf_counter()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+
+    def test_interactive_requests_go_first(self):
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+        order = []
+
+        def request(name, request_lane):
+            with lane(request_lane):
+                permit = limiter.acquire('GET projects')
+            order.append(name)
+            limiter.release(permit, OK)
+
+        held = limiter.acquire('GET projects')
+        background = threading.Thread(target=request, args=('background', BACKGROUND))
+        background.start()
+        while not limiter.stats()['waiting'][BACKGROUND]:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=request, args=('interactive', 'interactive'))
+        interactive.start()
+        while not limiter.stats()['waiting']['interactive']:
+            time.sleep(0.001)
+        limiter.release(held, OK)
+        background.join()
+        interactive.join()
+        self.assertEqual(order, ['interactive', 'background'])
+
+    def test_throttled_requests_are_repeated(self):
+        with FakeSmartClassifier(latency={'default': 0.02}, max_concurrency=2) as server:
+            limited = AbbyyNetwork('limited', 'password', server.endpoint)
+            with ThreadPoolExecutor(12) as executor:
+                results = list(executor.map(lambda _: limited.classifiers(), range(36)))
+            self.assertEqual(results, [{}] * 36)
+            self.assertGreater(limited.limiter.decreases, 0)
+            self.assertLess(limited.limiter.limit, 8)
+            self.assertIs(AbbyyNetwork('limited', 'password', server.endpoint).limiter, limited.limiter)
+
+            unlimited = AbbyyNetwork('unlimited', 'password', server.endpoint, rate_limit=False)
+            with ThreadPoolExecutor(12) as executor:
+                futures = [executor.submit(unlimited.classifiers) for _ in range(36)]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            self.assertTrue(errors)
+            self.assertTrue(all(isinstance(error, ABBYYException) and error.code == 429 for error in errors))
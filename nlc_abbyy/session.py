@@ -0,0 +1,175 @@
+import threading
+from .transport import Transport
+from .job_watcher import JobWatcher
+from .rate_limit import AdaptiveLimiter
+
+
+class AbbyySession:
+    """
+    Authenticated session of one account on one endpoint.
+    Shared by all network clients with same username and endpoint: login cookie, transports
+    (with their keep-alive connections), job watcher and request limiter. Login is done on first request,
+    rejected session is renewed once for all threads, that got rejection.
+    """
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, username, password, endpoint):
+        """
+        Initialize session
+        :param username: username
+        :type username: str
+        :param password: password
+        :type password: str
+        :param endpoint: API endpoint
+        :type endpoint: str
+        """
+        self.username = username
+        self.password = password
+        self.endpoint = endpoint
+        self._cookies = None
+        self._transports = {}
+        self._job_watcher = None
+        self._limiter = None
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self.logins = 0
+
+    @staticmethod
+    def for_account(username, password, endpoint):
+        """
+        Get shared session of account
+        :param username: username
+        :type username: str
+        :param password: password
+        :type password: str
+        :param endpoint: API endpoint
+        :type endpoint: str
+        :return: session
+        :rtype: AbbyySession
+        """
+        key = (username, endpoint)
+        with AbbyySession._sessions_lock:
+            session = AbbyySession._sessions.get(key)
+            if session is None:
+                session = AbbyySession(username, password, endpoint)
+                AbbyySession._sessions[key] = session
+            elif session.password != password:
+                # Password was changed - current session cookie belongs to old credentials
+                session.password = password
+                session.invalidate()
+            return session
+
+    @staticmethod
+    def reset_all():
+        """
+        Forget all sessions (next requests will log in again)
+        """
+        with AbbyySession._sessions_lock:
+            sessions, AbbyySession._sessions = AbbyySession._sessions, {}
+        for session in sessions.values():
+            session.invalidate()
+
+    def transport(self, transport):
+        """
+        Get shared transport
+        :param transport: transport name or instance (instances are not shared)
+        :type transport: str|Transport
+        :return: transport
+        :rtype: Transport
+        """
+        if isinstance(transport, Transport):
+            return transport
+        with self._lock:
+            instance = self._transports.get(transport)
+            if instance is None:
+                instance = Transport.create(transport)
+                self._transports[transport] = instance
+            return instance
+
+    def job_watcher(self):
+        """
+        Get shared job watcher (jobs are polled by network clients of waiters)
+        :return: job watcher
+        :rtype: JobWatcher
+        """
+        with self._lock:
+            if self._job_watcher is None:
+                self._job_watcher = JobWatcher()
+            return self._job_watcher
+
+    def limiter(self, options=None):
+        """
+        Get shared request limiter
+        :param options: AdaptiveLimiter options (if limiter is not created yet)
+        :type options: dict|NoneType
+        :return: limiter
+        :rtype: AdaptiveLimiter
+        """
+        with self._lock:
+            if self._limiter is None:
+                self._limiter = AdaptiveLimiter(**(options or {}))
+            return self._limiter
+
+    @property
+    def cookies(self):
+        """
+        Get current login cookies (without login)
+        :return: cookies, None if not logged in
+        :rtype: dict[str, str]|NoneType
+        """
+        return self._cookies
+
+    def login_cookies(self, login):
+        """
+        Get login cookies, log in if it's not done yet
+        :param login: function, that logs in and returns cookies
+        :type login: callable
+        :return: cookies
+        :rtype: dict[str, str]
+        """
+        cookies = self._cookies
+        if cookies is not None:
+            return cookies
+        with self._login_lock:
+            if self._cookies is None:
+                self._cookies = login()
+                self.logins += 1
+            return self._cookies
+
+    def renew(self, rejected, login):
+        """
+        Log in again after server rejected session
+        :param rejected: rejected cookies (if session is already renewed by other thread, login is skipped)
+        :type rejected: dict[str, str]
+        :param login: function, that logs in and returns cookies
+        :type login: callable
+        :return: new cookies
+        :rtype: dict[str, str]
+        """
+        with self._login_lock:
+            if self._cookies is rejected or self._cookies is None:
+                self._cookies = login()
+                self.logins += 1
+            return self._cookies
+
+    def restore(self, cookies):
+        """
+        Use saved login cookies, if session isn't logged in yet
+        :param cookies: cookies
+        :type cookies: dict[str, str]
+        :return: were cookies used?
+        :rtype: bool
+        """
+        with self._login_lock:
+            if self._cookies is not None:
+                return False
+            self._cookies = dict(cookies)
+            return True
+
+    def invalidate(self):
+        """
+        Drop login cookies, next request will log in again
+        """
+        with self._login_lock:
+            self._cookies = None
@@ -0,0 +1,502 @@
+"""
+Record/replay of SmartClassifier API traffic.
+Recording (see `record` option of AbbyyNetwork and ABBYYClassifier) appends every request/response
+with its timing and every classifier operation (classify, classify_many, train, test) to JSON lines trace.
+Credentials, cookies and login responses are redacted, classified texts and training examples are kept - they are
+needed to re-run operations.
+Replay runs recorded operations against ReplayTransport, that serves recorded responses without network.
+
+Usage : python -m nlc_abbyy.trace replay TRACE [--latency-scale SCALE] [--output RESULT.json]
+        python -m nlc_abbyy.trace diff BASE.json NEW.json
+"""
+from collections import OrderedDict, deque
+import argparse
+import base64
+import contextlib
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+from .abbyy_exception import ABBYYException
+from .transport import Transport, TransportResponse
+
+
+TRACE_FORMAT = 1
+REDACTED = '<redacted>'
+# Request headers with credentials
+_REDACTED_HEADERS = frozenset(['authorization', 'cookie'])
+# Requests with credentials in body - request body is not fingerprinted, response body is not recorded
+_REDACTED_BODY_URIS = frozenset(['api/account/login'])
+
+
+def _relative_uri(endpoint, url):
+    """
+    Get request uri relative to API endpoint (with query)
+    :param endpoint: API endpoint, None - use url path
+    :type endpoint: str|NoneType
+    :param url: full request url
+    :type url: str
+    :rtype: str
+    """
+    if endpoint is not None:
+        base = endpoint.rstrip('/') + '/'
+        if url.startswith(base):
+            return url[len(base):]
+    parts = urlsplit(url)
+    uri = parts.path.lstrip('/')
+    if parts.query:
+        uri += '?' + parts.query
+    return uri
+
+
+def _body_digest(uri, headers, body):
+    """
+    Get request body fingerprint (multipart boundary is random, so it's excluded)
+    :return: sha1 hex digest, None if there is no body or body has credentials
+    :rtype: str|NoneType
+    """
+    if body is None or uri.split('?', 1)[0] in _REDACTED_BODY_URIS:
+        return None
+    chunks = [body] if isinstance(body, bytes) else body
+    boundary = None
+    for name, value in headers.items():
+        if name.lower() == 'content-type' and 'boundary=' in value:
+            boundary = value.split('boundary=', 1)[1].encode('utf-8')
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        if boundary is not None:
+            chunk = chunk.replace(boundary, b'')
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_body(body):
+    try:
+        return body.decode('utf-8'), None
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode('ascii'), 'base64'
+
+
+def _decode_body(entry):
+    if entry.get('body_encoding') == 'base64':
+        return base64.b64decode(entry['body'])
+    return entry['body'].encode('utf-8')
+
+
+def _redact_response_headers(headers):
+    result = []
+    for name, value in headers:
+        if name.lower() == 'set-cookie':
+            cookie_name = value.split('=', 1)[0]
+            value = '{0}={1}'.format(cookie_name, REDACTED)
+        result.append([name, value])
+    return result
+
+
+class TraceRecorder:
+    """
+    Appends trace entries to JSON lines file. Shared by all clients, that record to same file.
+    """
+    _recorders = {}
+    _recorders_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Initialize recorder
+        :param path: trace file path (entries are appended)
+        :type path: str
+        """
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+        self._write({'type': 'header', 'format': TRACE_FORMAT, 'started': time.time()})
+
+    @staticmethod
+    def for_path(path):
+        """
+        Get shared recorder of trace file
+        :param path: trace file path
+        :type path: str
+        :return: recorder
+        :rtype: TraceRecorder
+        """
+        key = os.path.abspath(path)
+        with TraceRecorder._recorders_lock:
+            recorder = TraceRecorder._recorders.get(key)
+            if recorder is None:
+                recorder = TraceRecorder(path)
+                TraceRecorder._recorders[key] = recorder
+            return recorder
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def record_request(self, uri, method, headers, body, response, started, latency, error=None):
+        """
+        Record API request
+        :param uri: uri relative to endpoint
+        :type uri: str
+        :param method: HTTP method
+        :type method: str
+        :param headers: request headers
+        :type headers: dict[str, str]
+        :param body: request body
+        :type body: bytes|MultipartBody|NoneType
+        :param response: response, None if request failed
+        :type response: TransportResponse|NoneType
+        :param started: request start (perf_counter)
+        :type started: float
+        :param latency: request time (seconds)
+        :type latency: float
+        :param error: transport error
+        :type error: Exception|NoneType
+        """
+        entry = {
+            'type': 'request',
+            'time': started - self._start,
+            'latency': latency,
+            'method': method,
+            'uri': uri,
+            'headers': {name: REDACTED if name.lower() in _REDACTED_HEADERS else value
+                        for name, value in headers.items()},
+            'body_size': len(body) if body is not None else 0,
+            'body_digest': _body_digest(uri, headers, body),
+        }
+        if response is not None:
+            entry['status'] = response.status
+            entry['response_headers'] = _redact_response_headers(response.headers)
+            body = response.body
+            if uri.split('?', 1)[0] in _REDACTED_BODY_URIS:
+                body = REDACTED.encode('utf-8')
+            entry['body'], encoding = _encode_body(body)
+            if encoding:
+                entry['body_encoding'] = encoding
+        else:
+            entry['error'] = str(error)
+        self._write(entry)
+
+    @contextlib.contextmanager
+    def operation(self, name, classifier_id, argument):
+        """
+        Record classifier operation. Operations, that are called by other operations
+        in same thread (e.g. classify_many by classify), are not recorded.
+        :param name: operation name (classifier method)
+        :type name: str
+        :param classifier_id: classifier id
+        :type classifier_id: str
+        :param argument: JSON-serializable method argument
+        """
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._write({
+                    'type': 'operation',
+                    'time': started - self._start,
+                    'elapsed': time.perf_counter() - started,
+                    'name': name,
+                    'classifier': classifier_id,
+                    'argument': argument,
+                    'error': None if error is None else str(error)
+                })
+
+    def close(self):
+        with TraceRecorder._recorders_lock:
+            if TraceRecorder._recorders.get(os.path.abspath(self.path)) is self:
+                del TraceRecorder._recorders[os.path.abspath(self.path)]
+        with self._lock:
+            self._file.close()
+
+
+class RecordingTransport(Transport):
+    """
+    Transport wrapper, that records every request to trace
+    """
+
+    def __init__(self, transport, recorder, endpoint=None):
+        """
+        Initialize transport
+        :param transport: transport, that sends requests
+        :type transport: Transport
+        :param recorder: trace recorder
+        :type recorder: TraceRecorder
+        :param endpoint: API endpoint (uris are recorded relative to it)
+        :type endpoint: str|NoneType
+        """
+        self.transport = transport
+        self.recorder = recorder
+        self.endpoint = endpoint
+
+    def request(self, method, url, headers, body=None):
+        started = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = self.transport.request(method, url, headers, body)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.recorder.record_request(_relative_uri(self.endpoint, url), method, headers, body, response,
+                                         started, time.perf_counter() - started, error)
+
+    def close(self):
+        self.transport.close()
+
+
+def read_trace(path):
+    """
+    Read trace entries
+    :param path: trace file path
+    :type path: str
+    :return: entries in file order
+    :rtype: list[dict]
+    """
+    entries = []
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+class ReplayTransport(Transport):
+    """
+    Transport, that serves recorded responses. Request gets next unused recorded response with same
+    method, uri and body (or, if there is no such one, with same method and uri), exhausted request
+    gets last served response again (e.g. repeated job polls).
+    """
+
+    def __init__(self, trace, latency_scale=0.0, endpoint=None):
+        """
+        Initialize transport
+        :param trace: trace file path or entries
+        :type trace: str|list[dict]
+        :param latency_scale: recorded latency multiplier (1.0 - recorded latency, 0 - no delay)
+        :type latency_scale: float
+        :param endpoint: endpoint of replayed clients (uris are matched relative to it)
+        :type endpoint: str|NoneType
+        """
+        if isinstance(trace, str):
+            trace = read_trace(trace)
+        self.latency_scale = latency_scale
+        self.endpoint = endpoint
+        self._exact = {}
+        self._by_uri = {}
+        self._last = {}
+        for entry in trace:
+            if entry.get('type') != 'request' or 'status' not in entry:
+                continue
+            entry = dict(entry, used=False)
+            key = (entry['method'], entry['uri'])
+            self._exact.setdefault(key + (entry['body_digest'],), deque()).append(entry)
+            self._by_uri.setdefault(key, deque()).append(entry)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.misses = 0
+
+    @staticmethod
+    def _next_unused(queue):
+        while queue and queue[0]['used']:
+            queue.popleft()
+        return queue.popleft() if queue else None
+
+    def _match(self, method, uri, digest):
+        key = (method, uri)
+        with self._lock:
+            self.calls += 1
+            entry = self._next_unused(self._exact.get(key + (digest,), ()))
+            if entry is None:
+                entry = self._next_unused(self._by_uri.get(key, ()))
+            if entry is not None:
+                entry['used'] = True
+                self._last[key + (digest,)] = entry
+                self._last[key] = entry
+                return entry
+            entry = self._last.get(key + (digest,)) or self._last.get(key)
+            if entry is None:
+                self.misses += 1
+            return entry
+
+    def request(self, method, url, headers, body=None):
+        uri = _relative_uri(self.endpoint, url)
+        entry = self._match(method, uri, _body_digest(uri, headers, body))
+        if entry is None:
+            raise ABBYYException(0, "{0} {1} : no recorded response".format(method, uri))
+        if self.latency_scale > 0:
+            time.sleep(entry['latency'] * self.latency_scale)
+        return TransportResponse(entry['status'], [tuple(header) for header in entry['response_headers']],
+                                 _decode_body(entry))
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, int(math.ceil(q / 100.0 * len(values))) - 1)]
+
+
+def replay(trace, latency_scale=0.0, classifier_options=None):
+    """
+    Re-run recorded classifier operations (in recorded order, one by one) against recorded responses
+    :param trace: trace file path or entries
+    :type trace: str|list[dict]
+    :param latency_scale: recorded latency multiplier (1.0 - recorded latency, 0 - no delay)
+    :type latency_scale: float
+    :param classifier_options: extra ABBYYClassifier arguments
+    :type classifier_options: dict|NoneType
+    :return: per operation name : count, errors, remote calls, calls per operation, wall time (seconds),
+        p50/p95 latency (ms) and recorded p50/p95 latency (ms); totals in 'total'
+    :rtype: OrderedDict[str, dict]
+    """
+    from .abbyy_classifier import ABBYYClassifier
+    if isinstance(trace, str):
+        trace = read_trace(trace)
+    operations = sorted((entry for entry in trace if entry.get('type') == 'operation'),
+                        key=lambda entry: entry['time'])
+    # Unique endpoint - replayed clients don't share sessions and indexes with other clients
+    endpoint = 'http://replay-{0}.invalid/'.format(uuid.uuid4().hex)
+    transport = ReplayTransport(trace, latency_scale, endpoint)
+    classifiers = {}
+    stats = OrderedDict()
+    with tempfile.TemporaryDirectory() as manifest_dir:
+        options = {'manifest': os.path.join(manifest_dir, 'manifest.json')}
+        options.update(classifier_options or {})
+        start = time.perf_counter()
+        for operation in operations:
+            classifier = classifiers.get(operation['classifier'])
+            if classifier is None:
+                classifier = ABBYYClassifier(('replay', 'replay'), endpoint, classifier_id=operation['classifier'],
+                                             transport=transport, **options)
+                classifiers[operation['classifier']] = classifier
+            item = stats.setdefault(operation['name'], {'latencies': [], 'recorded': [], 'errors': 0, 'calls': 0})
+            calls_before = transport.calls
+            operation_start = time.perf_counter()
+            try:
+                getattr(classifier, operation['name'])(operation['argument'])
+            except Exception:
+                item['errors'] += 1
+            item['latencies'].append(time.perf_counter() - operation_start)
+            item['recorded'].append(operation['elapsed'])
+            item['calls'] += transport.calls - calls_before
+        wall_time = time.perf_counter() - start
+    result = OrderedDict()
+    for name, item in stats.items():
+        count = len(item['latencies'])
+        result[name] = {
+            'count': count,
+            'errors': item['errors'],
+            'calls': item['calls'],
+            'calls_per_operation': item['calls'] / count,
+            'wall_time': sum(item['latencies']),
+            'p50_ms': _percentile(item['latencies'], 50) * 1000,
+            'p95_ms': _percentile(item['latencies'], 95) * 1000,
+            'recorded_p50_ms': _percentile(item['recorded'], 50) * 1000,
+            'recorded_p95_ms': _percentile(item['recorded'], 95) * 1000
+        }
+    result['total'] = {
+        'count': len(operations),
+        'errors': sum(item['errors'] for item in stats.values()),
+        'calls': transport.calls,
+        'calls_per_operation': transport.calls / len(operations) if operations else 0.0,
+        'wall_time': wall_time,
+        'misses': transport.misses
+    }
+    return result
+
+
+_COLUMNS = ('count', 'errors', 'calls_per_operation', 'wall_time', 'p50_ms', 'p95_ms')
+
+
+def diff(base, new):
+    """
+    Compare replay results
+    :param base: base replay result
+    :type base: dict[str, dict]
+    :param new: new replay result
+    :type new: dict[str, dict]
+    :return: operation name -> column -> (base value, new value, relative change), None for missing operation
+    :rtype: OrderedDict[str, dict[str, tuple[float, float, float|NoneType]]]
+    """
+    result = OrderedDict()
+    for name in list(base) + [name for name in new if name not in base]:
+        if name not in base or name not in new:
+            result[name] = None
+            continue
+        columns = {}
+        for column in _COLUMNS:
+            if column not in base[name] or column not in new[name]:
+                continue
+            old_value, new_value = base[name][column], new[name][column]
+            change = (new_value - old_value) / old_value if old_value else None
+            columns[column] = (old_value, new_value, change)
+        result[name] = columns
+    return result
+
+
+def _print_replay(result):
+    print('{0:<16} {1:>6} {2:>6} {3:>8} {4:>10} {5:>10} {6:>10} {7:>12}'.format(
+        'operation', 'ops', 'errors', 'calls/op', 'wall s', 'p50 ms', 'p95 ms', 'recorded p50'))
+    for name, item in result.items():
+        print('{0:<16} {1:>6} {2:>6} {3:>8.2f} {4:>10.3f} {5:>10.2f} {6:>10.2f} {7:>12.2f}'.format(
+            name, item['count'], item['errors'], item['calls_per_operation'], item['wall_time'],
+            item.get('p50_ms', 0.0), item.get('p95_ms', 0.0), item.get('recorded_p50_ms', 0.0)))
+    print("Requests without recorded response : {0}".format(result['total']['misses']))
+
+
+def _print_diff(changes):
+    print('{0:<16} {1:<20} {2:>12} {3:>12} {4:>9}'.format('operation', 'metric', 'base', 'new', 'change'))
+    for name, columns in changes.items():
+        if columns is None:
+            print('{0:<16} present in one result only'.format(name))
+            continue
+        for column, (old_value, new_value, change) in columns.items():
+            print('{0:<16} {1:<20} {2:>12.3f} {3:>12.3f} {4:>9}'.format(
+                name, column, old_value, new_value, '-' if change is None else '{0:+.1%}'.format(change)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded SmartClassifier traffic')
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_parser = commands.add_parser('replay', help='re-run recorded operations')
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--latency-scale', type=float, default=0.0,
+                               help='recorded latency multiplier (1 - recorded latency, 0 - no delay)')
+    replay_parser.add_argument('--output', help='save result as JSON (to diff with other version)')
+    diff_parser = commands.add_parser('diff', help='compare two replay results')
+    diff_parser.add_argument('base')
+    diff_parser.add_argument('new')
+    args = parser.parse_args(argv)
+    if args.command == 'replay':
+        result = replay(args.trace, args.latency_scale)
+        _print_replay(result)
+        if args.output:
+            with open(args.output, 'w') as target:
+                json.dump(result, target, indent=2)
+    else:
+        with open(args.base) as base, open(args.new) as new:
+            _print_diff(diff(json.load(base), json.load(new)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from nlc_abbyy import ABBYYClassifier, Language
+from nlc_abbyy.benchmark import SAMPLE_CLASSES, unique_texts
+from nlc_abbyy.fake_server import FakeSmartClassifier
+from nlc_abbyy.trace import REDACTED, TraceRecorder, ReplayTransport, read_trace, replay, diff
+from nlc_abbyy.transport import TransportResponse
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.trace = os.path.join(self.directory.name, 'trace.jsonl')
+        with FakeSmartClassifier(job_duration={'default': 0.01}) as server:
+            classifier = ABBYYClassifier(('trace_user', 'trace_password'), server.endpoint, new_classifier={
+                'name': 'TraceTest',
+                'language': Language.english,
+                'use_semantics': True,
+                'inclusiveness': 1
+            }, manifest=os.path.join(self.directory.name, 'manifest.json'), record=self.trace)
+            classifier.train(SAMPLE_CLASSES)
+            self.texts = unique_texts(3)
+            self.results = [classifier.classify(text) for text in self.texts]
+        TraceRecorder.for_path(self.trace).close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_credentials_are_redacted(self):
+        with open(self.trace, encoding='utf-8') as trace:
+            content = trace.read()
+        self.assertNotIn('trace_password', content)
+        self.assertNotIn('trace_user', content)
+        entries = read_trace(self.trace)
+        operations = [entry['name'] for entry in entries if entry['type'] == 'operation']
+        self.assertEqual(operations, ['train', 'classify', 'classify', 'classify'])
+
+    def test_login_response_is_redacted(self):
+        path = os.path.join(self.directory.name, 'login.jsonl')
+        recorder = TraceRecorder.for_path(path)
+        response = TransportResponse(200, [('Set-Cookie', '.ASPXAUTH=secret_token; path=/')],
+                                     b'{"token": "secret_token", "email": "user@example.com"}')
+        recorder.record_request('api/account/login', 'POST', {'Content-Type': 'application/json'},
+                                b'{"password": "secret"}', response, 0.0, 0.01)
+        recorder.record_request('api/project', 'GET', {'Cookie': '.ASPXAUTH=secret_token'}, None,
+                                TransportResponse(200, [], b'[]'), 0.0, 0.01)
+        recorder.close()
+        with open(path, encoding='utf-8') as trace:
+            content = trace.read()
+        self.assertNotIn('secret', content)
+        self.assertNotIn('user@example.com', content)
+        requests = [entry for entry in read_trace(path) if entry['type'] == 'request']
+        self.assertEqual([entry['body'] for entry in requests], [REDACTED, '[]'])
+
+    def test_replay(self):
+        # Server is stopped - everything is served from trace
+        result = replay(self.trace)
+        self.assertEqual(result['total']['errors'], 0)
+        self.assertEqual(result['total']['misses'], 0)
+        self.assertEqual(result['classify']['count'], 3)
+        self.assertGreater(result['classify']['calls'], 0)
+        changes = diff(result, replay(self.trace))
+        self.assertEqual(changes['classify']['calls_per_operation'][2], 0.0)
+
+    def test_replayed_results(self):
+        transport = ReplayTransport(self.trace, endpoint='http://replay.invalid/')
+        classifier_id = [entry for entry in read_trace(self.trace) if entry['type'] == 'operation'][0]['classifier']
+        classifier = ABBYYClassifier(('user', 'password'), 'http://replay.invalid/', classifier_id=classifier_id,
+                                     transport=transport, manifest=os.path.join(self.directory.name, 'replay.json'))
+        self.assertEqual([classifier.classify(text) for text in self.texts], self.results)
@@ -0,0 +1,177 @@
+import hashlib
+import zipfile
+
+
+def example_digest(example):
+    """
+    Get example fingerprint
+    :param example: example text
+    :type example: str
+    :return: fingerprint (hex)
+    :rtype: str
+    """
+    return hashlib.sha256(example.encode('utf-8')).hexdigest()[:16]
+
+
+class TrainingSetFingerprint:
+    """
+    Stable fingerprint of training set : per-class examples count and order-independent running hash
+    (sum of example fingerprints), so memory doesn't depend on examples count and same examples
+    read in other order give same fingerprint.
+    """
+    _HASH_MODULUS = 2 ** 64
+
+    def __init__(self, classes=None):
+        """
+        Initialize fingerprint
+        :param classes: class name -> {'count': examples count, 'hash': running hash (hex)} (see to_dict),
+            or class name -> example fingerprints (old manifests)
+        :type classes: dict[str, dict|list[str]]|NoneType
+        """
+        self.counts = {}
+        self.hashes = {}
+        for name, value in (classes or {}).items():
+            if isinstance(value, dict):
+                self.counts[name] = value['count']
+                self.hashes[name] = int(value['hash'], 16)
+            else:
+                self.counts[name] = len(value)
+                self.hashes[name] = sum(int(digest, 16) for digest in value) % TrainingSetFingerprint._HASH_MODULUS
+
+    def add_class(self, class_name):
+        """
+        Add class (classes without examples are also part of training set)
+        :param class_name: class name
+        :type class_name: str
+        """
+        self.counts.setdefault(class_name, 0)
+        self.hashes.setdefault(class_name, 0)
+
+    def add(self, class_name, example):
+        """
+        Add example
+        :param class_name: class name
+        :type class_name: str
+        :param example: example text
+        :type example: str
+        """
+        self.counts[class_name] = self.counts.get(class_name, 0) + 1
+        self.hashes[class_name] = (self.hashes.get(class_name, 0) + int(example_digest(example), 16)) \
+            % TrainingSetFingerprint._HASH_MODULUS
+
+    def class_digest(self, class_name):
+        """
+        Get class fingerprint
+        :param class_name: class name
+        :type class_name: str
+        :return: fingerprint (hex)
+        :rtype: str
+        """
+        return '{0}:{1:016x}'.format(self.counts[class_name], self.hashes[class_name])
+
+    def digest(self):
+        """
+        Get whole training set fingerprint
+        :return: fingerprint (hex)
+        :rtype: str
+        """
+        pairs = ['{0}:{1}'.format(name, self.class_digest(name)) for name in sorted(self.counts.keys())]
+        return hashlib.sha256('\n'.join(pairs).encode('utf-8')).hexdigest()
+
+    def to_dict(self):
+        """
+        Get serializable representation
+        :return: class name -> {'count': examples count, 'hash': running hash (hex)}
+        :rtype: dict[str, dict]
+        """
+        return {
+            name: {'count': count, 'hash': '{0:016x}'.format(self.hashes[name])}
+            for name, count in self.counts.items()
+        }
+
+    def compare(self, previous):
+        """
+        Compare with previous training set
+        :param previous: previous training set fingerprint, None if there was no training
+        :type previous: TrainingSetFingerprint|NoneType
+        :return: changes
+        :rtype: TrainingSetChanges
+        """
+        return TrainingSetChanges(previous, self)
+
+
+class TrainingSetChanges:
+    """
+    Training set change report. False in boolean context if nothing changed.
+    Added/removed examples counts of changed class are least changes, that explain its new examples count.
+    """
+
+    def __init__(self, previous, current):
+        """
+        Initialize report
+        :param previous: previous training set fingerprint, None if there was no training
+        :type previous: TrainingSetFingerprint|NoneType
+        :param current: current training set fingerprint
+        :type current: TrainingSetFingerprint
+        """
+        self.first_training = previous is None
+        old = previous.counts if previous is not None else {}
+        new = current.counts
+        self.added = sorted(set(new.keys()) - set(old.keys()))
+        self.removed = sorted(set(old.keys()) - set(new.keys()))
+        self.changed = {}
+        for name in sorted(set(new.keys()) & set(old.keys())):
+            if current.class_digest(name) == previous.class_digest(name):
+                continue
+            difference = new[name] - old[name]
+            if difference:
+                self.changed[name] = (max(difference, 0), max(-difference, 0))
+            else:
+                # Same count - at least one example was replaced
+                self.changed[name] = (1, 1)
+
+    def __bool__(self):
+        return self.first_training or bool(self.added or self.removed or self.changed)
+
+    def __str__(self):
+        if self.first_training:
+            return "First training"
+        if not self:
+            return "Training set is not changed"
+        lines = []
+        for name in self.added:
+            lines.append("+ {0}".format(name))
+        for name in self.removed:
+            lines.append("- {0}".format(name))
+        for name, (added, removed) in self.changed.items():
+            lines.append("~ {0} : {1} examples added, {2} removed".format(name, added, removed))
+        return '\n'.join(lines)
+
+
+def write_classes_zip(classes, fileobj, compresslevel=None, fingerprint=None):
+    """
+    Write class examples to zip archive one by one, so examples can be produced by generators
+    and never held in memory together
+    :param classes: class name -> examples
+    :type classes: collections.abc.Mapping[str, collections.abc.Iterable[str]]
+    :param fileobj: binary seekable file object to write archive
+    :type fileobj: io.IOBase
+    :param compresslevel: deflate compression level (0-9), None - store examples uncompressed
+    :type compresslevel: int|NoneType
+    :param fingerprint: fingerprint to fill with written examples
+    :type fingerprint: TrainingSetFingerprint|NoneType
+    :return: examples count
+    :rtype: int
+    """
+    compression = zipfile.ZIP_STORED if compresslevel is None else zipfile.ZIP_DEFLATED
+    count = 0
+    with zipfile.ZipFile(fileobj, 'w', compression, compresslevel=compresslevel) as zf:
+        for class_name, examples in classes.items():
+            if fingerprint is not None:
+                fingerprint.add_class(class_name)
+            for i, example in enumerate(examples):
+                zf.writestr(class_name + '/' + str(i) + '.txt', example)
+                if fingerprint is not None:
+                    fingerprint.add(class_name, example)
+                count += 1
+    return count
@@ -0,0 +1,366 @@
+from urllib.parse import urlsplit
+import io
+import select
+import socket
+import threading
+import uuid
+from .abbyy_exception import ABBYYException
+
+
+class TransportResponse:
+    """
+    HTTP response returned by transports
+    """
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        """
+        Initialize response
+        :param status: HTTP status code
+        :type status: int
+        :param headers: response headers as (name, value) pairs
+        :type headers: list[tuple[str, str]]
+        :param body: response body
+        :type body: bytes
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        """
+        Get decoded body
+        :return: body
+        :rtype: str
+        """
+        return self.body.decode('utf-8')
+
+    @property
+    def cookies(self):
+        """
+        Get cookies set by response
+        :return: cookies
+        :rtype: dict[str, str]
+        """
+        result = {}
+        for name, value in self.headers:
+            if name.lower() != 'set-cookie':
+                continue
+            pair = value.split(';', 1)[0]
+            if '=' in pair:
+                cookie_name, cookie_value = pair.split('=', 1)
+                result[cookie_name.strip()] = cookie_value.strip()
+        return result
+
+
+class MultipartBody:
+    """
+    multipart/form-data body, that streams file content by chunks.
+    Can be iterated several times (e.g. to resend request), file is rewound every time.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fields, file_field, file_name, fileobj):
+        """
+        Initialize body
+        :param fields: plain form fields
+        :type fields: dict[str, str]
+        :param file_field: file field name
+        :type file_field: str
+        :param file_name: uploaded file name
+        :type file_name: str
+        :param fileobj: binary file object, content from current position to the end will be sent
+        :type fileobj: io.IOBase
+        """
+        boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={0}'.format(boundary)
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write('--{0}\r\nContent-Disposition: form-data; name="{1}"\r\n\r\n'
+                       .format(boundary, name).encode('utf-8'))
+            head.write(value.encode('utf-8'))
+            head.write(b'\r\n')
+        head.write('--{0}\r\nContent-Disposition: form-data; name="{1}"; filename="{2}"\r\n'
+                   'Content-Type: application/octet-stream\r\n\r\n'
+                   .format(boundary, file_field, file_name).encode('utf-8'))
+        self._head = head.getvalue()
+        self._tail = '\r\n--{0}--\r\n'.format(boundary).encode('utf-8')
+        self._file = fileobj
+        self._start = fileobj.tell()
+        self._size = fileobj.seek(0, io.SEEK_END) - self._start
+        fileobj.seek(self._start)
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        self._file.seek(self._start)
+        while True:
+            chunk = self._file.read(MultipartBody.CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield self._tail
+
+
+def encode_multipart(fields, file_field, file_name, content):
+    """
+    Encode multipart/form-data body
+    :param fields: plain form fields
+    :type fields: dict[str, str]
+    :param file_field: file field name
+    :type file_field: str
+    :param file_name: uploaded file name
+    :type file_name: str
+    :param content: file content (bytes or binary file object to stream)
+    :type content: bytes|io.IOBase
+    :return: content type header value, body
+    :rtype: tuple[str, bytes|MultipartBody]
+    """
+    if isinstance(content, bytes):
+        body = MultipartBody(fields, file_field, file_name, io.BytesIO(content))
+        return body.content_type, b''.join(body)
+    body = MultipartBody(fields, file_field, file_name, content)
+    return body.content_type, body
+
+
+class Transport:
+    """
+    Base transport class. Transport sends single HTTP request to SmartClassifier API.
+    """
+    _transports = {}
+
+    def request(self, method, url, headers, body=None):
+        """
+        Send request
+        :param method: HTTP method
+        :type method: str
+        :param url: full request url
+        :type url: str
+        :param headers: request headers
+        :type headers: dict[str, str]
+        :param body: request body (bytes or iterable of bytes chunks with known length)
+        :type body: bytes|MultipartBody|NoneType
+        :return: response
+        :rtype: TransportResponse
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Release transport resources
+        """
+        pass
+
+    @staticmethod
+    def register(name, cls):
+        """
+        Register transport class
+        :param name: name (to use in configs)
+        :type name: str
+        :param cls: class
+        :type cls: class
+        """
+        Transport._transports[name] = cls
+
+    @staticmethod
+    def create(transport):
+        """
+        Get transport instance
+        :param transport: transport name or instance
+        :type transport: str|Transport
+        :return: transport
+        :rtype: Transport
+        """
+        if isinstance(transport, Transport):
+            return transport
+        if transport not in Transport._transports:
+            raise ValueError("Unknown transport : {0}".format(transport))
+        return Transport._transports[transport]()
+
+
+class _ConnectionPool:
+    """
+    Keep-alive connections to single host
+    """
+
+    def __init__(self, scheme, host, port, max_idle, timeout):
+        self._scheme = scheme
+        self._host = host
+        self._port = port
+        self._max_idle = max_idle
+        self._timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Get idle connection or open new one
+        :return: connection, is connection reused?
+        :rtype: tuple[HTTPConnection, bool]
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+            if connection.sock is not None and not select.select([connection.sock], [], [], 0)[0]:
+                return connection, True
+            # Idle connection is readable - server closed it
+            connection.close()
+        # http.client and ssl are imported by first connection, not by package import
+        from http.client import HTTPConnection, HTTPSConnection
+        if self._scheme == 'https':
+            import ssl
+            connection = HTTPSConnection(self._host, self._port, timeout=self._timeout,
+                                         context=ssl.create_default_context())
+        else:
+            connection = HTTPConnection(self._host, self._port, timeout=self._timeout)
+        try:
+            connection.connect()
+        except OSError:
+            connection.close()
+            raise
+        # Streamed bodies are sent by several writes - don't let Nagle algorithm delay them
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection, False
+
+    def release(self, connection):
+        """
+        Return connection to pool
+        :param connection: connection
+        :type connection: HTTPConnection
+        """
+        with self._lock:
+            if len(self._idle) < self._max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class HttpTransport(Transport):
+    """
+    In-process HTTP client with keep-alive connection pool per host.
+    Connections are never shared between concurrent requests, so no global lock required.
+    """
+
+    def __init__(self, max_idle=10, timeout=60):
+        """
+        Initialize transport
+        :param max_idle: max idle connections kept per host
+        :type max_idle: int
+        :param timeout: socket timeout (seconds)
+        :type timeout: float
+        """
+        self._max_idle = max_idle
+        self._timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, scheme, netloc):
+        key = (scheme, netloc)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    host, _, port = netloc.rpartition(':')
+                    if not host or not port.isdigit():
+                        host, port = netloc, None
+                    pool = _ConnectionPool(scheme, host, port and int(port), self._max_idle, self._timeout)
+                    self._pools[key] = pool
+        return pool
+
+    # Requests, that can be repeated if connection fails after request is sent
+    _RESENDABLE_METHODS = frozenset(['GET', 'HEAD'])
+
+    def request(self, method, url, headers, body=None):
+        from http.client import HTTPException
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        pool = self._pool(parts.scheme, parts.netloc)
+        while True:
+            try:
+                connection, reused = pool.acquire()
+            except OSError as e:
+                raise ABBYYException(0, "{0} {1} failed : {2}".format(method, url, e))
+            sent = False
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (HTTPException, OSError) as e:
+                connection.close()
+                # Server could close idle keep-alive connection - retry with fresh one.
+                # Completely sent POST could be already applied by server, so it's not repeated.
+                if reused and (not sent or method in HttpTransport._RESENDABLE_METHODS):
+                    continue
+                raise ABBYYException(0, "{0} {1} failed : {2}".format(method, url, e))
+            if response.will_close:
+                connection.close()
+            else:
+                pool.release(connection)
+            return TransportResponse(response.status, response.getheaders(), data)
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+
+
+class CurlTransport(Transport):
+    """
+    Fallback transport, that runs curl process for every request.
+    Need installed curl in PATH environment variable.
+    """
+
+    def request(self, method, url, headers, body=None):
+        command = ['curl', '-s', '-i', '-X', method, url]
+        for name, value in headers.items():
+            command += ['-H', '{0}: {1}'.format(name, value)]
+        if body is not None:
+            command += ['--data-binary', '@-']
+            if not isinstance(body, bytes):
+                body = b''.join(body)
+        from subprocess import Popen, PIPE
+        popen = Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        output, error = popen.communicate(body)
+        if popen.returncode != 0:
+            raise ABBYYException(popen.returncode, error.decode())
+        return self._parse_output(output)
+
+    @staticmethod
+    def _parse_output(output):
+        """
+        Parse `curl -i` output
+        :param output: curl output
+        :type output: bytes
+        :return: response
+        :rtype: TransportResponse
+        """
+        while True:
+            head, _, output = output.partition(b'\r\n\r\n')
+            status_line, _, header_lines = head.partition(b'\r\n')
+            status = int(status_line.split()[1])
+            # Skip interim responses (e.g. "100 Continue")
+            if status >= 200 or not output.startswith(b'HTTP/'):
+                break
+        from http.client import parse_headers
+        message = parse_headers(io.BytesIO(header_lines + b'\r\n\r\n'))
+        return TransportResponse(status, list(message.items()), output)
+
+
+Transport.register('http', HttpTransport)
+Transport.register('curl', CurlTransport)
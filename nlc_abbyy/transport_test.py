@@ -0,0 +1,59 @@
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+import threading
+import unittest
+from nlc_abbyy.abbyy_exception import ABBYYException
+from nlc_abbyy.transport import HttpTransport
+
+
+class _DroppingHandler(StreamRequestHandler):
+    """
+    Answers first request of connection, closes connection on second request without answer
+    """
+
+    def handle(self):
+        for number in range(2):
+            line = self.rfile.readline()
+            if not line:
+                return
+            length = 0
+            while True:
+                header = self.rfile.readline().strip()
+                if not header:
+                    break
+                name, _, value = header.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+            self.rfile.read(length)
+            with self.server.lock:
+                self.server.requests.append(line.split()[0].decode())
+            if number == 1:
+                return
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            self.wfile.flush()
+
+
+class HttpTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingTCPServer(('127.0.0.1', 0), _DroppingHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/'.format(self.server.server_address[1])
+        self.transport = HttpTransport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_is_resent_on_dropped_connection(self):
+        self.assertEqual(self.transport.request('GET', self.url, {}).body, b'ok')
+        self.assertEqual(self.transport.request('GET', self.url, {}).body, b'ok')
+        self.assertEqual(self.server.requests, ['GET', 'GET', 'GET'])
+
+    def test_post_is_not_resent_after_it_was_sent(self):
+        self.assertEqual(self.transport.request('POST', self.url, {}, b'first').body, b'ok')
+        with self.assertRaises(ABBYYException):
+            self.transport.request('POST', self.url, {}, b'second')
+        self.assertEqual(self.server.requests, ['POST', 'POST'])